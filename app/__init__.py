@@ -17,6 +17,8 @@ def create_app(config_class=None):
 
     # 注册蓝本
     from .api import api_v1
+    from .api.metrics import metrics_bp
     app.register_blueprint(api_v1, url_prefix='/api/v1')
+    app.register_blueprint(metrics_bp)
 
     return app
@@ -0,0 +1,31 @@
+from flask import Blueprint, Response
+from app.judge_scheduler import queue_metrics
+import judge_metrics
+
+metrics_bp = Blueprint('metrics', __name__)
+
+QUEUE_WINDOW = 300  # 队列等待时间分位数的统计窗口（秒）
+
+
+def _queue_gauges():
+    """评测队列按调度优先级类别的积压和等待时间，来自数据库，对所有评测进程汇总。"""
+    lines = []
+    gauges = (
+        ('judge_queue_depth', 'depth', 'Submissions waiting to be claimed.'),
+        ('judge_queue_in_flight', 'in_flight', 'Submissions currently leased by a worker.'),
+        ('judge_queue_wait_p50_seconds', 'wait_p50', f'Median queue wait over the last {QUEUE_WINDOW}s.'),
+        ('judge_queue_wait_p99_seconds', 'wait_p99', f'p99 queue wait over the last {QUEUE_WINDOW}s.'),
+    )
+    queues = queue_metrics(window_seconds=QUEUE_WINDOW)
+    for name, field, documentation in gauges:
+        lines += [f'# HELP {name} {documentation}', f'# TYPE {name} gauge']
+        for priority_class, values in sorted(queues.items()):
+            if values.get(field) is not None:
+                lines.append(f'{name}{{class="{priority_class}"}} {values[field]}')
+    return '\n'.join(lines) + '\n'
+
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus 文本格式：本进程的评测指标和数据库中的队列状态。评测进程另有各自的 /metrics 端口。"""
+    return Response(judge_metrics.REGISTRY.render() + _queue_gauges(), content_type=judge_metrics.CONTENT_TYPE)
@@ -4,6 +4,8 @@ from app.api.v1.user import user_bp
 from app.api.v1.admin import admin_bp
 from app.api.v1.teacher import teacher_bp
 from app.api.v1.ai import ai_bp
+from app.api.v1.submission import submission_bp
+from app.api.v1.assignment import assignment_bp
 
 api_v1 = Blueprint('api_v1', __name__)
 
@@ -13,3 +15,5 @@ api_v1.register_blueprint(user_bp)
 api_v1.register_blueprint(admin_bp)
 api_v1.register_blueprint(teacher_bp)
 api_v1.register_blueprint(ai_bp)
+api_v1.register_blueprint(submission_bp)
+api_v1.register_blueprint(assignment_bp)
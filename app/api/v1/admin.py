@@ -1,9 +1,11 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from werkzeug.security import generate_password_hash
+from sqlalchemy import func
 from sqlalchemy.exc import IntegrityError
 from app.extensions import db
-from app.models import User
+from app.models import User, JudgeWorker
 from app.utils import token_required, admin_required
+from app.judge_scheduler import queue_metrics
 
 admin_bp = Blueprint('admin', __name__)
 
@@ -33,3 +35,33 @@ def create_teacher():
         else:
             return jsonify({'msg': 'Integrity error', 'detail': str(e.orig)}), 400
     return jsonify({'msg': 'Teacher created successfully', 'user_id': user.id}), 201
+
+
+@admin_bp.route('/admin/judge/queues', methods=['GET'])
+@token_required
+@admin_required
+def judge_queue_metrics():
+    """按调度优先级类别的积压数、正在评测数，以及最近一段时间的等待时间和出结果时间分位数（秒）。"""
+    window = request.args.get('window', 3600, type=int)
+    return jsonify({'window': window, 'queues': queue_metrics(window_seconds=window)}), 200
+
+
+@admin_bp.route('/admin/judge/workers', methods=['GET'])
+@token_required
+@admin_required
+def judge_workers():
+    """已登记的评测进程；超过两个租约时长没有心跳的视为失联，其持有的提交会被重新领取。"""
+    timeout = current_app.config.get('JUDGE_LEASE_SECONDS', 60) * 2
+    now = db.session.query(func.now()).scalar()
+    workers = JudgeWorker.query.order_by(JudgeWorker.started_at.desc()).all()
+    return jsonify([{
+        'id': w.id,
+        'hostname': w.hostname,
+        'capacity': w.capacity,
+        'languages': w.languages,
+        'in_flight': w.in_flight,
+        'status': w.status,
+        'alive': w.status != 'stopped' and (now - w.last_heartbeat).total_seconds() <= timeout,
+        'started_at': w.started_at.isoformat(),
+        'last_heartbeat': w.last_heartbeat.isoformat()
+    } for w in workers]), 200
@@ -1,7 +1,5 @@
-from flask import Blueprint, request, jsonify, g, current_app
-from app.utils import token_required
-from app.models import User
-from app.extensions import db
+from flask import Blueprint, request, jsonify, current_app
+from app.utils import token_required, current_user
 import openai
 import json
 
@@ -121,8 +119,7 @@ ai_bp = Blueprint('ai', __name__)
 @ai_bp.route('/ai/generate-problem', methods=['POST'])
 @token_required
 def generate_problem():
-    user_id = getattr(g, 'current_user_id', None)
-    user = db.session.get(User, user_id)
+    user = current_user()
     if not user or user.role not in ('teacher', 'admin'):
         return jsonify({'msg': 'Only teacher or admin can use this feature'}), 403
 
@@ -1,8 +1,10 @@
-from flask import Blueprint, request, jsonify, g
+from flask import Blueprint, request, jsonify, current_app
 from app.extensions import db
-from app.models import Assignment, AssignmentProblem, Problem, User
-from app.schemas import AssignmentSchema, ProblemSchema
-from app.utils import token_required
+from app.models import Assignment, AssignmentProblem, Problem
+from app.assignment_cache import LOOKUPS, cached_detail, detail_etag, bump_assignment_version
+from app.schemas import AssignmentSchema
+from app.utils import token_required, current_user
+from sqlalchemy.dialects.mysql import insert as mysql_insert
 from sqlalchemy.exc import SQLAlchemyError
 from datetime import datetime
 
@@ -12,10 +14,7 @@ def is_teacher_or_admin(user):
     return user and user.role in ('teacher', 'admin')
 
 def get_current_user():
-    user_id = getattr(g, 'current_user_id', None)
-    if not user_id:
-        return None
-    return db.session.get(User, user_id)
+    return current_user()
 
 @assignment_bp.route('/assignments', methods=['POST'])
 @token_required
@@ -72,29 +71,37 @@ def add_problems_to_assignment(assignment_id):
     problem_ids = [item.get('problem_id') for item in problems]
     if not all(isinstance(pid, int) for pid in problem_ids):
         return jsonify({'msg': 'Each problem_id must be an integer'}), 400
-    found_problems = Problem.query.filter(Problem.id.in_(problem_ids)).all()
-    found_ids = {p.id for p in found_problems}
+    found_ids = {pid for (pid,) in db.session.query(Problem.id).filter(Problem.id.in_(problem_ids))}
     not_found = [pid for pid in problem_ids if pid not in found_ids]
     if not_found:
         return jsonify({'msg': f'Problems not found: {not_found}'}), 404
 
+    # 同一题目出现多次时以最后一次为准；已在作业中的题目只有显式给出 score 时才更新分值
+    items = {item['problem_id']: item for item in problems}
+    existing = {pid for (pid,) in db.session.query(AssignmentProblem.problem_id).filter(
+        AssignmentProblem.assignment_id == assignment_id,
+        AssignmentProblem.problem_id.in_(list(items))
+    )}
+    added, updated, rows = [], [], []
+    for pid, item in items.items():
+        if pid in existing and 'score' not in item:
+            continue
+        score = item.get('score', 0)
+        (updated if pid in existing else added).append({'problem_id': pid, 'score': score})
+        rows.append({'assignment_id': assignment_id, 'problem_id': pid, 'score': score})
+
     try:
-        added = []
-        with db.session.begin_nested():
-            for item in problems:
-                pid = item['problem_id']
-                score = item.get('score', 0)
-                exists = AssignmentProblem.query.filter_by(assignment_id=assignment_id, problem_id=pid).first()
-                if exists:
-                    continue
-                ap = AssignmentProblem(assignment_id=assignment_id, problem_id=pid, score=score)
-                db.session.add(ap)
-                added.append({'problem_id': pid, 'score': score})
+        if rows:
+            # 依赖 uk_assignment_problem：新题目插入，已有题目更新分值，一条语句完成
+            statement = mysql_insert(AssignmentProblem).values(rows)
+            db.session.execute(statement.on_duplicate_key_update(score=statement.inserted.score))
+            bump_assignment_version(assignment_id)
         db.session.commit()
         return jsonify({
             'msg': 'Problems added to assignment',
             'count': len(added),
-            'added': added
+            'added': added,
+            'updated': updated
         }), 200
     except SQLAlchemyError as e:
         db.session.rollback()
@@ -103,29 +110,29 @@ def add_problems_to_assignment(assignment_id):
 @assignment_bp.route('/assignments/<int:assignment_id>', methods=['GET'])
 @token_required
 def get_assignment_detail(assignment_id):
+    """
+    作业详情。响应带 ETag（随作业版本变化），If-None-Match 命中时返回 304，不查询题目；
+    序列化后的详情按版本缓存在进程内。
+    """
     user = get_current_user()
     if not is_teacher_or_admin(user):
         return jsonify({'msg': 'Only teacher or admin can view assignments'}), 403
 
-    assignment = Assignment.query.get(assignment_id)
+    assignment = db.session.get(Assignment, assignment_id)
     if not assignment:
         return jsonify({'msg': 'Assignment not found'}), 404
     if assignment.created_by != user.id and user.role != 'admin':
         return jsonify({'msg': 'No permission to view this assignment'}), 403
 
-    problems = AssignmentProblem.query.filter_by(assignment_id=assignment_id).all()
-    problem_list = []
-    for ap in problems:
-        problem = Problem.query.get(ap.problem_id)
-        if problem:
-            p = ProblemSchema().dump(problem)
-            p['score'] = ap.score
-            problem_list.append(p)
-
-    return jsonify({
-        'assignment': AssignmentSchema().dump(assignment),
-        'problems': problem_list
-    }), 200
+    etag = detail_etag(assignment.id, assignment.version)
+    if request.if_none_match.contains(etag):
+        LOOKUPS.inc(result='not_modified')
+        response = current_app.response_class(status=304)
+    else:
+        response = current_app.response_class(cached_detail(assignment), content_type='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
 
 @assignment_bp.route('/ai/generate-assignment', methods=['POST'])
 @token_required
@@ -41,5 +41,5 @@ def login():
     if not user or not check_password_hash(user.password_hash, password):
         return jsonify({'msg': 'Invalid username or password'}), 401
 
-    token = generate_token(user.id)
+    token = generate_token(user)
     return jsonify({'token': token, 'user_id': user.id, 'role': user.role}), 200
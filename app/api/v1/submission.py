@@ -0,0 +1,205 @@
+from flask import Blueprint, request, jsonify, g, current_app
+from sqlalchemy import func
+from sqlalchemy.exc import SQLAlchemyError
+from app.extensions import db
+from app.models import Submission, Problem, Assignment, AssignmentProblem, RejudgeJob
+from app.rejudge import create_rejudge_job, advance_rejudge_jobs, rejudge_progress
+from app.utils import token_required
+
+submission_bp = Blueprint('submission', __name__)
+
+SUPPORTED_LANGUAGES = ('python', 'c', 'cpp')
+
+
+@submission_bp.route('/submissions', methods=['POST'])
+@token_required
+def create_submission():
+    """只写入一条 judging 状态的提交记录并立即返回，评测由独立的评测进程完成。"""
+    data = request.get_json() or {}
+    problem_id = data.get('problem_id')
+    assignment_id = data.get('assignment_id')
+    language = data.get('language')
+    code = data.get('code')  # 前端AES加密后的代码
+
+    if not isinstance(problem_id, int) or not code or language not in SUPPORTED_LANGUAGES:
+        return jsonify({'msg': 'problem_id, code and a supported language are required'}), 400
+
+    problem = db.session.get(Problem, problem_id)
+    if not problem or problem.type not in ('coding', 'code_snippet'):
+        return jsonify({'msg': 'Coding problem not found'}), 404
+    if assignment_id is not None:
+        in_assignment = AssignmentProblem.query.filter_by(
+            assignment_id=assignment_id, problem_id=problem_id
+        ).first()
+        if not in_assignment:
+            return jsonify({'msg': 'Problem is not part of this assignment'}), 400
+
+    submission = Submission(
+        user_id=g.current_user_id,
+        problem_id=problem_id,
+        assignment_id=assignment_id,
+        code=code,
+        language=language,
+        status='judging',
+        queue_class='assignment' if assignment_id is not None else 'practice'
+    )
+    try:
+        db.session.add(submission)
+        db.session.commit()
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        return jsonify({'msg': 'Failed to create submission', 'detail': str(e)}), 500
+    return jsonify({'msg': 'Submission queued', 'submission_id': submission.id, 'status': submission.status}), 202
+
+
+@submission_bp.route('/submissions/<int:submission_id>', methods=['GET'])
+@token_required
+def get_submission(submission_id):
+    submission = db.session.get(Submission, submission_id)
+    if not submission:
+        return jsonify({'msg': 'Submission not found'}), 404
+    if submission.user_id != g.current_user_id:
+        if g.current_role not in ('teacher', 'admin'):
+            return jsonify({'msg': 'No permission to view this submission'}), 403
+
+    return jsonify({
+        'id': submission.id,
+        'problem_id': submission.problem_id,
+        'assignment_id': submission.assignment_id,
+        'language': submission.language,
+        'status': submission.status,
+        'result': submission.result,
+        'submitted_at': submission.submitted_at.isoformat() if submission.submitted_at else None
+    }), 200
+
+
+@submission_bp.route('/submissions/<int:submission_id>/rejudge', methods=['POST'])
+@token_required
+def rejudge_submission(submission_id):
+    """老师或管理员把提交重新放回评测队列；force=true 时不复用缓存的评测结果。"""
+    if g.current_role not in ('teacher', 'admin'):
+        return jsonify({'msg': 'No permission to rejudge submissions'}), 403
+    data = request.get_json(silent=True) or {}
+
+    try:
+        updated = Submission.query.filter(
+            Submission.id == submission_id,
+            Submission.status != 'judging'
+        ).update({
+            Submission.status: 'judging',
+            Submission.force_judge: 1 if data.get('force') else 0,
+            Submission.queue_class: 'rejudge',
+            Submission.queued_at: func.now(),
+            Submission.rejudge_job_id: None,
+            Submission.started_at: None,
+            Submission.judged_at: None,
+            Submission.judge_worker: None,
+            Submission.lease_expires_at: None
+        }, synchronize_session=False)
+        db.session.commit()
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        return jsonify({'msg': 'Failed to rejudge submission', 'detail': str(e)}), 500
+    if not updated:
+        if not db.session.get(Submission, submission_id):
+            return jsonify({'msg': 'Submission not found'}), 404
+        return jsonify({'msg': 'Submission is already being judged'}), 409
+    return jsonify({'msg': 'Submission queued', 'submission_id': submission_id, 'status': 'judging'}), 202
+
+
+def _can_rejudge():
+    return g.current_role in ('teacher', 'admin')
+
+
+def _scope_error(scope):
+    """
+    教师只能重测自己创建的作业中的提交（可再按题目和ID区间缩小），
+    只按题目或ID区间选出的提交可能属于任何人，只有管理员可以重测。返回 (错误信息, 状态码) 或 None。
+    """
+    if scope['assignment_id'] is None:
+        if g.current_role != 'admin':
+            return 'Only admin can rejudge without an assignment_id', 403
+        return None
+    assignment = db.session.get(Assignment, scope['assignment_id'])
+    if not assignment:
+        return 'Assignment not found', 404
+    if assignment.created_by != g.current_user_id and g.current_role != 'admin':
+        return 'No permission to rejudge this assignment', 403
+    return None
+
+
+def _own_job(job_id):
+    """发起人或管理员可以查看和取消的重测任务，否则为 None。"""
+    job = db.session.get(RejudgeJob, job_id)
+    if not job or (job.created_by != g.current_user_id and g.current_role != 'admin'):
+        return None
+    return job
+
+
+@submission_bp.route('/rejudges', methods=['POST'])
+@token_required
+def create_rejudge():
+    """
+    批量重测：按 problem_id、assignment_id 和提交ID区间（min_submission_id、max_submission_id）
+    选出提交，分批放入低优先级的 rejudge 队列。max_pending 限制同时在队列中的提交数，用于节流；
+    force=true 时不复用缓存的评测结果。教师只能重测自己的作业，见 _scope_error。
+    """
+    if not _can_rejudge():
+        return jsonify({'msg': 'No permission to rejudge submissions'}), 403
+    data = request.get_json(silent=True) or {}
+    scope = {name: data.get(name) for name in
+             ('problem_id', 'assignment_id', 'min_submission_id', 'max_submission_id')}
+    if any(value is not None and not isinstance(value, int) for value in scope.values()):
+        return jsonify({'msg': 'Scope fields must be integers'}), 400
+    if all(value is None for value in scope.values()):
+        return jsonify({'msg': 'problem_id, assignment_id or a submission id range is required'}), 400
+    error = _scope_error(scope)
+    if error:
+        return jsonify({'msg': error[0]}), error[1]
+    batch_size = data.get('batch_size', current_app.config.get('JUDGE_REJUDGE_BATCH', 200))
+    max_pending = data.get('max_pending', current_app.config.get('JUDGE_REJUDGE_MAX_PENDING', 200))
+    if not isinstance(batch_size, int) or not isinstance(max_pending, int) or batch_size < 1 or max_pending < 1:
+        return jsonify({'msg': 'batch_size and max_pending must be positive integers'}), 400
+
+    try:
+        job = create_rejudge_job(g.current_user_id, force=bool(data.get('force')),
+                                 batch_size=batch_size, max_pending=max_pending, **scope)
+        # 第一批立即放入队列，之后由评测进程推进
+        advance_rejudge_jobs()
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        return jsonify({'msg': 'Failed to create rejudge job', 'detail': str(e)}), 500
+    return jsonify(rejudge_progress(db.session.get(RejudgeJob, job.id))), 202
+
+
+@submission_bp.route('/rejudges/<int:job_id>', methods=['GET'])
+@token_required
+def get_rejudge(job_id):
+    """批量重测的进度和吞吐量。"""
+    if not _can_rejudge():
+        return jsonify({'msg': 'No permission to view rejudge jobs'}), 403
+    job = _own_job(job_id)
+    if not job:
+        return jsonify({'msg': 'Rejudge job not found'}), 404
+    return jsonify(rejudge_progress(job)), 200
+
+
+@submission_bp.route('/rejudges/<int:job_id>/cancel', methods=['POST'])
+@token_required
+def cancel_rejudge(job_id):
+    """停止放入新的提交，已在队列中的提交照常评测完。"""
+    if not _can_rejudge():
+        return jsonify({'msg': 'No permission to cancel rejudge jobs'}), 403
+    if not _own_job(job_id):
+        return jsonify({'msg': 'Rejudge job not found'}), 404
+    updated = RejudgeJob.query.filter_by(id=job_id, status='running').update({
+        RejudgeJob.status: 'cancelled',
+        RejudgeJob.finished_at: func.now()
+    }, synchronize_session=False)
+    db.session.commit()
+    job = db.session.get(RejudgeJob, job_id)
+    if not job:
+        return jsonify({'msg': 'Rejudge job not found'}), 404
+    if not updated:
+        return jsonify({'msg': 'Rejudge job is not running'}), 409
+    return jsonify(rejudge_progress(job)), 200
@@ -1,35 +1,30 @@
-from flask import Blueprint, request, jsonify, g
-from werkzeug.security import generate_password_hash
-from sqlalchemy.exc import IntegrityError
+from flask import Blueprint, request, jsonify, g, current_app
 from app.extensions import db
-from app.models import User
-from app.schemas import UserSchema
-import csv
-import io
+from app.models import StudentImportJob
+from app.student_import import import_student_rows, read_rows, start_import_job, import_job_progress
+from app.user_listing import user_listing_response
+from app.utils import token_required, current_user
 
 teacher_bp = Blueprint('teacher', __name__)
 
 def teacher_or_admin_required():
-    user_id = getattr(g, 'current_user_id', None)
-    if not user_id:
-        return False
-    user = db.session.get(User, user_id)
-    if not user or user.role not in ('teacher', 'admin'):
-        return False
-    g.current_user = user
-    return True
+    user = current_user()
+    return user is not None and user.role in ('teacher', 'admin')
 
 @teacher_bp.route('/teachers/students', methods=['GET'])
 @token_required
 def get_students():
     if not teacher_or_admin_required():
         return jsonify({'msg': 'Teacher or admin privilege required'}), 403
-    students = User.query.filter_by(role='student').all()
-    return jsonify(UserSchema(many=True).dump(students)), 200
+    return user_listing_response(request.args, role='student')
 
 @teacher_bp.route('/teachers/students/import', methods=['POST'])
 @token_required
 def import_students():
+    """
+    导入学生 CSV（username,password,email，无表头）。不合法或已存在的行记入逐行报告，不中断导入。
+    async=1 时在后台导入并立即返回任务ID，进度见 GET /teachers/students/imports/<id>。
+    """
     if not teacher_or_admin_required():
         return jsonify({'msg': 'Teacher or admin privilege required'}), 403
 
@@ -39,27 +34,25 @@ def import_students():
     if file.filename == '':
         return jsonify({'msg': 'No selected file'}), 400
 
-    try:
-        stream = io.StringIO(file.stream.read().decode('utf-8'))
-        reader = csv.DictReader(stream, fieldnames=['username', 'password', 'email'])
-        students = []
-        db.session.begin(subtransactions=True)
-        for row in reader:
-            username = row.get('username')
-            password = row.get('password')
-            email = row.get('email')
-            if not username or not password or not email:
-                db.session.rollback()
-                return jsonify({'msg': f'Invalid row: {row}'}), 400
-            password_hash = generate_password_hash(password)
-            user = User(username=username, password_hash=password_hash, email=email, role='student')
-            db.session.add(user)
-            students.append(user)
-        db.session.commit()
-        return jsonify({'msg': 'Students imported successfully', 'count': len(students)}), 201
-    except IntegrityError as e:
-        db.session.rollback()
-        return jsonify({'msg': 'Integrity error during import (possible duplicate username or email)', 'detail': str(e.orig)}), 400
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'msg': 'Failed to import students', 'detail': str(e)}), 400
+    if request.args.get('async') == '1':
+        job = start_import_job(g.current_user_id, file.stream)
+        return jsonify({'msg': 'Import started', 'job_id': job.id}), 202
+
+    report = import_student_rows(read_rows(file.stream), current_app.config.get('STUDENT_IMPORT_BATCH', 500))
+    return jsonify({
+        'msg': 'Students imported',
+        'count': report['created'],
+        'processed': report['processed'],
+        'failed': report['failed'],
+        'errors': report['errors']
+    }), 201 if report['created'] else 400
+
+@teacher_bp.route('/teachers/students/imports/<int:job_id>', methods=['GET'])
+@token_required
+def get_import_job(job_id):
+    if not teacher_or_admin_required():
+        return jsonify({'msg': 'Teacher or admin privilege required'}), 403
+    job = db.session.get(StudentImportJob, job_id)
+    if not job or (job.created_by != g.current_user_id and g.current_role != 'admin'):
+        return jsonify({'msg': 'Import job not found'}), 404
+    return jsonify(import_job_progress(job)), 200
@@ -1,6 +1,5 @@
-from flask import Blueprint, jsonify
-from app.models import User
-from app.schemas import UserSchema
+from flask import Blueprint, request
+from app.user_listing import user_listing_response
 from app.utils import token_required, admin_required
 
 user_bp = Blueprint('user', __name__)
@@ -9,5 +8,5 @@ user_bp = Blueprint('user', __name__)
 @token_required
 @admin_required
 def get_users():
-    users = User.query.all()
-    return jsonify(UserSchema(many=True).dump(users))
+    """按ID分页列出用户，参数见 parse_listing_args；format=ndjson 时流式导出。"""
+    return user_listing_response(request.args)
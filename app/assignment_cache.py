@@ -0,0 +1,101 @@
+"""
+作业详情的响应缓存。序列化后的详情按 (作业ID, 版本) 缓存在进程内，版本存在 assignments.version，
+作业或其题目变更时加一，所有 Web 进程据此同时失效，版本同时用作 ETag。
+"""
+import threading
+from collections import OrderedDict
+from flask import current_app
+from sqlalchemy import event, update, select
+from app.extensions import db
+from app.models import Assignment, AssignmentProblem, Problem
+from app.schemas import AssignmentSchema, ProblemSchema
+from judge_metrics import REGISTRY
+
+LOOKUPS = REGISTRY.counter(
+    'assignment_detail_cache_lookups_total', 'Assignment detail cache lookups by result (hit, miss, not_modified).',
+    ('result',))
+
+
+class DetailCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # (作业ID, 版本) -> 序列化后的详情
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+            return body
+
+    def put(self, key, body):
+        size = current_app.config.get('ASSIGNMENT_DETAIL_CACHE_SIZE', 256)
+        with self._lock:
+            # 同一作业的旧版本不会再被读到，直接丢弃
+            for stale in [k for k in self._entries if k[0] == key[0] and k != key]:
+                del self._entries[stale]
+            self._entries[key] = body
+            while len(self._entries) > size:
+                self._entries.popitem(last=False)
+
+
+detail_cache = DetailCache()
+
+
+def detail_etag(assignment_id, version):
+    return f'assignment-{assignment_id}-v{version}'
+
+
+def render_detail(assignment):
+    """一次连接查询取出作业的全部题目和分值，整体序列化为 JSON。"""
+    rows = (db.session.query(Problem, AssignmentProblem.score)
+            .join(AssignmentProblem, AssignmentProblem.problem_id == Problem.id)
+            .filter(AssignmentProblem.assignment_id == assignment.id)
+            .order_by(AssignmentProblem.id)
+            .all())
+    problems = ProblemSchema(many=True).dump([problem for problem, _ in rows])
+    for item, (_, score) in zip(problems, rows):
+        item['score'] = score
+    return current_app.json.dumps({
+        'assignment': AssignmentSchema().dump(assignment),
+        'problems': problems
+    })
+
+
+def cached_detail(assignment):
+    """返回作业详情的 JSON 文本，同一版本只序列化一次。"""
+    key = (assignment.id, assignment.version)
+    body = detail_cache.get(key)
+    if body is not None:
+        LOOKUPS.inc(result='hit')
+        return body
+    LOOKUPS.inc(result='miss')
+    body = render_detail(assignment)
+    detail_cache.put(key, body)
+    return body
+
+
+def bump_assignment_version(assignment_id, connection=None):
+    """作业内容变更后调用；用 Query.update 等绕过 ORM 事件的批量修改须显式调用。"""
+    statement = update(Assignment).where(Assignment.id == assignment_id).values(version=Assignment.version + 1)
+    (connection or db.session).execute(statement)
+
+
+@event.listens_for(Assignment, 'before_update')
+def _assignment_changed(mapper, connection, target):
+    target.version = (target.version or 0) + 1
+
+
+@event.listens_for(AssignmentProblem, 'after_insert')
+@event.listens_for(AssignmentProblem, 'after_update')
+@event.listens_for(AssignmentProblem, 'after_delete')
+def _assignment_problem_changed(mapper, connection, target):
+    bump_assignment_version(target.assignment_id, connection)
+
+
+@event.listens_for(Problem, 'after_update')
+def _problem_changed(mapper, connection, target):
+    # 题目被修改时，包含它的所有作业都失效
+    assignment_ids = select(AssignmentProblem.assignment_id).where(AssignmentProblem.problem_id == target.id)
+    connection.execute(update(Assignment).where(Assignment.id.in_(assignment_ids))
+                       .values(version=Assignment.version + 1))
@@ -8,6 +8,54 @@ class Config:
     )
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # 鉴权用户缓存：条目有效期（秒）和最大条目数；有效期决定其他进程看到角色变更的最长延迟
+    AUTH_USER_CACHE_TTL = int(os.environ.get('AUTH_USER_CACHE_TTL', 60))
+    AUTH_USER_CACHE_SIZE = int(os.environ.get('AUTH_USER_CACHE_SIZE', 10000))
+
+    # 进程内缓存的作业详情数（按作业版本失效）
+    ASSIGNMENT_DETAIL_CACHE_SIZE = int(os.environ.get('ASSIGNMENT_DETAIL_CACHE_SIZE', 256))
+
+    # 学生批量导入：每批插入的行数，哈希密码的进程数（为0时取CPU核数）
+    STUDENT_IMPORT_BATCH = int(os.environ.get('STUDENT_IMPORT_BATCH', 500))
+    STUDENT_IMPORT_HASH_WORKERS = int(os.environ.get('STUDENT_IMPORT_HASH_WORKERS', 0))
+
+    # 评测进程配置
+    JUDGE_WORKERS = int(os.environ.get('JUDGE_WORKERS', 2))
+    JUDGE_WORKER_CAPACITY = int(os.environ.get('JUDGE_WORKER_CAPACITY', 1))
+    # 租约由心跳续期，评测进程失联后约一个租约时长内提交会被其他节点重新领取
+    JUDGE_LEASE_SECONDS = int(os.environ.get('JUDGE_LEASE_SECONDS', 60))
+    JUDGE_HEARTBEAT_INTERVAL = int(os.environ.get('JUDGE_HEARTBEAT_INTERVAL', 15))
+    # 本节点评测的语言，逗号分隔；为空时按沙箱中可用的工具链自动判断
+    JUDGE_LANGUAGES = [lang for lang in os.environ.get('JUDGE_LANGUAGES', '').split(',') if lang] or None
+    JUDGE_POLL_INTERVAL = float(os.environ.get('JUDGE_POLL_INTERVAL', 1.0))
+    # 评测进程的 /metrics 端口（多个进程依次加一），为0时不启动；JUDGE_TRACE_LOG=1 时每条提交输出一行阶段耗时日志
+    JUDGE_METRICS_PORT = int(os.environ.get('JUDGE_METRICS_PORT', 0))
+    JUDGE_TRACE_LOG = os.environ.get('JUDGE_TRACE_LOG', '0') == '1'
+    JUDGE_VERDICT_CACHE = os.environ.get('JUDGE_VERDICT_CACHE', '1') != '0'
+    # 批量重测：评测进程推进任务的间隔（秒），单个任务每批和同时在队列中的提交数默认值
+    JUDGE_REJUDGE_INTERVAL = int(os.environ.get('JUDGE_REJUDGE_INTERVAL', 5))
+    JUDGE_REJUDGE_BATCH = int(os.environ.get('JUDGE_REJUDGE_BATCH', 200))
+    JUDGE_REJUDGE_MAX_PENDING = int(os.environ.get('JUDGE_REJUDGE_MAX_PENDING', 200))
+    # 重测扫描时正在评测的提交最多等待多少秒（按其评测开始时间），超过后视为卡住，不再补测
+    JUDGE_REJUDGE_DEFERRED_TIMEOUT = int(os.environ.get('JUDGE_REJUDGE_DEFERRED_TIMEOUT', 1800))
+    # 评测调度：截止前多少秒内的作业提交优先，各队列的并发上限，等待多久后不论类别优先领取
+    JUDGE_SCHEDULER = {
+        'deadline_window': int(os.environ.get('JUDGE_DEADLINE_WINDOW', 3600)),
+        'queue_limits': {'rejudge': int(os.environ.get('JUDGE_REJUDGE_CONCURRENCY', 2))},
+        'aging_seconds': int(os.environ.get('JUDGE_AGING_SECONDS', 900)),
+        # 每个队列中每个用户最多参与调度的提交数，一个用户大量提交不会挤掉其他用户
+        'per_user_limit': int(os.environ.get('JUDGE_SCAN_PER_USER', 4))
+    }
+    JUDGE_OPTIONS = {
+        'backend': os.environ.get('JUDGE_BACKEND', 'docker'),
+        'compile_cache_dir': os.environ.get('JUDGE_COMPILE_CACHE_DIR') or None,
+        'test_data_cache_dir': os.environ.get('JUDGE_TEST_DATA_DIR') or None,
+        'policy': os.environ.get('JUDGE_POLICY', 'full'),
+        # 同一进程内共用的到 Docker 守护进程的连接数上限
+        'docker_max_connections': int(os.environ.get('JUDGE_DOCKER_MAX_CONNECTIONS', 64)),
+        'python_fork_server': os.environ.get('JUDGE_PYTHON_FORK', '0') == '1'
+    }
+
 class DevelopmentConfig(Config):
     DEBUG = True
 
@@ -0,0 +1,350 @@
+import os
+import json
+import time
+import signal
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from sqlalchemy import func, or_, text
+from app.extensions import db
+from app.models import Submission, Problem, TestCase, JudgeWorker
+from app.utils.code_crypto import decrypt_code
+from app.verdict_cache import VerdictCache
+from app.judge_scheduler import JudgeScheduler
+from app.rejudge import advance_rejudge_jobs
+from code_judge import CodeJudge
+from testdata_cache import TestDataCache
+import judge_metrics
+
+
+def default_worker_id():
+    return f'{socket.gethostname()}:{os.getpid()}'[:64]
+
+
+def lease_deadline(lease_seconds):
+    return func.timestampadd(text('SECOND'), lease_seconds, func.now())
+
+
+def claim_submissions(worker_id, limit=1, lease_seconds=600, scheduler=None, languages=None):
+    """
+    原子地领取待评测提交：状态为 judging 且没有租约或租约已过期的记录，
+    用 FOR UPDATE SKIP LOCKED 避免多个评测进程争抢同一行。
+    进程崩溃或停止心跳后租约到期，记录会被其他进程重新领取。
+    给出 scheduler 时按其优先级和公平分配规则挑选，否则按提交顺序领取；
+    languages 限定只领取评测进程支持的语言。
+    """
+    query = (db.session.query(Submission.id)
+             .filter(Submission.status == 'judging',
+                     or_(Submission.lease_expires_at.is_(None),
+                         Submission.lease_expires_at < func.now())))
+    if languages is not None:
+        query = query.filter(Submission.language.in_(languages))
+    if scheduler is not None:
+        chosen = scheduler.select(limit, languages)
+        if not chosen:
+            db.session.commit()
+            return []
+        # 挑选时未加锁，这里重新检查并锁定，已被其他进程领走的直接跳过
+        query = query.filter(Submission.id.in_(chosen))
+    rows = (query.order_by(Submission.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+            .all())
+    ids = [row.id for row in rows]
+    if ids:
+        Submission.query.filter(Submission.id.in_(ids)).update({
+            Submission.judge_worker: worker_id,
+            Submission.lease_expires_at: lease_deadline(lease_seconds),
+            Submission.started_at: func.now()
+        }, synchronize_session=False)
+    db.session.commit()
+    return ids
+
+
+def register_worker(worker_id, capacity, languages):
+    """登记评测进程及其容量和支持的语言，同一ID重启时覆盖旧记录。"""
+    db.session.merge(JudgeWorker(
+        id=worker_id,
+        hostname=socket.gethostname()[:255],
+        capacity=capacity,
+        languages=list(languages),
+        in_flight=0,
+        status='running',
+        started_at=func.now(),
+        last_heartbeat=func.now()
+    ))
+    db.session.commit()
+
+
+def heartbeat(worker_id, submission_ids, lease_seconds, status='running'):
+    """续约正在评测的提交，并刷新评测进程的心跳时间和负载。"""
+    if submission_ids:
+        Submission.query.filter(
+            Submission.id.in_(submission_ids),
+            Submission.judge_worker == worker_id,
+            Submission.status == 'judging'
+        ).update({
+            Submission.lease_expires_at: lease_deadline(lease_seconds)
+        }, synchronize_session=False)
+    JudgeWorker.query.filter_by(id=worker_id).update({
+        JudgeWorker.last_heartbeat: func.now(),
+        JudgeWorker.in_flight: len(submission_ids),
+        JudgeWorker.status: status
+    }, synchronize_session=False)
+    db.session.commit()
+
+
+def complete_submission(submission_id, worker_id, status, result, verdict_key=None):
+    """写回评测结果；租约已被其他进程接管时不覆盖，返回 False。"""
+    updated = Submission.query.filter_by(
+        id=submission_id, judge_worker=worker_id, status='judging'
+    ).update({
+        Submission.status: status,
+        Submission.result: result,
+        Submission.verdict_key: verdict_key,
+        Submission.force_judge: 0,
+        Submission.judged_at: func.now(),
+        Submission.judge_worker: None,
+        Submission.lease_expires_at: None
+    }, synchronize_session=False)
+    db.session.commit()
+    return updated == 1
+
+
+def load_test_cases(problem_id):
+    rows = (db.session.query(TestCase.input_data, TestCase.expected_output, TestCase.is_hidden)
+            .filter(TestCase.problem_id == problem_id)
+            .order_by(TestCase.id)
+            .all())
+    return [
+        {'input': row.input_data, 'expected_output': row.expected_output, 'hidden': bool(row.is_hidden)}
+        for row in rows
+    ]
+
+
+def load_case_hashes(problem_id):
+    """按顺序返回各用例的 (内容哈希, 是否隐藏)，哈希由数据库维护，不传输用例内容本身。"""
+    return (db.session.query(TestCase.content_hash, TestCase.is_hidden)
+            .filter(TestCase.problem_id == problem_id)
+            .order_by(TestCase.id)
+            .all())
+
+
+def test_set_version(problem_id, case_hashes=None):
+    """测试集哈希，由各用例的内容哈希和隐藏标记计算。"""
+    return TestDataCache.make_version(case_hashes if case_hashes is not None else load_case_hashes(problem_id))
+
+
+def reusable_results(previous, config_key, case_hashes):
+    """
+    差异重测：上次评测的评测配置与本次相同时，内容哈希未变的用例沿用上次的结果，
+    返回 {新的用例编号: 上次的结果}。上次被跳过的用例没有结果，需要重新运行。
+    """
+    if not previous or previous.get('config_key') != config_key:
+        return {}
+    by_hash = {}
+    for content_hash, result in zip(previous.get('case_hashes') or [], previous.get('cases') or []):
+        if result.get('status') != 'skipped':
+            by_hash.setdefault(content_hash, result)
+    return {idx: by_hash[row[0]] for idx, row in enumerate(case_hashes, 1) if row[0] in by_hash}
+
+
+def run_problem_tests(judge, problem_id, code, language, checker=None, version=None, reuse=None):
+    """评测一道题的全部用例；配置了测试数据缓存时只在缓存未命中时读取用例内容。"""
+    def load():
+        with judge_metrics.timed('load_test_data', language):
+            return load_test_cases(problem_id)
+
+    if judge.test_data_cache is None:
+        return judge.run_tests(code, language, load(), checker=checker, reuse=reuse)
+    version = version or test_set_version(problem_id)
+    with judge.test_data_cache.checkout(problem_id, version, load) as test_data:
+        return judge.run_tests(code, language, None, checker=checker, test_data=test_data, reuse=reuse)
+
+
+def judge_submission(judge, submission_id, worker_id, verdict_cache=None):
+    """
+    评测一条提交。配置了 verdict_cache 时，代码、测试集和评测配置都相同的已完成提交
+    直接复用其结果；重测时只运行新增或修改过的用例，其余沿用上次的结果。
+    force_judge 标记的提交（强制重测）不复用任何结果。
+    """
+    submission = db.session.get(Submission, submission_id)
+    if submission is None:
+        return
+    start = time.perf_counter()
+    source = 'judged'
+    cases_run = 0
+    verdict_key = None
+    with judge_metrics.trace() as phases:
+        try:
+            code = decrypt_code(submission.code)
+            checker = db.session.query(Problem.checker).filter(Problem.id == submission.problem_id).scalar()
+            case_hashes = load_case_hashes(submission.problem_id)
+            version = test_set_version(submission.problem_id, case_hashes)
+            verdict_key = judge.verdict_key(code, submission.language, version, checker)
+            # 不含测试集的评测配置键，用于判断上次的逐用例结果能否沿用
+            config_key = judge.verdict_key(code, submission.language, None, checker)
+            cached = None
+            if verdict_cache is not None:
+                if submission.force_judge:
+                    verdict_cache.record_bypass()
+                else:
+                    with judge_metrics.timed('verdict_lookup', submission.language):
+                        cached = verdict_cache.get(verdict_key)
+            if cached is not None:
+                status, result = cached
+                source = 'cached'
+            else:
+                reuse = {} if submission.force_judge else \
+                    reusable_results(submission.result, config_key, case_hashes)
+                results = run_problem_tests(judge, submission.problem_id, code, submission.language,
+                                            checker, version=version, reuse=reuse)
+                status = CodeJudge.overall_status(results)
+                cases_run = sum(1 for r in results if r.get('status') != 'skipped') - len(reuse)
+                result = {
+                    'cases': results,
+                    'case_hashes': [row[0] for row in case_hashes],
+                    'config_key': config_key,
+                    'reused_cases': len(reuse)
+                }
+        except Exception as e:
+            status = 'system_error'
+            result = {'error': str(e)}
+    elapsed = time.perf_counter() - start
+    judge_metrics.VERDICTS.inc(language=submission.language, status=status, source=source)
+    judge_metrics.SUBMISSION_SECONDS.observe(elapsed, language=submission.language, source=source)
+    if source == 'judged':
+        judge_metrics.CASES.observe(max(cases_run, 0), language=submission.language)
+    if current_app.config.get('JUDGE_TRACE_LOG'):
+        current_app.logger.info('judge_trace %s', json.dumps({
+            'submission_id': submission_id,
+            'worker': worker_id,
+            'language': submission.language,
+            'status': status,
+            'source': source,
+            'cases_run': cases_run,
+            'seconds': round(elapsed, 6),
+            'phases': phases
+        }))
+    # 评测可能持续较久，结束前先释放读事务
+    db.session.rollback()
+    # 系统错误与代码无关，不作为可复用的结果
+    complete_submission(submission_id, worker_id, status, result,
+                        verdict_key=None if status == 'system_error' else verdict_key)
+
+
+class _WorkerState:
+    """评测进程内各线程共享的状态：正在评测的提交和停止标记。"""
+
+    def __init__(self):
+        self.active = set()
+        self.changed = threading.Condition()
+        self.stopping = threading.Event()
+
+    def snapshot(self):
+        with self.changed:
+            return list(self.active)
+
+    def finish(self, submission_id):
+        with self.changed:
+            self.active.discard(submission_id)
+            self.changed.notify_all()
+
+
+def _judge_job(app, judge, submission_id, worker_id, verdict_cache, state):
+    with app.app_context():
+        try:
+            judge_submission(judge, submission_id, worker_id, verdict_cache)
+        except Exception:
+            db.session.rollback()
+            app.logger.exception('Failed to judge submission %s', submission_id)
+        finally:
+            state.finish(submission_id)
+
+
+def _heartbeat_loop(app, worker_id, state, lease_seconds, interval, done):
+    """定期续约并上报心跳，直到进程内的评测全部结束。"""
+    with app.app_context():
+        while not done.wait(interval):
+            try:
+                heartbeat(worker_id, state.snapshot(), lease_seconds,
+                          status='stopping' if state.stopping.is_set() else 'running')
+            except Exception:
+                db.session.rollback()
+                app.logger.exception('Heartbeat failed for %s', worker_id)
+            finally:
+                db.session.remove()
+
+
+def run_worker(app, worker_id=None, capacity=None, metrics_port=None):
+    """
+    评测进程主循环：登记容量和支持的语言，按空闲容量领取提交并在线程池中并发评测，
+    后台线程定期心跳并为正在评测的提交续约，进程失联后租约很快到期，提交由其他节点重新领取。
+    每隔 JUDGE_REJUDGE_INTERVAL 秒推进一次批量重测任务；给出 metrics_port 时在该端口提供 /metrics。
+    收到 SIGTERM 后不再领取新提交，处理完当前提交再退出。
+    """
+    worker_id = worker_id or default_worker_id()
+    state = _WorkerState()
+    signal.signal(signal.SIGTERM, lambda signum, frame: state.stopping.set())
+
+    with app.app_context():
+        judge = CodeJudge(**app.config.get('JUDGE_OPTIONS', {}))
+        capacity = capacity or app.config.get('JUDGE_WORKER_CAPACITY', 1)
+        languages = app.config.get('JUDGE_LANGUAGES') or judge.supported_languages()
+        lease_seconds = app.config.get('JUDGE_LEASE_SECONDS', 60)
+        heartbeat_interval = app.config.get('JUDGE_HEARTBEAT_INTERVAL', 15)
+        poll_interval = app.config.get('JUDGE_POLL_INTERVAL', 1.0)
+        if metrics_port:
+            judge_metrics.start_http_server(metrics_port)
+        rejudge_interval = app.config.get('JUDGE_REJUDGE_INTERVAL', 5)
+        next_rejudge = 0
+        verdict_cache = VerdictCache() if app.config.get('JUDGE_VERDICT_CACHE', True) else None
+        scheduler = JudgeScheduler(**app.config.get('JUDGE_SCHEDULER', {}))
+        register_worker(worker_id, capacity, languages)
+        app.logger.info('Judge worker %s started: capacity=%s languages=%s', worker_id, capacity, languages)
+
+        done = threading.Event()
+        heartbeat_thread = threading.Thread(
+            target=_heartbeat_loop,
+            args=(app, worker_id, state, lease_seconds, heartbeat_interval, done),
+            name='judge-heartbeat',
+            daemon=True
+        )
+        heartbeat_thread.start()
+        with ThreadPoolExecutor(max_workers=capacity, thread_name_prefix='judge') as executor:
+            while not state.stopping.is_set():
+                if time.monotonic() >= next_rejudge:
+                    next_rejudge = time.monotonic() + rejudge_interval
+                    try:
+                        advance_rejudge_jobs()
+                    except Exception:
+                        app.logger.exception('Failed to advance rejudge jobs')
+                    finally:
+                        db.session.remove()
+                with state.changed:
+                    free = capacity - len(state.active)
+                    if free <= 0:
+                        state.changed.wait(poll_interval)
+                        continue
+                try:
+                    ids = claim_submissions(worker_id, limit=free, lease_seconds=lease_seconds,
+                                            scheduler=scheduler, languages=languages)
+                except Exception:
+                    db.session.rollback()
+                    app.logger.exception('Failed to claim submissions')
+                    ids = []
+                finally:
+                    db.session.remove()
+                if not ids:
+                    state.stopping.wait(poll_interval)
+                    continue
+                with state.changed:
+                    state.active.update(ids)
+                for submission_id in ids:
+                    executor.submit(_judge_job, app, judge, submission_id, worker_id, verdict_cache, state)
+        done.set()
+        heartbeat_thread.join()
+        heartbeat(worker_id, [], lease_seconds, status='stopped')
+        if verdict_cache is not None:
+            app.logger.info('Verdict cache stats for %s: %s', worker_id, verdict_cache.stats())
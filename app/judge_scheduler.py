@@ -0,0 +1,172 @@
+from collections import Counter
+from flask import current_app
+from sqlalchemy import case, func, or_, text
+from app.extensions import db
+from app.models import Submission, Assignment
+
+QUEUE_CLASSES = ('assignment', 'practice', 'rejudge')
+# 调度优先级从高到低：截止前临近时提交的作业、练习（含远离截止或截止后的作业提交）、批量重测
+PRIORITY_CLASSES = ('deadline', 'practice', 'rejudge')
+
+
+class JudgeScheduler:
+    """
+    评测调度：决定评测进程下一次领取哪些提交。
+    先按优先级类别，同类别内按用户当前正在评测的提交数做公平分配（少者优先），再按入队时间；
+    每个队列可以设置并发上限，等待超过 aging_seconds 的提交不论类别优先领取，避免饿死。
+    候选按用户取：每个队列中每个用户只取最早的 per_user_limit 条，一个用户大量提交不会挤掉其他用户。
+    """
+
+    def __init__(self, deadline_window=3600, queue_limits=None, aging_seconds=900, scan_limit=200,
+                 per_user_limit=4):
+        self.deadline_window = deadline_window
+        self.queue_limits = queue_limits or {}
+        self.aging_seconds = aging_seconds
+        self.scan_limit = scan_limit
+        self.per_user_limit = per_user_limit
+
+    def priority_class(self, candidate):
+        # 按提交时间而不是当前时间判断，截止后才交的提交不再享有截止优先
+        if candidate.queue_class == 'rejudge':
+            return 'rejudge'
+        if candidate.end_time is not None and candidate.submitted_at is not None and \
+                0 <= (candidate.end_time - candidate.submitted_at).total_seconds() <= self.deadline_window:
+            return 'deadline'
+        return 'practice'
+
+    def candidates(self, languages=None):
+        """
+        每个队列中每个用户最早的 per_user_limit 条待评测提交（不加锁），languages 限定评测进程支持的语言。
+        每个队列至多 scan_limit 条，先取各用户的第一条，再取第二条，依此类推。
+        """
+        rows = []
+        for queue_class in QUEUE_CLASSES:
+            query = (db.session.query(
+                Submission.id, Submission.user_id, Submission.queue_class,
+                Submission.queued_at, Submission.submitted_at, Assignment.end_time,
+                func.row_number().over(partition_by=Submission.user_id, order_by=Submission.id).label('user_rank')
+            ).outerjoin(Assignment, Assignment.id == Submission.assignment_id)
+             .filter(Submission.status == 'judging',
+                     Submission.queue_class == queue_class,
+                     or_(Submission.lease_expires_at.is_(None),
+                         Submission.lease_expires_at < func.now())))
+            if languages is not None:
+                query = query.filter(Submission.language.in_(languages))
+            ranked = query.subquery()
+            rows.extend(db.session.query(
+                ranked.c.id, ranked.c.user_id, ranked.c.queue_class,
+                ranked.c.queued_at, ranked.c.submitted_at, ranked.c.end_time
+            ).filter(ranked.c.user_rank <= self.per_user_limit)
+             .order_by(ranked.c.user_rank, ranked.c.id)
+             .limit(self.scan_limit)
+             .all())
+        return rows
+
+    @staticmethod
+    def in_flight():
+        """正在评测（租约未过期）的提交数，分别按用户和队列统计。"""
+        rows = (db.session.query(Submission.user_id, Submission.queue_class, func.count())
+                .filter(Submission.status == 'judging', Submission.lease_expires_at >= func.now())
+                .group_by(Submission.user_id, Submission.queue_class)
+                .all())
+        user_load, queue_load = Counter(), Counter()
+        for user_id, queue_class, count in rows:
+            user_load[user_id] += count
+            queue_load[queue_class] += count
+        return user_load, queue_load
+
+    def pick(self, candidates, user_load, queue_load, now, limit):
+        """从候选中按调度规则依次选出至多 limit 条，返回提交ID列表。"""
+        ranks = {name: rank for rank, name in enumerate(PRIORITY_CLASSES)}
+
+        def order(candidate):
+            waited = (now - candidate.queued_at).total_seconds() if candidate.queued_at else 0
+            rank = -1 if waited >= self.aging_seconds else ranks[self.priority_class(candidate)]
+            return rank, user_load[candidate.user_id], candidate.queued_at or now, candidate.id
+
+        remaining = list(candidates)
+        chosen = []
+        while remaining and len(chosen) < limit:
+            eligible = [c for c in remaining
+                        if queue_load[c.queue_class] < self.queue_limits.get(c.queue_class, float('inf'))]
+            if not eligible:
+                break
+            # 每选中一条，该用户的负载加一，下一条重新比较
+            best = min(eligible, key=order)
+            remaining.remove(best)
+            chosen.append(best.id)
+            user_load[best.user_id] += 1
+            queue_load[best.queue_class] += 1
+        return chosen
+
+    def select(self, limit, languages=None):
+        now = db.session.query(func.now()).scalar()
+        user_load, queue_load = self.in_flight()
+        return self.pick(self.candidates(languages), user_load, queue_load, now, limit)
+
+
+def priority_class_column(deadline_window):
+    """SQL 中的调度优先级类别，与 JudgeScheduler.priority_class 一致；查询须外连接 Assignment。"""
+    to_deadline = func.timestampdiff(text('SECOND'), Submission.submitted_at, Assignment.end_time)
+    return case(
+        (Submission.queue_class == 'rejudge', 'rejudge'),
+        (to_deadline.between(0, deadline_window), 'deadline'),
+        else_='practice'
+    )
+
+
+def _percentiles(priority_class, value, recent, fractions):
+    """
+    在数据库中按类别计算 value 的分位数，不把明细取回：窗口函数给每类的值排序编号，
+    每个分位数取编号为 round(f*(n-1))+1 的那一行。返回 {类别: (条数, [各分位数])}。
+    """
+    ranked = (db.session.query(
+        priority_class.label('priority_class'),
+        value.label('duration'),
+        func.row_number().over(partition_by=priority_class, order_by=value).label('class_rank'),
+        func.count().over(partition_by=priority_class).label('class_size')
+    ).outerjoin(Assignment, Assignment.id == Submission.assignment_id)
+     .filter(recent, value.isnot(None))
+     .subquery())
+    picks = [func.max(case((ranked.c.class_rank == func.round(fraction * (ranked.c.class_size - 1)) + 1, ranked.c.duration)))
+             for fraction in fractions]
+    rows = (db.session.query(ranked.c.priority_class, func.count(), *picks)
+            .group_by(ranked.c.priority_class)
+            .all())
+    return {row[0]: (row[1], [int(v) if v is not None else None for v in row[2:]]) for row in rows}
+
+
+def queue_metrics(window_seconds=3600, deadline_window=None):
+    """
+    按调度优先级类别（deadline、practice、rejudge）统计待评测数、正在评测数，以及最近 window_seconds 内完成的提交的
+    等待时间（入队到开始评测）和出结果时间（入队到完成）的 p50/p99，单位秒。分位数在数据库中计算。
+    deadline_window 默认取 JUDGE_SCHEDULER 配置。
+    """
+    if deadline_window is None:
+        deadline_window = current_app.config.get('JUDGE_SCHEDULER', {}).get('deadline_window', 3600)
+    priority_class = priority_class_column(deadline_window)
+    metrics = {name: {'depth': 0, 'in_flight': 0, 'completed': 0, 'wait_p50': None, 'wait_p99': None,
+                      'verdict_p50': None, 'verdict_p99': None} for name in PRIORITY_CLASSES}
+    lease_free = or_(Submission.lease_expires_at.is_(None), Submission.lease_expires_at < func.now())
+    rows = (db.session.query(
+        priority_class,
+        func.sum(case((lease_free, 1), else_=0)),
+        func.count()
+    ).outerjoin(Assignment, Assignment.id == Submission.assignment_id)
+     .filter(Submission.status == 'judging')
+     .group_by(priority_class)
+     .all())
+    for name, waiting, total in rows:
+        metrics[name]['depth'] = int(waiting or 0)
+        metrics[name]['in_flight'] = int(total) - int(waiting or 0)
+
+    recent = Submission.judged_at >= func.timestampadd(text('SECOND'), -window_seconds, func.now())
+    waits = _percentiles(priority_class, func.timestampdiff(text('SECOND'), Submission.queued_at, Submission.started_at),
+                         recent, (0.5, 0.99))
+    verdicts = _percentiles(priority_class, func.timestampdiff(text('SECOND'), Submission.queued_at, Submission.judged_at),
+                            recent, (0.5, 0.99))
+    for name, (_, (p50, p99)) in waits.items():
+        metrics[name].update({'wait_p50': p50, 'wait_p99': p99})
+    for name, (completed, (p50, p99)) in verdicts.items():
+        metrics[name].update({'completed': completed, 'verdict_p50': p50, 'verdict_p99': p99})
+    return metrics
@@ -1,6 +1,6 @@
 from .extensions import db
 from sqlalchemy.dialects.mysql import ENUM, TINYINT, INTEGER, DATETIME, DECIMAL, JSON
-from sqlalchemy import text
+from sqlalchemy import text, Computed
 
 class User(db.Model):
     __tablename__ = 'users'
@@ -9,6 +9,7 @@ class User(db.Model):
     password_hash = db.Column(db.String(255), nullable=False, comment='密码哈希')
     email = db.Column(db.String(128), unique=True, nullable=False, comment='邮箱')
     role = db.Column(ENUM('admin', 'teacher', 'student'), nullable=False, default='student', comment='用户角色')
+    token_version = db.Column(INTEGER(unsigned=True), nullable=False, default=0, comment='令牌版本，角色或密码变更时加一，旧令牌失效')
     created_at = db.Column(DATETIME(fsp=0), nullable=False, server_default=text('CURRENT_TIMESTAMP'), comment='创建时间')
 
     # 反向引用
@@ -16,6 +17,10 @@ class User(db.Model):
     assignments = db.relationship('Assignment', backref='creator', lazy='dynamic', foreign_keys='Assignment.created_by')
     submissions = db.relationship('Submission', backref='user', lazy='dynamic', foreign_keys='Submission.user_id')
 
+    __table_args__ = (
+        db.Index('idx_role_id', 'role', 'id'),
+    )
+
     def __repr__(self):
         return f'<User {self.username}>'
 
@@ -30,6 +35,7 @@ class Problem(db.Model):
     created_at = db.Column(DATETIME(fsp=0), nullable=False, server_default=text('CURRENT_TIMESTAMP'), comment='创建时间')
     language = db.Column(ENUM('python', 'c', 'cpp'), nullable=True, comment='编程题语言，仅编程题有效')
     reference_code = db.Column(db.Text, nullable=True, comment='参考代码，仅编程题有效')
+    checker = db.Column(JSON, nullable=True, comment='输出比较方式（JSON格式），为空时逐字节比较')
 
     # 反向引用
     test_cases = db.relationship('TestCase', backref='problem', lazy='dynamic', cascade='all, delete-orphan', foreign_keys='TestCase.problem_id')
@@ -46,6 +52,7 @@ class TestCase(db.Model):
     input_data = db.Column(db.Text, nullable=False, comment='输入数据')
     expected_output = db.Column(db.Text, nullable=False, comment='期望输出')
     is_hidden = db.Column(TINYINT(1), nullable=False, default=0, comment='是否为隐藏用例')
+    content_hash = db.Column(db.CHAR(32), Computed('md5(concat(md5(input_data), md5(expected_output)))', persisted=True), comment='输入和期望输出的哈希，由数据库维护')
 
     def __repr__(self):
         return f'<TestCase {self.id} for Problem {self.problem_id}>'
@@ -58,6 +65,7 @@ class Assignment(db.Model):
     start_time = db.Column(DATETIME(fsp=0), nullable=False, comment='开始时间')
     end_time = db.Column(DATETIME(fsp=0), nullable=False, comment='结束时间')
     created_by = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE', onupdate='CASCADE'), nullable=False, index=True, comment='创建者ID（老师，外键）')
+    version = db.Column(INTEGER(unsigned=True), nullable=False, default=0, comment='内容版本，作业或其题目变更时加一，用于详情缓存和ETag')
 
     # 反向引用
     assignment_problems = db.relationship('AssignmentProblem', backref='assignment', lazy='dynamic', cascade='all, delete-orphan', foreign_keys='AssignmentProblem.assignment_id')
@@ -73,6 +81,10 @@ class AssignmentProblem(db.Model):
     problem_id = db.Column(db.Integer, db.ForeignKey('problems.id', ondelete='CASCADE', onupdate='CASCADE'), nullable=False, index=True, comment='题目ID（外键）')
     score = db.Column(DECIMAL(5,2), nullable=False, default=0, comment='题目分值')
 
+    __table_args__ = (
+        db.Index('uk_assignment_problem', 'assignment_id', 'problem_id', unique=True),
+    )
+
     def __repr__(self):
         return f'<AssignmentProblem Assignment {self.assignment_id} Problem {self.problem_id}>'
 
@@ -87,6 +99,84 @@ class Submission(db.Model):
     status = db.Column(ENUM('judging', 'accepted', 'wrong_answer', 'runtime_error', 'compile_error', 'time_limit_exceeded', 'memory_limit_exceeded', 'output_limit_exceeded', 'system_error'), nullable=False, default='judging', comment='评测状态')
     result = db.Column(JSON, nullable=True, comment='评测结果（JSON格式）')
     submitted_at = db.Column(DATETIME(fsp=0), nullable=False, server_default=text('CURRENT_TIMESTAMP'), comment='提交时间')
+    judge_worker = db.Column(db.String(64), nullable=True, comment='当前持有评测租约的评测进程')
+    lease_expires_at = db.Column(DATETIME(fsp=0), nullable=True, comment='评测租约到期时间')
+    verdict_key = db.Column(db.String(64), nullable=True, comment='评测结果去重键（代码、测试集和评测配置的哈希）')
+    force_judge = db.Column(TINYINT(1), nullable=False, default=0, comment='重新评测时不使用结果缓存')
+    queue_class = db.Column(ENUM('assignment', 'practice', 'rejudge'), nullable=False, default='practice', server_default='practice', comment='评测队列类别')
+    queued_at = db.Column(DATETIME(fsp=0), nullable=False, server_default=text('CURRENT_TIMESTAMP'), comment='进入评测队列时间')
+    started_at = db.Column(DATETIME(fsp=0), nullable=True, comment='开始评测时间')
+    judged_at = db.Column(DATETIME(fsp=0), nullable=True, comment='评测完成时间')
+    rejudge_job_id = db.Column(db.Integer, db.ForeignKey('rejudge_jobs.id', ondelete='SET NULL', onupdate='CASCADE'), nullable=True, comment='最近一次批量重测任务ID（外键，可为空）')
+
+    __table_args__ = (
+        db.Index('idx_status_lease', 'status', 'lease_expires_at'),
+        db.Index('idx_status_class', 'status', 'queue_class'),
+        db.Index('idx_verdict_key', 'verdict_key'),
+        db.Index('idx_judged_at', 'judged_at'),
+        db.Index('idx_rejudge_job_status', 'rejudge_job_id', 'status'),
+    )
 
     def __repr__(self):
         return f'<Submission {self.id} by User {self.user_id}>'
+
+class JudgeWorker(db.Model):
+    __tablename__ = 'judge_workers'
+    id = db.Column(db.String(64), primary_key=True, comment='评测进程ID（主机名:进程号）')
+    hostname = db.Column(db.String(255), nullable=False, comment='所在主机')
+    capacity = db.Column(INTEGER(unsigned=True), nullable=False, default=1, comment='可同时评测的提交数')
+    languages = db.Column(JSON, nullable=False, comment='支持的语言列表')
+    in_flight = db.Column(INTEGER(unsigned=True), nullable=False, default=0, comment='正在评测的提交数')
+    status = db.Column(ENUM('running', 'stopping', 'stopped'), nullable=False, default='running', comment='运行状态')
+    started_at = db.Column(DATETIME(fsp=0), nullable=False, server_default=text('CURRENT_TIMESTAMP'), comment='启动时间')
+    last_heartbeat = db.Column(DATETIME(fsp=0), nullable=False, server_default=text('CURRENT_TIMESTAMP'), comment='最近一次心跳时间')
+
+    __table_args__ = (
+        db.Index('idx_last_heartbeat', 'last_heartbeat'),
+    )
+
+    def __repr__(self):
+        return f'<JudgeWorker {self.id}>'
+
+class RejudgeJob(db.Model):
+    __tablename__ = 'rejudge_jobs'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True, comment='主键ID')
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE', onupdate='CASCADE'), nullable=False, index=True, comment='发起人ID（外键）')
+    problem_id = db.Column(db.Integer, db.ForeignKey('problems.id', ondelete='CASCADE', onupdate='CASCADE'), nullable=True, comment='限定题目ID，为空不限')
+    assignment_id = db.Column(db.Integer, db.ForeignKey('assignments.id', ondelete='CASCADE', onupdate='CASCADE'), nullable=True, comment='限定作业ID，为空不限')
+    min_submission_id = db.Column(db.Integer, nullable=False, default=0, comment='提交ID下界（含）')
+    max_submission_id = db.Column(db.Integer, nullable=False, comment='提交ID上界（含），创建时确定')
+    force_judge = db.Column(TINYINT(1), nullable=False, default=0, comment='不复用缓存的评测结果')
+    batch_size = db.Column(INTEGER(unsigned=True), nullable=False, default=200, comment='每批放入评测队列的提交数')
+    max_pending = db.Column(INTEGER(unsigned=True), nullable=False, default=200, comment='同时在队列中的提交数上限')
+    last_enqueued_id = db.Column(db.Integer, nullable=False, default=0, comment='已放入队列的最大提交ID（分批游标）')
+    total = db.Column(INTEGER(unsigned=True), nullable=False, default=0, comment='范围内的提交数')
+    enqueued = db.Column(INTEGER(unsigned=True), nullable=False, default=0, comment='已放入队列的提交数')
+    deferred_ids = db.Column(JSON, nullable=True, comment='扫描时正在评测而跳过的提交ID，评测完成后再放入队列')
+    status = db.Column(ENUM('running', 'finished', 'cancelled'), nullable=False, default='running', comment='任务状态')
+    created_at = db.Column(DATETIME(fsp=0), nullable=False, server_default=text('CURRENT_TIMESTAMP'), comment='创建时间')
+    finished_at = db.Column(DATETIME(fsp=0), nullable=True, comment='完成时间')
+
+    __table_args__ = (
+        db.Index('idx_status', 'status'),
+    )
+
+    def __repr__(self):
+        return f'<RejudgeJob {self.id}>'
+
+class StudentImportJob(db.Model):
+    __tablename__ = 'student_import_jobs'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True, comment='主键ID')
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE', onupdate='CASCADE'), nullable=False, index=True, comment='发起人ID（外键）')
+    status = db.Column(ENUM('running', 'finished', 'failed'), nullable=False, default='running', comment='任务状态')
+    total_rows = db.Column(INTEGER(unsigned=True), nullable=False, default=0, comment='文件中的非空行数')
+    processed = db.Column(INTEGER(unsigned=True), nullable=False, default=0, comment='已处理行数')
+    created = db.Column(INTEGER(unsigned=True), nullable=False, default=0, comment='已创建的学生数')
+    failed = db.Column(INTEGER(unsigned=True), nullable=False, default=0, comment='失败行数')
+    errors = db.Column(JSON, nullable=True, comment='逐行错误报告（JSON格式）')
+    message = db.Column(db.String(255), nullable=True, comment='任务失败原因')
+    created_at = db.Column(DATETIME(fsp=0), nullable=False, server_default=text('CURRENT_TIMESTAMP'), comment='创建时间')
+    finished_at = db.Column(DATETIME(fsp=0), nullable=True, comment='完成时间')
+
+    def __repr__(self):
+        return f'<StudentImportJob {self.id}>'
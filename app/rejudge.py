@@ -0,0 +1,196 @@
+from flask import current_app
+from sqlalchemy import func, or_
+from app.extensions import db
+from app.models import Submission, RejudgeJob
+
+
+def _scope_query(job):
+    """任务范围内的提交：按题目、作业和提交ID区间筛选。"""
+    query = Submission.query.filter(Submission.id >= job.min_submission_id,
+                                    Submission.id <= job.max_submission_id)
+    if job.problem_id is not None:
+        query = query.filter(Submission.problem_id == job.problem_id)
+    if job.assignment_id is not None:
+        query = query.filter(Submission.assignment_id == job.assignment_id)
+    return query
+
+
+def create_rejudge_job(user_id, problem_id=None, assignment_id=None, min_submission_id=None,
+                       max_submission_id=None, force=False, batch_size=200, max_pending=200):
+    """
+    创建批量重测任务。提交ID上界在创建时确定，之后的新提交本来就按新的测试数据评测，不在范围内。
+    任务只记录范围和游标，提交由评测进程分批放入 rejudge 队列，见 advance_rejudge_jobs。
+    """
+    job = RejudgeJob(
+        created_by=user_id,
+        problem_id=problem_id,
+        assignment_id=assignment_id,
+        min_submission_id=min_submission_id or 0,
+        max_submission_id=0,
+        force_judge=1 if force else 0,
+        batch_size=batch_size,
+        max_pending=max_pending
+    )
+    scope_max = _scope_query(job).with_entities(func.max(Submission.id)).scalar() or 0
+    job.max_submission_id = min(scope_max, max_submission_id) if max_submission_id else scope_max
+    job.total = _scope_query(job).with_entities(func.count(Submission.id)).scalar()
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def _pending(job_id):
+    return (db.session.query(func.count(Submission.id))
+            .filter(Submission.rejudge_job_id == job_id, Submission.status == 'judging')
+            .scalar())
+
+
+def _enqueue(job, ids):
+    """一条 UPDATE 放入整批；正在评测中的提交跳过，不打断。返回放入的条数。"""
+    if not ids:
+        return 0
+    return Submission.query.filter(
+        Submission.id.in_(ids),
+        Submission.status != 'judging'
+    ).update({
+        Submission.status: 'judging',
+        Submission.force_judge: job.force_judge,
+        Submission.queue_class: 'rejudge',
+        Submission.rejudge_job_id: job.id,
+        Submission.queued_at: func.now(),
+        Submission.started_at: None,
+        Submission.judged_at: None,
+        Submission.judge_worker: None,
+        Submission.lease_expires_at: None
+    }, synchronize_session=False)
+
+
+def _skipped(job, ids):
+    """
+    本事务内看得到刚才的 UPDATE：ids 中没被本任务接管、且正在进行的评测在任务创建前就已开始的提交，
+    即会按旧数据出结果的提交。还没被领取或任务创建后才开始评测的，用的已是新数据。
+    """
+    return [row.id for row in Submission.query
+            .with_entities(Submission.id)
+            .filter(Submission.id.in_(ids),
+                    or_(Submission.rejudge_job_id.is_(None), Submission.rejudge_job_id != job.id),
+                    Submission.started_at <= job.created_at)
+            .all()]
+
+
+def _retry_deferred(job, room):
+    """
+    处理之前跳过的提交：旧的评测结束后重新放入队列，仍在评测的继续等待。
+    任务创建后才开始（如租约到期被重新领取）的评测用的已是新数据，不再补；
+    旧的评测超过 JUDGE_REJUDGE_DEFERRED_TIMEOUT 秒仍未结束时视为卡住，不再等待，
+    它被重新领取时同样按新数据评测。已删除的提交直接丢弃。
+    """
+    deferred = job.deferred_ids or []
+    if not deferred:
+        return 0
+    timeout = current_app.config.get('JUDGE_REJUDGE_DEFERRED_TIMEOUT', 1800)
+    now = db.session.query(func.now()).scalar()
+    ready, waiting = [], []
+    for submission_id, status, started_at in (db.session.query(Submission.id, Submission.status, Submission.started_at)
+                                              .filter(Submission.id.in_(deferred))
+                                              .all()):
+        if started_at is not None and started_at > job.created_at:
+            continue
+        if status != 'judging':
+            ready.append(submission_id)
+        elif started_at is not None and (now - started_at).total_seconds() < timeout:
+            waiting.append(submission_id)
+    ready.sort()
+    waiting += ready[room:]
+    ready = ready[:room]
+    queued = _enqueue(job, ready)
+    if queued < len(ready):
+        waiting += _skipped(job, ready)
+    job.deferred_ids = sorted(waiting) or None
+    return queued
+
+
+def _advance(job):
+    """
+    在节流上限内把下一批提交放入队列；范围已取完、队列中没有剩余且没有待补的提交时结束任务。
+    扫描时正在按旧数据评测的提交记入 deferred_ids，评测完成后再放入队列，见 _retry_deferred。
+    """
+    pending = _pending(job.id)
+    room = min(job.batch_size, job.max_pending - pending)
+    if room <= 0:
+        return 0
+    queued = _retry_deferred(job, room)
+    job.enqueued += queued
+    room -= queued
+    # 按主键的键集分页，不用 OFFSET，每批都是一次索引范围扫描
+    ids = [row.id for row in _scope_query(job)
+           .with_entities(Submission.id)
+           .filter(Submission.id > job.last_enqueued_id)
+           .order_by(Submission.id)
+           .limit(room)
+           .all()] if room > 0 else []
+    if not ids:
+        if queued == 0 and pending == 0 and not job.deferred_ids:
+            job.status = 'finished'
+            job.finished_at = func.now()
+        return queued
+    updated = _enqueue(job, ids)
+    if updated < len(ids):
+        job.deferred_ids = sorted(set(job.deferred_ids or []) | set(_skipped(job, ids))) or None
+    job.last_enqueued_id = ids[-1]
+    job.enqueued += updated
+    return queued + updated
+
+
+def advance_rejudge_jobs():
+    """
+    推进所有进行中的重测任务，由评测进程定期调用，返回本次放入队列的提交数。
+    任务行用 SKIP LOCKED 加锁，多个评测进程同时调用时每个任务只被推进一次。
+    """
+    jobs = (RejudgeJob.query
+            .filter(RejudgeJob.status == 'running')
+            .order_by(RejudgeJob.id)
+            .with_for_update(skip_locked=True)
+            .all())
+    queued = 0
+    try:
+        for job in jobs:
+            queued += _advance(job)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return queued
+
+
+def rejudge_progress(job):
+    """任务进度：已完成数、队列中数、各结果的分布、吞吐量（提交/秒）和预计剩余秒数。"""
+    rows = (db.session.query(Submission.status, func.count(Submission.id))
+            .filter(Submission.rejudge_job_id == job.id)
+            .group_by(Submission.status)
+            .all())
+    statuses = {status: count for status, count in rows}
+    pending = statuses.pop('judging', 0)
+    completed = max(job.enqueued - pending, 0)
+    end = job.finished_at or db.session.query(func.now()).scalar()
+    elapsed = max((end - job.created_at).total_seconds(), 1)
+    throughput = completed / elapsed
+    remaining = max(job.total - completed, 0) if job.status == 'running' else 0
+    return {
+        'id': job.id,
+        'status': job.status,
+        'problem_id': job.problem_id,
+        'assignment_id': job.assignment_id,
+        'min_submission_id': job.min_submission_id,
+        'max_submission_id': job.max_submission_id,
+        'total': job.total,
+        'enqueued': job.enqueued,
+        'pending': pending,
+        'deferred': len(job.deferred_ids or []),
+        'completed': completed,
+        'results': statuses,
+        'throughput': round(throughput, 3),
+        'eta_seconds': round(remaining / throughput) if throughput and remaining else None,
+        'created_at': job.created_at.isoformat(),
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None
+    }
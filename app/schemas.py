@@ -1,8 +1,22 @@
 from app.extensions import ma
-from app.models import User
+from app.models import User, Problem, Assignment
 
 class UserSchema(ma.SQLAlchemyAutoSchema):
     class Meta:
         model = User
         load_instance = True
         include_fk = True
+        exclude = ('password_hash',)
+
+class ProblemSchema(ma.SQLAlchemyAutoSchema):
+    class Meta:
+        model = Problem
+        load_instance = True
+        include_fk = True
+
+class AssignmentSchema(ma.SQLAlchemyAutoSchema):
+    class Meta:
+        model = Assignment
+        load_instance = True
+        include_fk = True
+        exclude = ('version',)
@@ -0,0 +1,226 @@
+import os
+import csv
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from flask import current_app
+from sqlalchemy import func, or_, insert
+from sqlalchemy.exc import IntegrityError
+from werkzeug.security import generate_password_hash
+from app.extensions import db
+from app.models import User, StudentImportJob
+
+FIELDNAMES = ['username', 'password', 'email']
+MAX_REPORTED_ERRORS = 1000
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def _hash_pool():
+    """每个进程共用一个哈希进程池；fork 出的 Web 进程各自重新创建。"""
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            workers = current_app.config.get('STUDENT_IMPORT_HASH_WORKERS') or None
+            _pool = ProcessPoolExecutor(max_workers=workers)
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def _hash(password):
+    return generate_password_hash(password)
+
+
+class RowReadError(ValueError):
+    """CSV 从某一行起无法读取（编码错误或格式错误），line 为第一个读不出的行号。"""
+
+    def __init__(self, line, message):
+        super().__init__(message)
+        self.line = line
+
+
+def _decoded_lines(binary_stream):
+    # 逐个物理行解码（UTF-8 的多字节字符不含换行字节），编码错误能对应到具体的行
+    encoding = 'utf-8-sig'
+    for raw in binary_stream:
+        yield raw.decode(encoding)
+        encoding = 'utf-8'
+
+
+def read_rows(binary_stream):
+    """
+    逐行读取 CSV（username,password,email，无表头），不把整个文件读入内存；生成 (行号, 行)。
+    读取出错时抛出 RowReadError，之前生成的行不受影响。
+    """
+    reader = csv.DictReader(_decoded_lines(binary_stream), fieldnames=FIELDNAMES)
+    try:
+        for row in reader:
+            yield reader.line_num, row
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise RowReadError(reader.line_num + 1, str(e)) from e
+
+
+def _validate(line, row, seen_usernames, seen_emails):
+    username = (row.get('username') or '').strip()
+    password = row.get('password') or ''
+    email = (row.get('email') or '').strip()
+    if not username or not password or not email:
+        return None, 'username, password and email are required'
+    if len(username) > 64 or len(email) > 128:
+        return None, 'username or email too long'
+    if username in seen_usernames:
+        return None, 'Duplicate username in file'
+    if email in seen_emails:
+        return None, 'Duplicate email in file'
+    seen_usernames.add(username)
+    seen_emails.add(email)
+    return {'line': line, 'username': username, 'password': password, 'email': email}, None
+
+
+def _existing(batch):
+    """一次查询找出本批中已存在的用户名和邮箱。"""
+    rows = (db.session.query(User.username, User.email)
+            .filter(or_(User.username.in_([r['username'] for r in batch]),
+                        User.email.in_([r['email'] for r in batch])))
+            .all())
+    return {username for username, _ in rows}, {email for _, email in rows}
+
+
+def _insert_batch(batch, report):
+    """先做集合查重，再并行哈希密码，最后一条多行 INSERT 写入。"""
+    usernames, emails = _existing(batch)
+    valid = []
+    for row in batch:
+        if row['username'] in usernames:
+            _error(report, row['line'], row['username'], 'Username already exists')
+        elif row['email'] in emails:
+            _error(report, row['line'], row['username'], 'Email already exists')
+        else:
+            valid.append(row)
+    if not valid:
+        return
+    hashes = _hash_pool().map(_hash, [row['password'] for row in valid], chunksize=8)
+    values = [{'username': row['username'], 'email': row['email'], 'password_hash': password_hash,
+               'role': 'student'} for row, password_hash in zip(valid, hashes)]
+    try:
+        db.session.execute(insert(User), values)
+        db.session.commit()
+        report['created'] += len(values)
+    except IntegrityError:
+        # 查重之后被并发插入抢先：逐行重试，只让冲突的行失败，哈希不用重新计算
+        db.session.rollback()
+        for row, value in zip(valid, values):
+            try:
+                db.session.execute(insert(User), [value])
+                db.session.commit()
+                report['created'] += 1
+            except IntegrityError:
+                db.session.rollback()
+                _error(report, row['line'], row['username'], 'Username or email already exists')
+
+
+def _error(report, line, username, message):
+    report['failed'] += 1
+    if len(report['errors']) < MAX_REPORTED_ERRORS:
+        report['errors'].append({'line': line, 'username': username, 'error': message})
+
+
+def new_report():
+    return {'processed': 0, 'created': 0, 'failed': 0, 'errors': []}
+
+
+def import_student_rows(rows, batch_size=500, on_progress=None, report=None):
+    """
+    导入学生，rows 为 read_rows 生成的 (行号, 行)。
+    不合法或重复的行记入报告并跳过，不中断整个导入；每批单独提交。
+    文件从某行起读不出时，该行号和原因记入报告，已读到的行照常导入，之后的行不再处理。
+    返回 {'processed', 'created', 'failed', 'errors'}，errors 最多保留 MAX_REPORTED_ERRORS 条（读取错误总会保留）。
+    """
+    report = report if report is not None else new_report()
+    seen_usernames, seen_emails = set(), set()
+    batch = []
+    rows = iter(rows)
+    while True:
+        try:
+            line, row = next(rows)
+        except StopIteration:
+            break
+        except RowReadError as e:
+            # 之前的批次已经提交，报告必须让调用方知道从哪一行起没有处理
+            report['failed'] += 1
+            report['errors'].append({'line': e.line, 'username': '', 'error': f'Failed to read CSV: {e}'})
+            break
+        report['processed'] += 1
+        parsed, error = _validate(line, row, seen_usernames, seen_emails)
+        if error:
+            _error(report, line, (row.get('username') or '').strip(), error)
+        else:
+            batch.append(parsed)
+        if len(batch) >= batch_size:
+            _insert_batch(batch, report)
+            batch = []
+            if on_progress:
+                on_progress(report)
+    if batch:
+        _insert_batch(batch, report)
+    return report
+
+
+def start_import_job(user_id, binary_stream):
+    """
+    异步导入：先把上传文件流式存到临时文件，再在后台线程中导入，进度写入 student_import_jobs。
+    返回任务对象。
+    """
+    with tempfile.NamedTemporaryFile(prefix='student_import_', suffix='.csv', delete=False) as tmp:
+        shutil.copyfileobj(binary_stream, tmp)
+        path = tmp.name
+    with open(path, 'rb') as f:
+        total = sum(1 for line in f if line.strip())
+    job = StudentImportJob(created_by=user_id, total_rows=total)
+    db.session.add(job)
+    db.session.commit()
+    app = current_app._get_current_object()
+    threading.Thread(target=_run_import_job, args=(app, job.id, path),
+                     name=f'student-import-{job.id}', daemon=True).start()
+    return job
+
+
+def _update_job(job_id, report, **fields):
+    fields.update(processed=report['processed'], created=report['created'],
+                  failed=report['failed'], errors=report['errors'])
+    StudentImportJob.query.filter_by(id=job_id).update(fields, synchronize_session=False)
+    db.session.commit()
+
+
+def _run_import_job(app, job_id, path):
+    with app.app_context():
+        report = new_report()
+        try:
+            with open(path, 'rb') as f:
+                import_student_rows(read_rows(f), app.config.get('STUDENT_IMPORT_BATCH', 500),
+                                on_progress=lambda r: _update_job(job_id, r), report=report)
+            _update_job(job_id, report, status='finished', finished_at=func.now())
+        except Exception as e:
+            db.session.rollback()
+            _update_job(job_id, report, status='failed', message=str(e)[:255], finished_at=func.now())
+        finally:
+            db.session.remove()
+            os.remove(path)
+
+
+def import_job_progress(job):
+    return {
+        'id': job.id,
+        'status': job.status,
+        'total_rows': job.total_rows,
+        'processed': job.processed,
+        'created': job.created,
+        'failed': job.failed,
+        'errors': job.errors or [],
+        'message': job.message,
+        'created_at': job.created_at.isoformat(),
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None
+    }
@@ -0,0 +1,91 @@
+"""
+鉴权用的进程内用户缓存：user_id -> (角色, 令牌版本)，带 TTL 的 LRU。
+本进程修改或删除用户的事务提交后立即失效；其他 Web 进程不会收到通知，
+最多在 AUTH_USER_CACHE_TTL 秒内仍按旧的角色和令牌版本鉴权。
+"""
+import time
+import threading
+from collections import OrderedDict
+from flask import current_app
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from app.extensions import db
+from app.models import User
+from judge_metrics import REGISTRY
+
+LOOKUPS = REGISTRY.counter(
+    'auth_user_cache_lookups_total', 'Auth user cache lookups by result (hit, miss, missing).', ('result',))
+INVALIDATIONS = REGISTRY.counter(
+    'auth_user_cache_invalidations_total', 'Auth user cache entries invalidated after a user changed.')
+
+
+class UserCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # user_id -> (过期时间, 角色, 令牌版本)
+        self._invalidations = 0  # 失效次数；查库期间有失效发生时，查到的值可能已过时，不放入缓存
+
+    def get(self, user_id):
+        """返回 (角色, 令牌版本)，用户不存在时返回 None；未命中或已过期时查一次数据库。"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                LOOKUPS.inc(result='hit')
+                return entry[1:]
+            invalidations = self._invalidations
+        row = db.session.query(User.role, User.token_version).filter(User.id == user_id).first()
+        if row is None:
+            LOOKUPS.inc(result='missing')
+            return None
+        LOOKUPS.inc(result='miss')
+        ttl = current_app.config.get('AUTH_USER_CACHE_TTL', 60)
+        size = current_app.config.get('AUTH_USER_CACHE_SIZE', 10000)
+        with self._lock:
+            if self._invalidations != invalidations:
+                return row.role, row.token_version
+            self._entries[user_id] = (now + ttl, row.role, row.token_version)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > size:
+                self._entries.popitem(last=False)
+        return row.role, row.token_version
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._invalidations += 1
+        INVALIDATIONS.inc()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = UserCache()
+
+
+@event.listens_for(User, 'before_update')
+def _bump_token_version(mapper, connection, target):
+    # 角色或密码变更后，之前签发的令牌（其中的角色声明已过时）全部作废
+    state = inspect(target)
+    if state.attrs.role.history.has_changes() or state.attrs.password_hash.history.has_changes():
+        target.token_version = (target.token_version or 0) + 1
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _collect_changed(mapper, connection, target):
+    # flush 时还未提交，此时失效的话并发请求会重新读到旧值并缓存；先记下，提交后再失效。
+    # 只覆盖经由 ORM 对象的修改；用 Query.update/delete 批量修改用户时需在提交后自行调用 user_cache.invalidate
+    session = inspect(target).session
+    if session is not None:
+        session.info.setdefault('changed_user_ids', set()).add(target.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed(session):
+    # 回滚时不清除记下的ID：下次提交时多失效几条只会多查一次库
+    for user_id in session.info.pop('changed_user_ids', ()):
+        user_cache.invalidate(user_id)
+
@@ -0,0 +1,89 @@
+import json
+from flask import Response, jsonify, stream_with_context
+from app.extensions import db
+from app.models import User
+
+# 可以返回的字段，password_hash 不在其中
+USER_FIELDS = ('id', 'username', 'email', 'role', 'created_at')
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+EXPORT_BATCH = 1000
+
+
+def parse_listing_args(args, role=None):
+    """
+    解析列表参数：cursor（上一页最后一条的ID）、limit、role、prefix（用户名前缀）、fields（逗号分隔）。
+    role 不为空时固定按该角色筛选，忽略请求中的 role。参数不合法时抛出 ValueError。
+    """
+    fields = [f for f in args.get('fields', '').split(',') if f] or list(USER_FIELDS)
+    unknown = [f for f in fields if f not in USER_FIELDS]
+    if unknown:
+        raise ValueError(f'Unknown fields: {", ".join(unknown)}')
+    if 'id' not in fields:
+        fields.insert(0, 'id')
+    role = role or args.get('role') or None
+    if role is not None and role not in ('admin', 'teacher', 'student'):
+        raise ValueError(f'Unknown role: {role}')
+    try:
+        cursor = int(args.get('cursor', 0))
+        limit = int(args.get('limit', DEFAULT_LIMIT))
+    except (TypeError, ValueError):
+        raise ValueError('cursor and limit must be integers')
+    return {
+        'role': role,
+        'prefix': args.get('prefix') or None,
+        'cursor': max(cursor, 0),
+        'limit': min(max(limit, 1), MAX_LIMIT),
+        'fields': fields
+    }
+
+
+def _query(fields, role=None, prefix=None, cursor=0):
+    # 只查询需要的列，不构造 ORM 对象；按主键的键集分页，不用 OFFSET
+    query = db.session.query(*[getattr(User, f) for f in fields]).filter(User.id > cursor)
+    if role is not None:
+        query = query.filter(User.role == role)
+    if prefix:
+        escaped = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        query = query.filter(User.username.like(f'{escaped}%', escape='\\'))
+    return query.order_by(User.id)
+
+
+def _row(fields, values):
+    row = dict(zip(fields, values))
+    if row.get('created_at') is not None:
+        row['created_at'] = row['created_at'].isoformat()
+    return row
+
+
+def list_users_page(fields, role=None, prefix=None, cursor=0, limit=DEFAULT_LIMIT):
+    """返回一页用户和下一页的 cursor；没有下一页时 next_cursor 为 None。"""
+    rows = _query(fields, role, prefix, cursor).limit(limit + 1).all()
+    items = [_row(fields, values) for values in rows[:limit]]
+    return {
+        'items': items,
+        'next_cursor': items[-1]['id'] if len(rows) > limit else None
+    }
+
+
+def export_users_ndjson(fields, role=None, prefix=None, cursor=0):
+    """
+    逐行生成 NDJSON，用服务端游标按批取数，结果集不整体载入内存。
+    由 stream_with_context 包装后作为流式响应返回。
+    """
+    query = _query(fields, role, prefix, cursor).yield_per(EXPORT_BATCH)
+    for values in query:
+        yield json.dumps(_row(fields, values), ensure_ascii=False) + '\n'
+
+
+def user_listing_response(args, role=None):
+    """列表接口的公共实现：format=ndjson 时流式导出全部匹配的用户，否则返回一页。"""
+    try:
+        options = parse_listing_args(args, role)
+    except ValueError as e:
+        return jsonify({'msg': str(e)}), 400
+    if args.get('format') == 'ndjson':
+        options.pop('limit')
+        return Response(stream_with_context(export_users_ndjson(**options)),
+                        content_type='application/x-ndjson; charset=utf-8')
+    return jsonify(list_users_page(**options)), 200
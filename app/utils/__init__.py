@@ -1,16 +1,21 @@
 import datetime
 import jwt
+from collections import namedtuple
 from flask import request, jsonify, g, current_app
 from functools import wraps
-from app.models import User
-from app.extensions import db
+from app.user_cache import user_cache
 
 JWT_EXP_DELTA_SECONDS = 3600 * 24  # 1天
 
-def generate_token(user_id):
+CurrentUser = namedtuple('CurrentUser', 'id role')
+
+def generate_token(user):
     SECRET_KEY = current_app.config.get('SECRET_KEY', 'dev-secret-key')
+    # 角色和令牌版本写入声明，鉴权时无需查库；角色或密码变更会使版本加一，旧令牌随之失效
     payload = {
-        'user_id': user_id,
+        'user_id': user.id,
+        'role': user.role,
+        'ver': user.token_version or 0,
         'exp': datetime.datetime.utcnow() + datetime.timedelta(seconds=JWT_EXP_DELTA_SECONDS)
     }
     token = jwt.encode(payload, SECRET_KEY, algorithm='HS256')
@@ -28,11 +33,20 @@ def token_required(f):
         token = auth_header.split(' ')[1]
         try:
             payload = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
-            g.current_user_id = payload['user_id']
         except jwt.ExpiredSignatureError:
             return jsonify({'msg': 'Token expired'}), 401
         except jwt.InvalidTokenError:
             return jsonify({'msg': 'Invalid token'}), 401
+        # 用户是否存在、令牌是否已作废由进程内缓存判断，命中时没有数据库查询
+        cached = user_cache.get(payload['user_id'])
+        if cached is None:
+            return jsonify({'msg': 'User not found'}), 401
+        role, token_version = cached
+        if 'role' in payload and payload.get('ver') != token_version:
+            return jsonify({'msg': 'Token revoked'}), 401
+        g.current_user_id = payload['user_id']
+        # 升级前签发的令牌没有角色声明，取缓存中的角色
+        g.current_role = payload.get('role', role)
         return f(*args, **kwargs)
     return decorated
 
@@ -42,9 +56,14 @@ def admin_required(f):
         user_id = getattr(g, 'current_user_id', None)
         if not user_id:
             return jsonify({'msg': 'User not authenticated'}), 401
-        user = db.session.get(User, user_id)
-        if not user or user.role != 'admin':
+        if g.current_role != 'admin':
             return jsonify({'msg': 'Admin privilege required'}), 403
-        g.current_user = user
         return f(*args, **kwargs)
     return decorated
+
+def current_user():
+    """当前请求的用户ID和角色（来自令牌），未认证时返回 None。"""
+    user_id = getattr(g, 'current_user_id', None)
+    if not user_id:
+        return None
+    return CurrentUser(user_id, g.current_role)
@@ -0,0 +1,46 @@
+import threading
+from app.models import Submission
+
+
+class VerdictCache:
+    """
+    评测结果去重：已完成的提交记录了 verdict_key，代码、测试集和评测配置完全相同的新提交
+    直接复用其状态和逐用例结果，不再进入沙箱。结果存在 submissions 表中，多个评测节点共享。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    def get(self, verdict_key):
+        """命中时返回 (status, result)，result 中的 cached_from 为被复用的提交ID；未命中返回 None。"""
+        source = (Submission.query
+                  .with_entities(Submission.id, Submission.status, Submission.result)
+                  .filter(Submission.verdict_key == verdict_key,
+                          Submission.status.notin_(('judging', 'system_error')))
+                  .order_by(Submission.id.desc())
+                  .first())
+        with self._lock:
+            if source is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        result = dict(source.result or {})
+        result['cached_from'] = source.id
+        return source.status, result
+
+    def record_bypass(self):
+        with self._lock:
+            self.bypassed += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'bypassed': self.bypassed,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
@@ -1,29 +1,52 @@
 import os
-import time
+import json
+import shutil
+import hashlib
 import tempfile
-import docker
+from sandbox_pool import ContainerPool
+from sandbox_backends import DockerBackend, AsyncDockerBackend, ProcessBackend, shared_docker_client
+from compile_cache import CompileCache
+from testdata_cache import TestDataCache
+from judge_metrics import timed
 
 class CodeJudge:
     """
-    安全的代码评测类，使用Docker沙箱隔离执行用户代码。
+    安全的代码评测类，默认使用Docker沙箱隔离执行用户代码，
+    也可选择不依赖Docker守护进程的本机进程沙箱（backend='process'）。
     """
     LANG_CONFIG = {
         'python': {
             'source_file': 'main.py',
             'compile_cmd': None,
-            'run_cmd': 'python3 main.py < {input_file}'
+            'run_argv': ['python3', 'main.py'],
+            'tools': ['python3'],
+            'fork_server': True  # 可由运行器 fork 执行，见 python_fork_server
         },
         'c': {
             'source_file': 'main.c',
             'compile_cmd': 'gcc main.c -o main',
-            'run_cmd': './main < {input_file}'
+            'run_argv': ['./main'],
+            'tools': ['gcc']
         },
         'cpp': {
             'source_file': 'main.cpp',
             'compile_cmd': 'g++ main.cpp -o main',
-            'run_cmd': './main < {input_file}'
+            'run_argv': ['./main'],
+            'tools': ['g++']
         }
     }
+    OUTPUT_PREVIEW_SIZE = 4096  # 结果中只保留输出的前4KB
+    # 执行策略：full 运行全部用例；fail_fast 遇到第一个失败用例即停止；
+    # public_first 先运行公开用例，有失败时不再运行隐藏用例
+    POLICIES = ('full', 'fail_fast', 'public_first')
+    CHECKER_TIMEOUT = 10  # 特判程序的运行时间上限（秒）
+    # 容器内除用户程序外还有运行器和特判程序，容器的内存上限在 mem_limit 之上留出这部分；
+    # 用户程序是否超内存由运行器按峰值RSS与 mem_limit 比较判定
+    RUNNER_MEMORY_OVERHEAD = 64 * 1024 * 1024
+    SANDBOX_DIR = os.path.dirname(os.path.abspath(__file__))
+    # 随每次评测拷贝进沙箱的脚本
+    RUNNER_FILES = ('sandbox_runner.py', 'output_comparator.py')
+    _sandbox_digest_value = None
 
     def __init__(self,
                  docker_image='code-judge-env:latest',
@@ -31,152 +54,530 @@ class CodeJudge:
                  cpu_quota=50000,  # 5% of a single CPU
                  cpu_period=1000000,
                  pids_limit=64,
-                 timeout=10):
+                 timeout=10,  # 单个用例的墙钟时间上限（秒）
+                 cpu_time_limit=None,  # 单个用例的CPU时间上限（秒），默认与 timeout 相同
+                 pool_size=0,  # 0 表示不使用预热容器池
+                 pool_max_uses=50,
+                 batch_mode=False,  # 单容器内批量运行全部用例
+                 compile_cache_dir=None,  # 为空时不缓存编译产物
+                 compile_cache_size=512 * 1024 * 1024,
+                 parallel_workers=0,  # 0 表示逐个用例顺序运行，>0 为并行评测的并发上限
+                 backend='docker',  # 'docker'、'docker_async'（进程内共用的异步驱动）或 'process'
+                 output_limit=8 * 1024 * 1024,  # 单个用例标准输出的字节上限
+                 test_data_cache_dir=None,  # 为空时每次提交把用例写入评测目录
+                 test_data_cache_size=2 * 1024 * 1024 * 1024,
+                 policy='full',  # 默认执行策略，见 POLICIES
+                 python_fork_server=False,  # Python 代码只编译一次，由沙箱内的运行器逐用例 fork 执行
+                 docker_url=None,  # Docker 守护进程地址，默认取 DOCKER_HOST
+                 docker_max_connections=64,  # 进程内共用的到守护进程的连接数上限
+                 trusted_code=False):  # 只评测可信代码（本机基准）时允许非root使用进程沙箱
         self.docker_image = docker_image
         self.mem_limit = mem_limit
         self.cpu_quota = cpu_quota
         self.cpu_period = cpu_period
         self.pids_limit = pids_limit
         self.timeout = timeout
-        self.client = docker.from_env()
+        self.cpu_time_limit = cpu_time_limit or timeout
+        self.batch_mode = batch_mode
+        self.parallel_workers = parallel_workers
+        self.output_limit = output_limit
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unsupported execution policy: {policy}")
+        self.policy = policy
+        self.python_fork_server = python_fork_server
+        self.compile_cache = CompileCache(compile_cache_dir, compile_cache_size) if compile_cache_dir else None
+        self.test_data_cache = TestDataCache(test_data_cache_dir, test_data_cache_size) if test_data_cache_dir else None
+        self.client = None
+        self.pool = None
+        if backend == 'process':
+            self.backend = ProcessBackend(self._mem_limit_bytes(), pids_limit=self.pids_limit, trusted=trusted_code,
+                                          data_root=test_data_cache_dir)
+        elif backend == 'docker_async':
+            if pool_size > 0:
+                raise ValueError("Container pool is not supported with the docker_async backend")
+            host_limits = {
+                'Memory': self._container_mem_limit_bytes(),
+                'PidsLimit': self.pids_limit,
+                'CpuPeriod': self.cpu_period,
+                'CpuQuota': self.cpu_quota
+            }
+            self.backend = AsyncDockerBackend(self.docker_image, host_limits, data_root=test_data_cache_dir,
+                                              base_url=docker_url, max_connections=docker_max_connections)
+        elif backend == 'docker':
+            # 同一进程内的 CodeJudge 共用一个客户端和连接池
+            self.client = shared_docker_client(max_pool_size=docker_max_connections)
+            container_kwargs = {
+                'mem_limit': self._container_mem_limit_bytes(),
+                'pids_limit': self.pids_limit,
+                'cpu_period': self.cpu_period,
+                'cpu_quota': self.cpu_quota
+            }
+            if pool_size > 0:
+                self.pool = ContainerPool(
+                    self.client,
+                    container_kwargs=container_kwargs,
+                    size=pool_size,
+                    max_uses=pool_max_uses,
+                    data_root=test_data_cache_dir
+                )
+                self.pool.warm(self.docker_image)
+            self.backend = DockerBackend(self.client, self.docker_image, container_kwargs,
+                                         pool=self.pool, data_root=test_data_cache_dir)
+        else:
+            raise ValueError(f"Unsupported sandbox backend: {backend}")
+
+    @staticmethod
+    def overall_status(results):
+        """由各用例结果得出提交的总体状态（取 id 最小的失败用例的状态，跳过的用例不参与）。"""
+        if not results:
+            return 'system_error'
+        for result in sorted(results, key=lambda r: r['id']):
+            if not result['passed'] and result.get('status') != 'skipped':
+                return result.get('status', 'wrong_answer')
+        return 'accepted'
+
+    def pool_stats(self):
+        return self.pool.stats() if self.pool else None
+
+    def supported_languages(self):
+        """当前沙箱环境能评测的语言（运行器本身需要 python3）。"""
+        if not self.backend.has_tool('python3'):
+            return []
+        return [language for language, config in self.LANG_CONFIG.items()
+                if all(self.backend.has_tool(tool) for tool in config['tools'])]
+
+    def verdict_key(self, code, language, test_set_version, checker=None, policy=None):
+        """
+        评测结果去重的键：代码、语言、测试集版本、比较方式、资源限制、运行环境和沙箱脚本都相同时，
+        评测结果不会变化。
+        """
+        limits = {
+            'mem_limit': self._mem_limit_bytes(),
+            'cpu_quota': self.cpu_quota,
+            'cpu_period': self.cpu_period,
+            'pids_limit': self.pids_limit,
+            'timeout': self.timeout,
+            'cpu_time_limit': self.cpu_time_limit,
+            'output_limit': self.output_limit,
+            'policy': policy or self.policy,
+            'python_fork_server': self.python_fork_server
+        }
+        h = hashlib.sha256()
+        for part in (language, test_set_version, json.dumps(checker, sort_keys=True),
+                     json.dumps(limits, sort_keys=True), self.backend.environment_id(),
+                     self._sandbox_digest(), code):
+            data = (part or '').encode('utf-8')
+            h.update(len(data).to_bytes(8, 'big'))
+            h.update(data)
+        return h.hexdigest()
+
+    @classmethod
+    def _sandbox_digest(cls):
+        # 运行器或比较器有改动时，旧的评测结果不再复用
+        if cls._sandbox_digest_value is None:
+            h = hashlib.sha256()
+            for name in cls.RUNNER_FILES:
+                with open(os.path.join(cls.SANDBOX_DIR, name), 'rb') as f:
+                    h.update(f.read())
+            cls._sandbox_digest_value = h.hexdigest()
+        return cls._sandbox_digest_value
 
-    def run_tests(self, code, language, test_cases):
+    def run_tests(self, code, language, test_cases, checker=None, test_data=None, policy=None, reuse=None):
+        """
+        评测代码。checker 为题目的比较配置，为空时逐字节比较（忽略首尾空白）；
+        {'mode': 'token'} 忽略空白差异，{'mode': 'float', 'tolerance': 1e-6} 按误差比较数值，
+        {'mode': 'special', 'source': ...} 用题目提供的Python特判程序判定。
+        test_data 为测试数据缓存中的 TestData，给出时直接使用缓存文件，忽略 test_cases。
+        policy 覆盖默认执行策略，因提前停止而未运行的用例状态为 skipped。
+        reuse 为 {用例编号: 之前的结果}，这些用例不再运行，其余用例照常运行后合并，
+        按执行策略得到的结果与全部重新运行相同。
+        """
         if language not in self.LANG_CONFIG:
             raise ValueError(f"Unsupported language: {language}")
+        policy = policy or self.policy
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unsupported execution policy: {policy}")
 
         config = self.LANG_CONFIG[language]
+        reuse = reuse or {}
         results = []
+        if test_data is not None:
+            test_cases = [
+                {
+                    'files': {name: self.backend.data_path(path) for name, path in test_data.case_files(idx).items()},
+                    'hidden': test_data.is_hidden(idx)
+                }
+                for idx in range(1, test_data.count + 1)
+            ]
+        if all(idx in reuse for idx in range(1, len(test_cases) + 1)):
+            return self._merge_reused(policy, test_cases, reuse, lambda group, stop_on_failure: [])
 
         with tempfile.TemporaryDirectory(prefix='judge_') as temp_dir:
-            code_path = os.path.join(temp_dir, config['source_file'])
-            with open(code_path, 'w', encoding='utf-8') as f:
-                f.write(code)
+            with timed('prepare', language):
+                # 沙箱用户需要进入目录执行程序，评测数据本身以0600写入
+                os.chmod(temp_dir, 0o755)
+                code_path = os.path.join(temp_dir, config['source_file'])
+                with open(code_path, 'w', encoding='utf-8') as f:
+                    f.write(code)
+                checker = self._write_checker(temp_dir, checker)
 
             if config['compile_cmd']:
-                compile_result = self._run_in_docker(
-                    temp_dir=temp_dir,
-                    command=config['compile_cmd'],
-                    workdir='/usr/src/app',
-                    stdin_file=None
-                )
-                if compile_result['exit_code'] != 0:
+                with timed('compile', language):
+                    compile_error = self._compile(temp_dir, code, language, config)
+                if compile_error is not None:
                     for idx, _ in enumerate(test_cases, 1):
                         results.append({
                             'id': idx,
                             'passed': False,
+                            'status': 'compile_error',
                             'output': '',
-                            'error': compile_result['stderr'][:4096],
-                            'time_used': 0.0
+                            'error': compile_error,
+                            'mismatch': None,
+                            'time_used': 0.0,
+                            'wall_time': 0.0,
+                            'memory_used': 0
                         })
                     return results
 
-            for idx, case in enumerate(test_cases, 1):
-                input_file = os.path.join(temp_dir, f'input_{idx}.txt')
-                with open(input_file, 'w', encoding='utf-8') as f:
-                    f.write(case['input'])
-
-                run_cmd = config['run_cmd'].format(input_file=f'input_{idx}.txt')
-                start_time = time.time()
-                run_result = self._run_in_docker(
-                    temp_dir=temp_dir,
-                    command=run_cmd,
-                    workdir='/usr/src/app',
-                    stdin_file=None
-                )
-                time_used = round(time.time() - start_time, 3)
-
-                output = (run_result['stdout'] or '').strip()
-                expected = (case['expected_output'] or '').strip()
-                passed = (output == expected) and run_result['exit_code'] == 0
-
-                error_msg = ''
-                if run_result['timeout']:
-                    error_msg = 'Time Limit Exceeded'
-                    passed = False
-                elif run_result['oom_killed']:
-                    error_msg = 'Memory Limit Exceeded'
-                    passed = False
-                elif run_result['exit_code'] != 0 and not run_result['timeout'] and not run_result['oom_killed']:
-                    error_msg = run_result['stderr'][:4096] or 'Runtime Error'
-                    passed = False
-
-                results.append({
-                    'id': idx,
-                    'passed': passed,
-                    'output': output,
-                    'error': error_msg,
-                    'time_used': time_used
-                })
+            return self._merge_reused(
+                policy, test_cases, reuse,
+                lambda group, stop_on_failure: self._timed_group(temp_dir, config, language, group, checker,
+                                                                 stop_on_failure)
+            )
+
+    def _timed_group(self, temp_dir, config, language, group, checker, stop_on_failure=False):
+        with timed('run', language):
+            return self._run_group(temp_dir, config, group, checker, stop_on_failure)
 
+    def _merge_reused(self, policy, test_cases, reuse, run_group):
+        """按执行策略逐组运行用例，组内已有结果的用例直接沿用，只把其余用例交给 run_group。"""
+        finished = {}
+        for group in self._policy_groups(policy, test_cases):
+            group_results = [dict(reuse[idx], id=idx) for idx, _ in group if idx in reuse]
+            pending = [(idx, case) for idx, case in group if idx not in reuse]
+            failed = [result['id'] for result in group_results if not result['passed']]
+            if policy == 'fail_fast' and failed:
+                # 全部重新运行时会停在第一个失败的用例，其后的用例不必再运行
+                pending = [(idx, case) for idx, case in pending if idx < min(failed)]
+            if pending:
+                group_results += run_group(pending, policy == 'fail_fast')
+            if policy == 'fail_fast':
+                failed = [result['id'] for result in group_results if not result['passed']]
+                if failed:
+                    group_results = [result for result in group_results if result['id'] <= min(failed)]
+            finished.update((result['id'], result) for result in group_results)
+            if policy != 'full' and not all(result['passed'] for result in group_results):
+                break
+
+        return [finished.get(idx) or self._skipped_result(idx) for idx in range(1, len(test_cases) + 1)]
+
+    @staticmethod
+    def _policy_groups(policy, test_cases):
+        """按执行策略把 (id, 用例) 分成依次运行的若干组，前一组有失败时后面的组不再运行。"""
+        cases = list(enumerate(test_cases, 1))
+        if policy != 'public_first':
+            return [cases]
+        public = [item for item in cases if not item[1].get('hidden')]
+        hidden = [item for item in cases if item[1].get('hidden')]
+        return [group for group in (public, hidden) if group]
+
+    def _run_group(self, temp_dir, config, group, checker, stop_on_failure=False):
+        """运行一组用例，返回实际运行了的用例结果；stop_on_failure 时遇到失败即停止。"""
+        if self.batch_mode:
+            return self._run_batch(temp_dir, config, group, checker, stop_on_failure)
+        if self.parallel_workers > 0:
+            return self._run_parallel(temp_dir, config, group, checker, stop_on_failure)
+        results = []
+        for idx, case in group:
+            results.append(self._run_isolated_case(temp_dir, config, idx, case, checker))
+            if stop_on_failure and not results[-1]['passed']:
+                break
         return results
 
-    def _run_in_docker(self, temp_dir, command, workdir, stdin_file=None):
-        container = None
+    @staticmethod
+    def _skipped_result(idx):
+        return {
+            'id': idx,
+            'passed': False,
+            'status': 'skipped',
+            'output': '',
+            'error': 'Skipped after an earlier failure',
+            'mismatch': None,
+            'time_used': 0.0,
+            'wall_time': 0.0,
+            'memory_used': 0
+        }
+
+    def _compile(self, temp_dir, code, language, config):
+        """
+        编译源码，成功返回 None，失败返回编译错误信息。
+        启用编译缓存时，命中则直接拷贝缓存的可执行文件，不再启动编译容器。
+        """
+        cache_key = None
+        if self.compile_cache:
+            cache_key = CompileCache.make_key(code, language, config['compile_cmd'], self.backend.environment_id())
+            cached = self.compile_cache.get(cache_key)
+            if cached is not None:
+                if not cached['ok']:
+                    return cached['error']
+                binary_path = os.path.join(temp_dir, 'main')
+                shutil.copy2(cached['binary'], binary_path)
+                os.chmod(binary_path, 0o755)
+                return None
+
+        compile_result = self._run_in_docker(
+            temp_dir=temp_dir,
+            command=config['compile_cmd'],
+            workdir='/usr/src/app',
+            stdin_file=None,
+            writeback=True
+        )
+        # 编译时评测目录对沙箱用户可写，之后恢复为只读
+        os.chmod(temp_dir, 0o755)
+        if compile_result['exit_code'] != 0:
+            error = compile_result['stderr'][:4096]
+            # 超时、OOM或沙箱异常不是源码本身的问题，不缓存
+            if cache_key and compile_result['exit_code'] > 0 \
+                    and not compile_result['timeout'] and not compile_result['oom_killed']:
+                self.compile_cache.put_error(cache_key, error)
+            return error
+        binary_path = os.path.join(temp_dir, 'main')
+        if cache_key and os.path.isfile(binary_path):
+            self.compile_cache.put_binary(cache_key, binary_path)
+        return None
+
+    def _build_result(self, idx, run_result):
+        # 比较已由沙箱内的运行器流式完成，这里只根据结果确定状态
+        output = (run_result['stdout'] or '').strip()
+        passed = bool(run_result.get('passed'))
+        mismatch = run_result.get('mismatch')
+
+        status = 'accepted' if passed else 'wrong_answer'
+        error_msg = ''
+        if not passed:
+            if run_result.get('checker_message'):
+                error_msg = run_result['checker_message']
+            elif mismatch:
+                error_msg = f"Wrong Answer at line {mismatch['line']}, column {mismatch['column']}"
+            else:
+                error_msg = 'Wrong Answer'
+        if run_result['timeout']:
+            error_msg = 'Time Limit Exceeded'
+            status = 'time_limit_exceeded'
+            passed = False
+        elif run_result['oom_killed']:
+            error_msg = 'Memory Limit Exceeded'
+            status = 'memory_limit_exceeded'
+            passed = False
+        elif run_result.get('output_limit_exceeded'):
+            error_msg = 'Output Limit Exceeded'
+            status = 'output_limit_exceeded'
+            passed = False
+        elif run_result['exit_code'] != 0 and not run_result['timeout'] and not run_result['oom_killed']:
+            error_msg = run_result['stderr'][:4096] or 'Runtime Error'
+            status = 'runtime_error'
+            passed = False
+
+        return {
+            'id': idx,
+            'passed': passed,
+            'status': status,
+            'output': output[:self.OUTPUT_PREVIEW_SIZE],
+            'error': error_msg,
+            'mismatch': mismatch if status == 'wrong_answer' else None,
+            'time_used': run_result.get('cpu_time', 0.0),
+            'wall_time': run_result.get('wall_time', 0.0),
+            'memory_used': run_result.get('memory_used', 0)
+        }
+
+    def _run_batch(self, temp_dir, config, group, checker, stop_on_failure=False):
+        """
+        批量模式：只启动一个容器，由容器内的 sandbox_runner.py 依次运行每个用例，
+        逐行返回JSON结果，结果结构与逐个用例运行时一致。
+        stop_on_failure 时运行器在第一个失败用例后停止。
+        """
+        cases = [self._write_case_files(temp_dir, idx, case) for idx, case in group]
+        self._write_runner_manifest(temp_dir, 'cases.json', config, cases, checker,
+                                    stop_on_failure=stop_on_failure)
+        batch_result = self._run_in_docker(
+            temp_dir=temp_dir,
+            command='python3 sandbox_runner.py cases.json',
+            workdir='/usr/src/app',
+            stdin_file=None,
+            timeout=len(group) * (self._case_timeout(checker) + 1) + 5,
+            output_limit=self._runner_output_limit(len(group)),
+            runner=True
+        )
+        case_results = self._parse_runner_output(batch_result)
+
+        results = []
+        for position, (idx, _) in enumerate(group, 1):
+            run_result = case_results.get(position)
+            if run_result is None and stop_on_failure and results and not results[-1]['passed']:
+                break  # 运行器按策略停止，其余用例记为跳过
+            results.append(self._build_result(idx, run_result or self._runner_aborted(batch_result)))
+        return results
+
+    def _run_parallel(self, temp_dir, config, group, checker, stop_on_failure=False):
+        """
+        并行模式：同时运行多个用例，每个用例仍在独立容器中执行，并发由后端的 execute_many 完成
+        （默认用有界线程池，docker_async 后端在一个事件循环中驱动全部容器）。
+        time_used 为运行器测得的CPU时间，与顺序运行时可比。
+        stop_on_failure 时出现失败后取消尚未开始的用例，已在运行的用例照常完成。
+        """
+        workers = self._parallel_worker_count(len(group))
+        jobs = [self._isolated_job(temp_dir, config, idx, case, checker) for idx, case in group]
+        runs = self.backend.execute_many(
+            jobs, workers,
+            stop=lambda position, run: stop_on_failure and not self._isolated_result(group[position][0], run)['passed']
+        )
+        return [self._isolated_result(idx, run) for (idx, _), run in zip(group, runs) if run is not None]
+
+    def _run_isolated_case(self, temp_dir, config, idx, case, checker):
+        """
+        在独立容器中通过 sandbox_runner.py 运行单个用例。
+        超时和超内存由运行器依据实测的CPU时间与峰值内存判定，
+        容器级的 wait 超时只作为运行器失控时的兜底。
+        """
+        run = self._run_in_docker(**self._isolated_job(temp_dir, config, idx, case, checker))
+        return self._isolated_result(idx, run)
+
+    def _isolated_job(self, temp_dir, config, idx, case, checker):
+        """写入单个用例的数据和清单，返回执行它所需的沙箱参数。"""
+        case_files = self._write_case_files(temp_dir, idx, case)
+        manifest_name = f'case_{idx}.json'
+        self._write_runner_manifest(temp_dir, manifest_name, config, [case_files], checker)
+        return {
+            'temp_dir': temp_dir,
+            'command': f'python3 sandbox_runner.py {manifest_name}',
+            'workdir': '/usr/src/app',
+            'timeout': self._case_timeout(checker) + 5,
+            'output_limit': self._runner_output_limit(1),
+            'runner': True
+        }
+
+    def _isolated_result(self, idx, run):
+        run_result = self._parse_runner_output(run).get(1) or self._runner_aborted(run)
+        return self._build_result(idx, run_result)
+
+    def _parallel_worker_count(self, case_count):
+        cpus = os.cpu_count() or 1
+        # 每个容器最多占用 cpu_quota / cpu_period 个CPU
+        capacity = max(1, int(cpus * self.cpu_period / self.cpu_quota)) if self.cpu_quota else cpus
+        return max(1, min(self.parallel_workers, capacity, case_count))
+
+    def _case_timeout(self, checker):
+        # 特判程序在用户程序结束后运行，单个用例的时间预算要加上它的时间
+        if checker and checker.get('mode') == 'special':
+            return self.timeout + self.CHECKER_TIMEOUT
+        return self.timeout
+
+    def _write_case_files(self, temp_dir, idx, case):
+        if 'files' in case:
+            return case['files']  # 已在测试数据缓存中
+        input_name = f'input_{idx}.txt'
+        expected_name = f'expected_{idx}.txt'
+        self._write_private(os.path.join(temp_dir, input_name), case['input'])
+        self._write_private(os.path.join(temp_dir, expected_name), case['expected_output'] or '')
+        return {'input': input_name, 'expected': expected_name}
+
+    def _write_checker(self, temp_dir, checker):
+        """把题目的比较配置转换为运行器使用的格式，特判程序写入评测目录。"""
+        if not checker:
+            return None
+        mode = checker.get('mode', 'exact')
+        if mode in ('exact', 'token'):
+            return {'mode': mode}
+        if mode == 'float':
+            return {'mode': mode, 'tolerance': checker.get('tolerance', 1e-6)}
+        if mode == 'special':
+            self._write_private(os.path.join(temp_dir, 'checker.py'), checker['source'])
+            return {'mode': mode, 'program': 'checker.py', 'timeout': self.CHECKER_TIMEOUT}
+        raise ValueError(f"Unsupported checker mode: {mode}")
+
+    def _write_runner_manifest(self, temp_dir, manifest_name, config, cases, checker=None, stop_on_failure=False):
+        # 每次都重新拷贝：编译阶段评测目录可写，不能沿用其中已有的同名文件（运行器以root启动）
+        for name in self.RUNNER_FILES:
+            path = os.path.join(temp_dir, name)
+            self._remove_file(path)
+            shutil.copyfile(os.path.join(self.SANDBOX_DIR, name), path)
+        fork_server = self.python_fork_server and config.get('fork_server')
+        self._write_private(os.path.join(temp_dir, manifest_name), json.dumps({
+            'argv': config['run_argv'],
+            'python_main': config['source_file'] if fork_server else None,
+            'cases': cases,
+            'checker': checker,
+            'time_limit': self.cpu_time_limit,
+            'wall_limit': self.timeout,
+            'memory_limit': self._mem_limit_bytes(),
+            'output_limit': self.output_limit,
+            'preview_limit': self.OUTPUT_PREVIEW_SIZE,
+            'nproc_limit': self.pids_limit,
+            'stop_on_failure': stop_on_failure
+        }))
+
+    @staticmethod
+    def _remove_file(path):
         try:
-            volumes = {
-                os.path.abspath(temp_dir): {
-                    'bind': '/usr/src/app',
-                    'mode': 'ro'
-                }
-            }
-            container = self.client.containers.run(
-                image=self.docker_image,
-                command=['/bin/sh', '-c', command],
-                working_dir=workdir,
-                volumes=volumes,
-                network_disabled=True,
-                mem_limit=self.mem_limit,
-                pids_limit=self.pids_limit,
-                cpu_period=self.cpu_period,
-                cpu_quota=self.cpu_quota,
-                detach=True,
-                stdout=True,
-                stderr=True,
-                remove=False,
-                read_only=True,
-                user='1000:1000'
-            )
-            try:
-                exit_status = container.wait(timeout=self.timeout)
-                exit_code = exit_status.get('StatusCode', -1)
-                timeout_flag = False
-            except Exception:
-                container.kill()
-                exit_code = -1
-                timeout_flag = True
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+    @classmethod
+    def _write_private(cls, path, text):
+        # 仅属主可读写，运行器降权后的用户程序读不到；
+        # 先删除再独占创建，编译时预先放置的同名文件（属主和权限由对方决定）不会被沿用
+        cls._remove_file(path)
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with open(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+    def _runner_output_limit(self, case_count):
+        # 运行器只回传输出预览和截断后的标准错误，按JSON转义最坏6倍估算
+        return case_count * (self.OUTPUT_PREVIEW_SIZE + 68 * 1024) * 6
+
+    @staticmethod
+    def _parse_runner_output(run_result):
+        case_results = {}
+        for line in (run_result['stdout'] or '').splitlines():
             try:
-                stdout = container.logs(stdout=True, stderr=False).decode('utf-8', errors='ignore')
-                stderr = container.logs(stdout=False, stderr=True).decode('utf-8', errors='ignore')
-            except Exception:
-                stdout, stderr = '', ''
-            inspect = container.attrs
-            oom_killed = inspect.get('State', {}).get('OOMKilled', False)
-            return {
-                'exit_code': exit_code,
-                'stdout': stdout,
-                'stderr': stderr,
-                'timeout': timeout_flag,
-                'oom_killed': oom_killed
-            }
-        except docker.errors.ContainerError as e:
-            return {
-                'exit_code': e.exit_status,
-                'stdout': e.stdout.decode('utf-8', errors='ignore') if e.stdout else '',
-                'stderr': e.stderr.decode('utf-8', errors='ignore') if e.stderr else '',
-                'timeout': False,
-                'oom_killed': False
-            }
-        except Exception as e:
-            return {
-                'exit_code': -1,
-                'stdout': '',
-                'stderr': str(e),
-                'timeout': False,
-                'oom_killed': False
-            }
-        finally:
-            if container:
-                try:
-                    container.remove(force=True)
-                except Exception:
-                    pass
+                item = json.loads(line)
+            except ValueError:
+                continue
+            case_results[item.get('id')] = item
+        return case_results
+
+    @staticmethod
+    def _runner_aborted(run_result):
+        # 运行器中途退出（整体超时或被杀），对应用例按运行失败处理
+        return {
+            'exit_code': -1,
+            'stdout': '',
+            'stderr': run_result['stderr'] or 'Sandbox runner aborted',
+            'timeout': run_result['timeout'],
+            'oom_killed': run_result['oom_killed'],
+            'output_limit_exceeded': run_result.get('output_limit_exceeded', False),
+            'passed': False,
+            'mismatch': None,
+            'checker_message': '',
+            'cpu_time': 0.0,
+            'wall_time': 0.0,
+            'memory_used': 0
+        }
+
+    def _mem_limit_bytes(self):
+        units = {'b': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3}
+        value = str(self.mem_limit).strip().lower()
+        if value and value[-1] in units:
+            return int(float(value[:-1]) * units[value[-1]])
+        return int(value)
+
+    def _container_mem_limit_bytes(self):
+        return self._mem_limit_bytes() + self.RUNNER_MEMORY_OVERHEAD
+
+    def _run_in_docker(self, temp_dir, command, workdir, stdin_file=None, writeback=False,
+                       timeout=None, output_limit=None, runner=False):
+        """所有沙箱执行的统一入口，实际执行交给配置的后端。"""
+        return self.backend.execute(temp_dir, command, workdir, timeout or self.timeout,
+                                    writeback=writeback, output_limit=output_limit or self.output_limit,
+                                    runner=runner)
@@ -0,0 +1,157 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+class CompileCache:
+    """
+    基于内容寻址的编译产物缓存：以 (源码, 语言, 编译命令, 镜像摘要) 的哈希为键，
+    在本地磁盘上保存编译得到的可执行文件或编译错误信息，按总大小做LRU淘汰。
+    """
+    BINARY_FILE = 'main'
+    ERROR_FILE = 'error.txt'
+    META_FILE = 'meta.json'
+
+    def __init__(self, cache_dir, max_bytes=512 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._index = OrderedDict()  # key -> 占用字节数，按最近使用排序
+        self._total = 0
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_index()
+
+    @staticmethod
+    def make_key(source, language, compile_cmd, image_digest):
+        h = hashlib.sha256()
+        for part in (language, compile_cmd, image_digest, source):
+            data = (part or '').encode('utf-8')
+            h.update(len(data).to_bytes(8, 'big'))
+            h.update(data)
+        return h.hexdigest()
+
+    def get(self, key):
+        """
+        命中时返回 {'ok': True, 'binary': 路径} 或 {'ok': False, 'error': 编译错误}，
+        未命中返回 None。
+        """
+        entry_dir = self._entry_dir(key)
+        try:
+            with open(os.path.join(entry_dir, self.META_FILE), encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta['ok']:
+                entry = {'ok': True, 'binary': os.path.join(entry_dir, self.BINARY_FILE)}
+            else:
+                with open(os.path.join(entry_dir, self.ERROR_FILE), encoding='utf-8') as f:
+                    entry = {'ok': False, 'error': f.read()}
+        except (OSError, ValueError, KeyError):
+            with self._lock:
+                self.misses += 1
+            return None
+        try:
+            os.utime(entry_dir)
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+            if key in self._index:
+                self._index.move_to_end(key)
+            else:
+                size = self._dir_size(entry_dir)
+                self._index[key] = size
+                self._total += size
+        return entry
+
+    def put_binary(self, key, binary_path):
+        self._put(key, {'ok': True}, binary_path=binary_path)
+
+    def put_error(self, key, error):
+        self._put(key, {'ok': False}, error=error)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'entries': len(self._index),
+                'bytes': self._total
+            }
+
+    def _put(self, key, meta, binary_path=None, error=None):
+        entry_dir = self._entry_dir(key)
+        if os.path.exists(entry_dir):
+            return
+        os.makedirs(os.path.dirname(entry_dir), exist_ok=True)
+        # 先写入临时目录再整体重命名，保证其他进程看不到写了一半的条目
+        tmp_dir = tempfile.mkdtemp(prefix='.tmp_', dir=os.path.dirname(entry_dir))
+        try:
+            if binary_path:
+                shutil.copy2(binary_path, os.path.join(tmp_dir, self.BINARY_FILE))
+            if error is not None:
+                with open(os.path.join(tmp_dir, self.ERROR_FILE), 'w', encoding='utf-8') as f:
+                    f.write(error)
+            with open(os.path.join(tmp_dir, self.META_FILE), 'w', encoding='utf-8') as f:
+                json.dump(meta, f)
+            os.rename(tmp_dir, entry_dir)
+        except OSError:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return
+        size = self._dir_size(entry_dir)
+        with self._lock:
+            if key not in self._index:
+                self._index[key] = size
+                self._total += size
+            evicted = self._evict_locked()
+        for evicted_key in evicted:
+            shutil.rmtree(self._entry_dir(evicted_key), ignore_errors=True)
+
+    def _evict_locked(self):
+        evicted = []
+        while self._total > self.max_bytes and len(self._index) > 1:
+            key, size = self._index.popitem(last=False)
+            self._total -= size
+            evicted.append(key)
+        return evicted
+
+    def _load_index(self):
+        entries = []
+        for prefix in os.listdir(self.cache_dir):
+            prefix_dir = os.path.join(self.cache_dir, prefix)
+            if not os.path.isdir(prefix_dir):
+                continue
+            for key in os.listdir(prefix_dir):
+                if key.startswith('.tmp_'):
+                    shutil.rmtree(os.path.join(prefix_dir, key), ignore_errors=True)
+                    continue
+                entry_dir = os.path.join(prefix_dir, key)
+                try:
+                    mtime = os.path.getmtime(entry_dir)
+                except OSError:
+                    continue
+                entries.append((mtime, key, self._dir_size(entry_dir)))
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self._total += size
+        for key in self._evict_locked():
+            shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    @staticmethod
+    def _dir_size(path):
+        total = 0
+        for name in os.listdir(path):
+            try:
+                total += os.path.getsize(os.path.join(path, name))
+            except OSError:
+                pass
+        return total
@@ -0,0 +1,207 @@
+"""
+基于 asyncio 的 Docker Engine API 驱动，只依赖标准库。
+每个进程一个后台事件循环线程和一个 keep-alive 连接池，所有评测线程共用；
+容器输出通过一次 attach 以多路复用流读取，同时运行的容器不再各占一个线程。
+"""
+import os
+import json
+import asyncio
+import threading
+from urllib.parse import urlencode, quote
+
+DEFAULT_DOCKER_HOST = 'unix:///var/run/docker.sock'
+API_VERSION = 'v1.41'
+
+
+class DockerAPIError(Exception):
+    def __init__(self, status, message):
+        super().__init__(f'Docker API error {status}: {message}')
+        self.status = status
+
+
+class _Connection:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    def close(self):
+        self.writer.close()
+
+
+class AsyncDockerClient:
+    """Docker Engine API 的最小异步客户端：HTTP/1.1 keep-alive 连接池，最多 max_connections 个连接。"""
+
+    def __init__(self, base_url=None, max_connections=64):
+        self.base_url = base_url or os.environ.get('DOCKER_HOST') or DEFAULT_DOCKER_HOST
+        self._idle = []
+        self._slots = asyncio.Semaphore(max_connections)
+
+    async def _connect(self):
+        if self.base_url.startswith('unix://'):
+            reader, writer = await asyncio.open_unix_connection(self.base_url[len('unix://'):], limit=1 << 20)
+        elif self.base_url.startswith('tcp://'):
+            host, _, port = self.base_url[len('tcp://'):].partition(':')
+            reader, writer = await asyncio.open_connection(host, int(port or 2375), limit=1 << 20)
+        else:
+            raise ValueError(f'Unsupported DOCKER_HOST: {self.base_url}')
+        return _Connection(reader, writer)
+
+    async def _acquire(self):
+        while self._idle:
+            conn = self._idle.pop()
+            if not conn.reader.at_eof() and not conn.writer.is_closing():
+                return conn
+            conn.close()
+        return await self._connect()
+
+    def _release(self, conn, reusable):
+        if reusable and len(self._idle) < 16:
+            self._idle.append(conn)
+        else:
+            conn.close()
+
+    @staticmethod
+    def _path(path, params=None):
+        query = f'?{urlencode(params)}' if params else ''
+        return f'/{API_VERSION}{path}{query}'
+
+    @staticmethod
+    async def _send(conn, method, path, body=None, headers=None):
+        payload = json.dumps(body).encode('utf-8') if body is not None else b''
+        lines = [f'{method} {path} HTTP/1.1', 'Host: docker', f'Content-Length: {len(payload)}']
+        if body is not None:
+            lines.append('Content-Type: application/json')
+        lines.extend(f'{name}: {value}' for name, value in (headers or {}).items())
+        conn.writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + payload)
+        await conn.writer.drain()
+
+    @staticmethod
+    async def _read_head(conn):
+        status_line = await conn.reader.readline()
+        if not status_line:
+            raise ConnectionError('Docker daemon closed the connection')
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await conn.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        return status, headers
+
+    @staticmethod
+    async def _read_body(conn, status, headers):
+        if status in (204, 304) or 100 <= status < 200:
+            return b''
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await conn.reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    await conn.reader.readline()
+                    return b''.join(chunks)
+                chunks.append(await conn.reader.readexactly(size))
+                await conn.reader.readline()
+        if 'content-length' in headers:
+            return await conn.reader.readexactly(int(headers['content-length']))
+        return await conn.reader.read()
+
+    async def request(self, method, path, params=None, body=None):
+        """发送一次请求，返回解析后的JSON（无内容时为 None）；非2xx状态抛出 DockerAPIError。"""
+        async with self._slots:
+            conn = await self._acquire()
+            reusable = False
+            try:
+                await self._send(conn, method, self._path(path, params), body)
+                status, headers = await self._read_head(conn)
+                data = await self._read_body(conn, status, headers)
+                reusable = headers.get('connection', '').lower() != 'close'
+            finally:
+                self._release(conn, reusable)
+        if status >= 300:
+            try:
+                message = json.loads(data).get('message', '')
+            except ValueError:
+                message = data.decode('utf-8', errors='ignore')
+            raise DockerAPIError(status, message)
+        return json.loads(data) if data else None
+
+    async def attach(self, container_id):
+        """
+        attach 到容器的 stdout/stderr（含已产生的日志），返回劫持后的连接。
+        流为多路复用帧，用 read_frames 读取，读完后连接关闭，不回到连接池；
+        每个运行中的容器占用一个，数量由调用方的并发上限约束，不计入 max_connections，
+        以免 attach 占满连接后 wait 请求无连接可用。
+        """
+        conn = await self._connect()
+        try:
+            params = {'stream': 1, 'stdout': 1, 'stderr': 1, 'logs': 1}
+            await self._send(conn, 'POST', self._path(f'/containers/{quote(container_id)}/attach', params),
+                             headers={'Connection': 'Upgrade', 'Upgrade': 'tcp'})
+            status, headers = await self._read_head(conn)
+            if status not in (101, 200):
+                data = await self._read_body(conn, status, headers)
+                raise DockerAPIError(status, data.decode('utf-8', errors='ignore'))
+        except BaseException:
+            conn.close()
+            raise
+        return conn
+
+    async def read_frames(self, conn, on_chunk):
+        """按帧读取多路复用流，on_chunk(stdout块, stderr块) 返回 False 时停止。"""
+        try:
+            while True:
+                try:
+                    header = await conn.reader.readexactly(8)
+                except asyncio.IncompleteReadError:
+                    return
+                size = int.from_bytes(header[4:], 'big')
+                data = await conn.reader.readexactly(size)
+                if header[0] == 2:
+                    keep_going = on_chunk(None, data)
+                else:
+                    keep_going = on_chunk(data, None)
+                if not keep_going:
+                    return
+        finally:
+            conn.close()
+
+    async def close(self):
+        while self._idle:
+            self._idle.pop().close()
+
+
+class DriverLoop:
+    """后台线程中运行的事件循环，同步代码通过 run 提交协程并等待结果。"""
+
+    def __init__(self, base_url=None, max_connections=64):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name='docker-async', daemon=True)
+        self._thread.start()
+        self.client = self.run(self._make_client(base_url, max_connections))
+
+    @staticmethod
+    async def _make_client(base_url, max_connections):
+        return AsyncDockerClient(base_url, max_connections)
+
+    def run(self, coro, timeout=None):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+
+_driver = None
+_driver_pid = None
+_driver_lock = threading.Lock()
+
+
+def shared_driver(base_url=None, max_connections=64):
+    """每个进程共用一个驱动；fork 出的子进程重新创建，不继承父进程的事件循环和连接。"""
+    global _driver, _driver_pid
+    with _driver_lock:
+        if _driver is None or _driver_pid != os.getpid():
+            _driver = DriverLoop(base_url, max_connections)
+            _driver_pid = os.getpid()
+        return _driver
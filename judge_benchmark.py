@@ -0,0 +1,314 @@
+"""
+评测性能基准：用合成的提交和题目直接驱动 CodeJudge，测量用例延迟分位数、给定并发下的吞吐量，
+以及沙箱开销与程序本身运行时间的比例，结果写成JSON，可与之前的结果比较。
+
+用法：
+    python judge_benchmark.py --backend process --concurrency 4 --output bench.json
+    python judge_benchmark.py --output new.json --compare bench.json
+
+没有Docker时 --backend auto（默认）自动改用本机进程沙箱。
+TLE、OOM、输出过多这类病态提交只在单用例题目上运行，避免一次基准跑上几分钟。
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+import judge_metrics
+from code_judge import CodeJudge
+
+
+PROGRAMS = {
+    'python': {
+        'accepted': 'import sys\nsys.stdout.write(sys.stdin.read())\n',
+        'wrong_answer': 'import sys\nsys.stdin.read()\nprint("wrong")\n',
+        'tle': 'while True:\n    pass\n',
+        'oom': 'blocks = []\nwhile True:\n    blocks.append(bytearray(1 << 20))\n',
+        'output_flood': 'import sys\nwhile True:\n    sys.stdout.write("x" * 65536)\n',
+        'compile_error': 'def main(:\n    pass\n'
+    },
+    'c': {
+        'accepted': '#include <stdio.h>\nint main(void){char b[65536];size_t n;'
+                    'while((n=fread(b,1,sizeof b,stdin))>0)fwrite(b,1,n,stdout);return 0;}\n',
+        'wrong_answer': '#include <stdio.h>\nint main(void){puts("wrong");return 0;}\n',
+        'tle': 'int main(void){volatile unsigned long i=0;for(;;)i++;return 0;}\n',
+        'oom': '#include <stdlib.h>\n#include <string.h>\n'
+               'int main(void){for(;;){char*p=malloc(1<<20);if(!p)return 1;memset(p,1,1<<20);}}\n',
+        'output_flood': '#include <stdio.h>\n#include <string.h>\n'
+                        'int main(void){char b[65536];memset(b,120,sizeof b);for(;;)fwrite(b,1,sizeof b,stdout);}\n',
+        'compile_error': 'int main(void){ return 0 }\n'
+    },
+    'cpp': {
+        'accepted': '#include <iostream>\nint main(){std::ios::sync_with_stdio(false);'
+                    'std::cout<<std::cin.rdbuf();return 0;}\n',
+        'wrong_answer': '#include <iostream>\nint main(){std::cout<<"wrong\\n";return 0;}\n',
+        'tle': 'int main(){volatile unsigned long i=0;for(;;)i++;}\n',
+        'oom': '#include <vector>\n#include <cstring>\n'
+               'int main(){std::vector<char*> v;for(;;){char*p=new char[1<<20];std::memset(p,1,1<<20);v.push_back(p);}}\n',
+        'output_flood': '#include <cstdio>\n#include <cstring>\n'
+                        'int main(){static char b[65536];std::memset(b,120,sizeof b);for(;;)std::fwrite(b,1,sizeof b,stdout);}\n',
+        'compile_error': 'int main() { return 0 }\n'
+    }
+}
+
+# 各类提交的期望状态；沙箱差异导致的等价结果（如地址空间上限先于内存判定触发）一并接受
+EXPECTED = {
+    'accepted': ('accepted',),
+    'wrong_answer': ('wrong_answer',),
+    'tle': ('time_limit_exceeded',),
+    'oom': ('memory_limit_exceeded', 'runtime_error'),
+    'output_flood': ('output_limit_exceeded',),
+    'compile_error': ('compile_error', 'runtime_error')
+}
+PATHOLOGICAL = ('tle', 'oom', 'output_flood', 'compile_error')
+
+
+def make_cases(count, io_bytes):
+    """生成 count 个用例，每个输入约 io_bytes 字节，期望输出与输入相同。"""
+    line = 'benchmark 0123456789\n'
+    repeat = max(1, io_bytes // len(line))
+    cases = []
+    for idx in range(count):
+        data = f'case {idx}\n' + line * repeat
+        cases.append({'input': data, 'expected_output': data})
+    return cases
+
+
+def build_scenarios(languages, case_counts, io_sizes):
+    scenarios = []
+    for language in languages:
+        for kind in PROGRAMS[language]:
+            if kind in PATHOLOGICAL:
+                shapes = [(1, 'small')]
+            else:
+                shapes = [(count, io) for count in case_counts for io in io_sizes]
+            for count, io in shapes:
+                scenarios.append({
+                    'name': f'{language}/{kind}/cases={count}/io={io}',
+                    'language': language,
+                    'kind': kind,
+                    'cases': count,
+                    'io': io
+                })
+    return scenarios
+
+
+def percentiles(values):
+    if not values:
+        return {'p50': None, 'p90': None, 'p99': None, 'mean': None}
+    values = sorted(values)
+
+    def pick(fraction):
+        return round(values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))], 6)
+    return {'p50': pick(0.5), 'p90': pick(0.9), 'p99': pick(0.99),
+            'mean': round(sum(values) / len(values), 6)}
+
+
+def run_one(judge, scenario, cases):
+    """评测一次，返回耗时、各阶段耗时和逐用例结果。"""
+    start = time.perf_counter()
+    with judge_metrics.trace() as phases:
+        try:
+            results = judge.run_tests(PROGRAMS[scenario['language']][scenario['kind']],
+                                      scenario['language'], cases)
+            status = CodeJudge.overall_status(results)
+        except Exception as e:
+            results = []
+            status = f'error: {e}'
+    return {
+        'scenario': scenario['name'],
+        'elapsed': time.perf_counter() - start,
+        'status': status,
+        'phases': dict(phases),
+        'results': results
+    }
+
+
+def summarize(scenario, runs):
+    case_runtime, case_latency, case_overhead, overhead_ratio = [], [], [], []
+    phases = {}
+    for run in runs:
+        executed = [r for r in run['results'] if r.get('status') not in ('skipped', 'compile_error')]
+        run_phase = run['phases'].get('run', 0.0)
+        runtime = sum(r.get('wall_time') or 0.0 for r in executed)
+        if executed:
+            case_runtime.extend(r.get('wall_time') or 0.0 for r in executed)
+            case_latency.append(run_phase / len(executed))
+            case_overhead.append(max(run_phase - runtime, 0.0) / len(executed))
+        if run['elapsed'] > 0:
+            overhead_ratio.append(max(run['elapsed'] - runtime, 0.0) / run['elapsed'])
+        for phase, seconds in run['phases'].items():
+            phases.setdefault(phase, []).append(seconds)
+    statuses = {}
+    for run in runs:
+        statuses[run['status']] = statuses.get(run['status'], 0) + 1
+    expected = EXPECTED[scenario['kind']]
+    return dict(scenario, **{
+        'runs': len(runs),
+        'statuses': statuses,
+        'verdict_ok': all(run['status'] in expected for run in runs),
+        'submission_latency': percentiles([run['elapsed'] for run in runs]),
+        'case_latency': percentiles(case_latency),
+        'case_runtime': percentiles(case_runtime),
+        'case_overhead': percentiles(case_overhead),
+        'overhead_ratio': percentiles(overhead_ratio)['mean'],
+        'phases': {phase: percentiles(values)['mean'] for phase, values in sorted(phases.items())}
+    })
+
+
+def pick_backend(name):
+    if name != 'auto':
+        return name
+    try:
+        import docker
+        docker.from_env().ping()
+        return 'docker'
+    except Exception:
+        return 'process'
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def run_benchmark(args):
+    backend = pick_backend(args.backend)
+    judge = CodeJudge(
+        backend=backend,
+        timeout=args.time_limit,
+        mem_limit=args.mem_limit,
+        batch_mode=args.batch,
+        parallel_workers=args.parallel_workers,
+        python_fork_server=args.fork_server,
+        compile_cache_dir=args.compile_cache_dir,
+        output_limit=args.output_limit,
+        trusted_code=True  # 基准语料是自带的程序，非root时也可使用进程沙箱
+    )
+    languages = [lang for lang in args.languages if lang in judge.supported_languages()]
+    io_sizes = {'small': 16, 'large': args.large_io}
+    scenarios = build_scenarios(languages, args.cases, list(io_sizes))
+    case_sets = {(s['cases'], s['io']): make_cases(s['cases'], io_sizes[s['io']]) for s in scenarios}
+    jobs = [s for s in scenarios for _ in range(args.repeat)]
+
+    # 预热：首次编译、镜像和页缓存不计入结果
+    for scenario in scenarios:
+        if scenario['kind'] == 'accepted' and scenario['cases'] == 1:
+            run_one(judge, scenario, case_sets[(1, 'small')])
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        runs = list(executor.map(lambda s: run_one(judge, s, case_sets[(s['cases'], s['io'])]), jobs))
+    elapsed = time.perf_counter() - start
+
+    by_scenario = {}
+    for run in runs:
+        by_scenario.setdefault(run['scenario'], []).append(run)
+    summaries = [summarize(s, by_scenario.get(s['name'], [])) for s in scenarios]
+    all_cases = [r.get('wall_time') or 0.0 for run in runs for r in run['results']
+                 if r.get('status') not in ('skipped', 'compile_error')]
+    return {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'revision': git_revision(),
+            'backend': backend,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'concurrency': args.concurrency,
+            'repeat': args.repeat,
+            'languages': languages,
+            'config': {
+                'time_limit': args.time_limit,
+                'mem_limit': args.mem_limit,
+                'output_limit': args.output_limit,
+                'batch_mode': args.batch,
+                'parallel_workers': args.parallel_workers,
+                'python_fork_server': args.fork_server,
+                'compile_cache': bool(args.compile_cache_dir)
+            }
+        },
+        'summary': {
+            'submissions': len(runs),
+            'elapsed': round(elapsed, 3),
+            'submissions_per_second': round(len(runs) / elapsed, 3) if elapsed else None,
+            'case_runtime': percentiles(all_cases),
+            'verdict_mismatches': [s['name'] for s in summaries if not s['verdict_ok']]
+        },
+        'scenarios': summaries
+    }
+
+
+def compare(current, baseline, threshold):
+    """逐场景比较 p50 提交延迟和总体吞吐量，返回超过阈值的退化列表。"""
+    regressions = []
+    old = {s['name']: s for s in baseline.get('scenarios', [])}
+    for scenario in current['scenarios']:
+        before = old.get(scenario['name'])
+        if not before:
+            continue
+        a, b = before['submission_latency']['p50'], scenario['submission_latency']['p50']
+        if a and b:
+            change = (b - a) / a
+            print(f"{scenario['name']:<45} p50 {a * 1000:9.1f}ms -> {b * 1000:9.1f}ms ({change:+.1%})")
+            if change > threshold:
+                regressions.append(f"{scenario['name']}: p50 latency {change:+.1%}")
+    a = baseline.get('summary', {}).get('submissions_per_second')
+    b = current['summary']['submissions_per_second']
+    if a and b:
+        change = (b - a) / a
+        print(f"{'throughput':<45} {a:9.2f}/s -> {b:9.2f}/s ({change:+.1%})")
+        if -change > threshold:
+            regressions.append(f'throughput {change:+.1%}')
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='评测性能基准')
+    parser.add_argument('--backend', default='auto', choices=('auto', 'docker', 'docker_async', 'process'))
+    parser.add_argument('--languages', nargs='+', default=list(PROGRAMS), choices=list(PROGRAMS))
+    parser.add_argument('--cases', nargs='+', type=int, default=[1, 10, 100], help='题目的用例数')
+    parser.add_argument('--large-io', type=int, default=1024 * 1024, help='大输入输出用例的字节数')
+    parser.add_argument('--repeat', type=int, default=3, help='每个场景评测的次数')
+    parser.add_argument('--concurrency', type=int, default=1, help='同时评测的提交数')
+    parser.add_argument('--time-limit', type=float, default=1, help='单个用例的时间上限（秒）')
+    parser.add_argument('--mem-limit', default='128m')
+    parser.add_argument('--output-limit', type=int, default=8 * 1024 * 1024)
+    parser.add_argument('--batch', action='store_true', help='单容器批量运行用例')
+    parser.add_argument('--parallel-workers', type=int, default=0)
+    parser.add_argument('--fork-server', action='store_true', help='Python 提交使用 fork 模式')
+    parser.add_argument('--compile-cache-dir', default=None)
+    parser.add_argument('--output', default=None, help='结果JSON文件，默认输出到标准输出')
+    parser.add_argument('--compare', default=None, help='与之前的结果JSON比较')
+    parser.add_argument('--threshold', type=float, default=0.2, help='判定为退化的相对变化')
+    args = parser.parse_args(argv)
+
+    report = run_benchmark(args)
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    failed = bool(report['summary']['verdict_mismatches'])
+    if report['summary']['verdict_mismatches']:
+        print('verdict mismatches: ' + ', '.join(report['summary']['verdict_mismatches']), file=sys.stderr)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        for item in regressions:
+            print('regression: ' + item, file=sys.stderr)
+        failed = failed or bool(regressions)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
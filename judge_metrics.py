@@ -0,0 +1,189 @@
+"""
+评测指标：进程内的计数器和直方图，按 Prometheus 文本格式导出。
+只依赖标准库，每次记录只是一次加锁的字典累加，可以在生产环境常开。
+评测进程和 Web 进程各自持有一份，分别通过各自的 /metrics 暴露。
+"""
+import time
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._values = {}  # 标签 -> [各桶计数, 总和, 总数]
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = _format_labels(self.labelnames, key, f'le="{bound}"')
+                lines.append(f'{self.name}_bucket{le} {cumulative}')
+            le = _format_labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f'{self.name}_bucket{le} {count}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, key)} {count}')
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+PHASE_SECONDS = REGISTRY.histogram(
+    'judge_phase_seconds', 'Wall time of each judge phase.', ('phase', 'language'))
+SANDBOX_SECONDS = REGISTRY.histogram(
+    'judge_sandbox_operation_seconds', 'Wall time of sandbox backend operations.', ('backend', 'operation'))
+SUBMISSION_SECONDS = REGISTRY.histogram(
+    'judge_submission_seconds', 'Total time to judge one submission.', ('language', 'source'),
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300))
+CASES = REGISTRY.histogram(
+    'judge_cases_run', 'Test cases actually executed per submission.', ('language',),
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200))
+VERDICTS = REGISTRY.counter(
+    'judge_verdicts_total', 'Submission verdicts by language, status and source.', ('language', 'status', 'source'))
+SANDBOX_ERRORS = REGISTRY.counter(
+    'judge_sandbox_errors_total', 'Sandbox executions that failed outside the user program.', ('backend', 'kind'))
+
+_trace = threading.local()
+
+
+@contextmanager
+def trace():
+    """收集当前线程在该范围内各阶段的耗时，用于逐提交的结构化日志；返回 {阶段: 秒}。"""
+    phases = {}
+    previous = getattr(_trace, 'phases', None)
+    _trace.phases = phases
+    try:
+        yield phases
+    finally:
+        _trace.phases = previous
+
+
+@contextmanager
+def timed(phase, language=''):
+    """记录一个评测阶段的耗时。"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        PHASE_SECONDS.observe(elapsed, phase=phase, language=language)
+        phases = getattr(_trace, 'phases', None)
+        if phases is not None:
+            phases[phase] = round(phases.get(phase, 0.0) + elapsed, 6)
+
+
+@contextmanager
+def timed_operation(backend, operation):
+    """记录一次沙箱后端操作（创建容器、执行、回收等）的耗时。"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        SANDBOX_SECONDS.observe(time.perf_counter() - start, backend=backend, operation=operation)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port, host='0.0.0.0'):
+    """在后台线程中提供 /metrics，供没有 Web 服务的评测进程使用。"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='judge-metrics', daemon=True).start()
+    return server
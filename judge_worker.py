@@ -0,0 +1,37 @@
+import argparse
+import multiprocessing
+from app import create_app
+from app.judge_queue import run_worker
+
+
+def worker_main(capacity=None, metrics_port=None):
+    app = create_app()
+    run_worker(app, capacity=capacity, metrics_port=metrics_port)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='启动评测进程，从 submissions 表领取待评测提交')
+    parser.add_argument('--workers', type=int, default=None, help='评测进程数，默认取配置 JUDGE_WORKERS')
+    parser.add_argument('--capacity', type=int, default=None, help='每个进程同时评测的提交数，默认取配置 JUDGE_WORKER_CAPACITY')
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help='第一个进程的 /metrics 端口，其余进程依次加一，默认取配置 JUDGE_METRICS_PORT（0为不启动）')
+    args = parser.parse_args()
+
+    config = create_app().config
+    workers = args.workers or config['JUDGE_WORKERS']
+    metrics_port = args.metrics_port if args.metrics_port is not None else config['JUDGE_METRICS_PORT']
+    processes = [
+        multiprocessing.Process(target=worker_main, args=(args.capacity, metrics_port + i if metrics_port else None),
+                                name=f'judge-worker-{i}')
+        for i in range(workers)
+    ]
+    for p in processes:
+        p.start()
+    try:
+        for p in processes:
+            p.join()
+    except KeyboardInterrupt:
+        for p in processes:
+            p.terminate()
+        for p in processes:
+            p.join()
@@ -0,0 +1,294 @@
+"""
+流式输出比较器：分块读取选手输出和期望输出，内存占用与输出大小无关，
+遇到第一个不一致处即停止比较，并给出选手输出中的行号和列号。
+
+比较模式：
+- exact：忽略整体首尾空白后逐字节比较（与 strip() 后相等的判定一致）
+- token：忽略空白差异，按空白分隔的词逐个比较
+- float：按词比较，都能解析为数值的词在误差范围内视为相等
+- special：把输出写入临时文件，调用题目提供的评测程序判定
+
+本模块会和 sandbox_runner.py 一起拷贝进沙箱，只能依赖标准库。
+"""
+import math
+import os
+import re
+import sys
+import shutil
+import subprocess
+import tempfile
+
+WHITESPACE = b' \t\n\r\x0b\x0c'
+CHUNK_SIZE = 64 * 1024
+TOKEN_RE = re.compile(rb'\S+')
+DEFAULT_TOLERANCE = 1e-6
+
+
+class _Position:
+    """记录已消费的选手输出对应的行列号（从1开始）。"""
+
+    def __init__(self):
+        self.line = 1
+        self.column = 1
+
+    def advance(self, data):
+        newlines = data.count(b'\n')
+        if newlines:
+            self.line += newlines
+            self.column = len(data) - data.rfind(b'\n')
+        else:
+            self.column += len(data)
+
+    def snapshot(self):
+        return {'line': self.line, 'column': self.column}
+
+
+def _iter_chunks(fileobj):
+    while True:
+        data = fileobj.read(CHUNK_SIZE)
+        if not data:
+            return
+        yield data
+
+
+def _iter_tokens(chunks):
+    carry = b''
+    for chunk in chunks:
+        data = carry + chunk
+        carry = b''
+        for m in TOKEN_RE.finditer(data):
+            if m.end() == len(data):
+                carry = m.group()  # 可能被下一块截断，留到下一块再判断
+            else:
+                yield m.group()
+    if carry:
+        yield carry
+
+
+class ExactComparator:
+    """
+    逐字节比较。找到第一个不同的字节后，只要双方剩余部分都是空白仍判为一致，
+    这与比较 strip() 之后的字符串等价。
+    """
+
+    def __init__(self, expected):
+        self._expected = _iter_chunks(expected)
+        self._exp_buf = b''
+        self._exp_pos = 0
+        self._exp_started = False
+        self._out_started = False
+        self.position = _Position()
+        self._diverged_at = None
+        self.mismatch = None
+
+    def _expected_view(self):
+        """返回期望输出中尚未比较的部分，已读完时返回空串。"""
+        while self._exp_pos >= len(self._exp_buf):
+            data = next(self._expected, None)
+            if data is None:
+                return b''
+            if not self._exp_started:
+                data = data.lstrip(WHITESPACE)
+                if not data:
+                    continue
+                self._exp_started = True
+            self._exp_buf, self._exp_pos = data, 0
+        return memoryview(self._exp_buf)[self._exp_pos:]
+
+    def feed(self, chunk):
+        if self.mismatch or not chunk:
+            return
+        if not self._out_started:
+            stripped = chunk.lstrip(WHITESPACE)
+            self.position.advance(chunk[:len(chunk) - len(stripped)])
+            chunk = stripped
+            if not chunk:
+                return
+            self._out_started = True
+
+        while chunk:
+            if self._diverged_at is not None:
+                if chunk.strip(WHITESPACE):
+                    self.mismatch = self._diverged_at
+                return
+            expected = self._expected_view()
+            n = min(len(chunk), len(expected))
+            if n and chunk[:n] == expected[:n]:
+                self.position.advance(chunk[:n])
+                chunk = chunk[n:]
+                self._exp_pos += n
+                continue
+            i = 0
+            while i < n and chunk[i] == expected[i]:
+                i += 1
+            self.position.advance(chunk[:i])
+            chunk = chunk[i:]
+            self._exp_pos += i
+            self._diverged_at = self.position.snapshot()
+
+    def finish(self):
+        if self.mismatch is None:
+            rest_is_blank = True
+            while True:
+                expected = self._expected_view()
+                if not len(expected):
+                    break
+                if bytes(expected).strip(WHITESPACE):
+                    rest_is_blank = False
+                    break
+                self._exp_pos += len(expected)
+            if not rest_is_blank:
+                self.mismatch = self._diverged_at or self.position.snapshot()
+        return {'passed': self.mismatch is None, 'mismatch': self.mismatch, 'message': ''}
+
+
+class TokenComparator:
+    """按空白分隔的词比较；指定 tolerance 时数值词按绝对或相对误差比较。"""
+
+    def __init__(self, expected, tolerance=None):
+        self._expected = _iter_tokens(_iter_chunks(expected))
+        self.tolerance = tolerance
+        self.position = _Position()
+        self._carry = b''
+        self.mismatch = None
+
+    def feed(self, chunk):
+        if self.mismatch or not chunk:
+            return
+        data = self._carry + chunk
+        self._carry = b''
+        consumed = 0
+        for m in TOKEN_RE.finditer(data):
+            if m.end() == len(data):
+                self._carry = m.group()
+                break
+            self.position.advance(data[consumed:m.start()])
+            if not self._match(m.group()):
+                return
+            self.position.advance(m.group())
+            consumed = m.end()
+        self.position.advance(data[consumed:len(data) - len(self._carry)])
+
+    def finish(self):
+        if self.mismatch is None and self._carry:
+            self._match(self._carry)
+            self._carry = b''
+        if self.mismatch is None and next(self._expected, None) is not None:
+            self.mismatch = self.position.snapshot()
+        return {'passed': self.mismatch is None, 'mismatch': self.mismatch, 'message': ''}
+
+    def _match(self, token):
+        expected = next(self._expected, None)
+        if expected is None or not self._equal(token, expected):
+            self.mismatch = self.position.snapshot()
+            return False
+        return True
+
+    def _equal(self, actual, expected):
+        if actual == expected:
+            return True
+        if self.tolerance is None:
+            return False
+        try:
+            x, y = float(actual), float(expected)
+        except ValueError:
+            return False
+        if math.isnan(x) or math.isnan(y):
+            return False
+        return abs(x - y) <= self.tolerance * max(1.0, abs(y))
+
+
+def _kill_group(pid):
+    try:
+        os.killpg(pid, 9)
+    except OSError:
+        pass
+
+
+class SpecialComparator:
+    """
+    特判：把选手输出写入私有临时目录，输出结束后执行
+    `python3 评测程序 输入文件 期望输出文件 选手输出文件`（均为绝对路径），退出码为0视为通过，
+    评测程序的标准输出作为说明信息。
+    run_as=(uid, gid) 时评测程序以该普通用户运行：评测程序和数据先拷贝进临时目录并改为该用户只读，
+    目录本身属于root、该用户不可写；运行结束后杀掉其进程组并删除目录。需要root和CAP_CHOWN。
+    """
+
+    def __init__(self, program_path, input_path, expected_path, timeout=10, run_as=None):
+        self.program_path = os.path.abspath(program_path)
+        self.input_path = input_path
+        self.expected_path = expected_path
+        self.timeout = timeout
+        self.run_as = run_as
+        self.work_dir = tempfile.mkdtemp(prefix='judge_check_')
+        self.output_path = os.path.join(self.work_dir, 'output.txt')
+        self._output = os.fdopen(os.open(self.output_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), 'wb')
+
+    def feed(self, chunk):
+        self._output.write(chunk)
+
+    def _stage(self, src, name):
+        path = os.path.join(self.work_dir, name)
+        shutil.copyfile(src, path)
+        return path
+
+    def _drop_privileges(self):
+        uid, gid = self.run_as
+        os.setgroups([])
+        os.setgid(gid)
+        os.setuid(uid)
+
+    def finish(self):
+        self._output.close()
+        try:
+            argv = [sys.executable, self._stage(self.program_path, 'checker.py'),
+                    self._stage(self.input_path, 'input.txt'), self._stage(self.expected_path, 'expected.txt'),
+                    self.output_path]
+            if self.run_as:
+                for path in argv[1:]:
+                    os.chmod(path, 0o400)
+                    os.chown(path, *self.run_as)
+                os.chmod(self.work_dir, 0o711)
+            proc = subprocess.Popen(
+                argv,
+                cwd=self.work_dir,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                start_new_session=True,
+                preexec_fn=self._drop_privileges if self.run_as else None
+            )
+            try:
+                output, _ = proc.communicate(timeout=self.timeout)
+                passed = proc.returncode == 0
+                message = output[:1024].decode('utf-8', errors='ignore').strip()
+            except subprocess.TimeoutExpired:
+                _kill_group(proc.pid)
+                proc.communicate()
+                passed, message = False, 'Checker timed out'
+            # 评测程序留下的子进程一并结束
+            _kill_group(proc.pid)
+        except OSError as e:
+            passed, message = False, f'Checker failed: {e}'
+        finally:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+        return {'passed': passed, 'mismatch': None, 'message': message}
+
+
+def make_comparator(checker, expected, input_path=None, expected_path=None, run_as=None):
+    """
+    按题目的比较配置创建比较器。checker 为 None 或 {'mode': ..., ...}；
+    expected 为以二进制方式打开的期望输出文件对象；run_as 为特判程序的 (uid, gid)。
+    """
+    checker = checker or {}
+    mode = checker.get('mode', 'exact')
+    if mode == 'exact':
+        return ExactComparator(expected)
+    if mode == 'token':
+        return TokenComparator(expected)
+    if mode == 'float':
+        return TokenComparator(expected, tolerance=checker.get('tolerance', DEFAULT_TOLERANCE))
+    if mode == 'special':
+        return SpecialComparator(checker['program'], input_path, expected_path,
+                                 timeout=checker.get('timeout', 10), run_as=run_as)
+    raise ValueError(f'Unsupported checker mode: {mode}')
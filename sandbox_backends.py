@@ -0,0 +1,602 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import select
+import shutil
+import hashlib
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import docker
+from judge_metrics import SANDBOX_ERRORS, timed_operation
+from docker_async import shared_driver
+
+try:
+    import seccomp
+except ImportError:  # 未安装 libseccomp 的 Python 绑定时进程沙箱只能用于可信代码
+    seccomp = None
+
+
+DEFAULT_OUTPUT_LIMIT = 64 * 1024 * 1024
+DATA_MOUNT = '/usr/src/data'  # 测试数据缓存在容器内的只读挂载点
+
+_shared_clients = {}
+_shared_clients_lock = threading.Lock()
+
+
+def shared_docker_client(max_pool_size=32):
+    """每个进程共用一个 docker 客户端及其连接池，fork 出的子进程重新创建。"""
+    pid = os.getpid()
+    with _shared_clients_lock:
+        client = _shared_clients.get(pid)
+        if client is None:
+            _shared_clients.clear()
+            client = _shared_clients[pid] = docker.from_env(max_pool_size=max_pool_size)
+        return client
+
+
+class OutputCollector:
+    """逐块收集标准输出和标准错误，任一超过上限即标记超限，只保留上限以内的前缀。"""
+
+    def __init__(self, limit=DEFAULT_OUTPUT_LIMIT):
+        self.limit = limit
+        self.stdout = bytearray()
+        self.stderr = bytearray()
+        self.exceeded = False
+
+    def feed(self, out_chunk=None, err_chunk=None):
+        """追加一块输出，超限时返回 False，调用方应终止程序并停止读取。"""
+        for buf, chunk in ((self.stdout, out_chunk), (self.stderr, err_chunk)):
+            if not chunk:
+                continue
+            if len(buf) + len(chunk) > self.limit:
+                buf += chunk[:self.limit - len(buf)]
+                self.exceeded = True
+            else:
+                buf += chunk
+        return not self.exceeded
+
+    def decoded(self):
+        return (self.stdout.decode('utf-8', errors='ignore'),
+                self.stderr.decode('utf-8', errors='ignore'))
+
+
+class SandboxBackend:
+    """
+    沙箱执行后端接口：在隔离环境中以 temp_dir 为工作目录执行一条 shell 命令。
+    execute 返回 {'exit_code', 'stdout', 'stderr', 'timeout', 'oom_killed', 'output_limit_exceeded'}，
+    输出边执行边读取，超过 output_limit 字节时终止程序。
+    runner=True 表示命令是 sandbox_runner.py：以root启动，由运行器在执行用户程序前自行降权，
+    这样评测数据可以对用户程序不可读。
+    """
+    name = 'sandbox'  # 指标中的后端名
+
+    def execute(self, temp_dir, command, workdir, timeout, writeback=False, output_limit=None, runner=False):
+        raise NotImplementedError
+
+    def environment_id(self):
+        """标识运行环境（镜像或本机编译器），用于编译缓存的键。"""
+        raise NotImplementedError
+
+    def data_path(self, host_path):
+        """测试数据缓存中的文件在沙箱内的路径，默认与宿主机相同。"""
+        return host_path
+
+    def has_tool(self, name):
+        """沙箱内是否有指定的编译器或解释器；评测镜像默认包含全部工具。"""
+        return True
+
+    def execute_many(self, jobs, limit, stop=None):
+        """
+        并发执行多条命令（jobs 为 execute 的关键字参数），返回与 jobs 一一对应的结果列表。
+        stop(序号, 结果) 为真时取消尚未开始的执行，这些执行的结果为 None。
+        """
+        results = [None] * len(jobs)
+        with ThreadPoolExecutor(max_workers=limit, thread_name_prefix='judge_case') as executor:
+            futures = {executor.submit(self.execute, **job): position for position, job in enumerate(jobs)}
+            for future in as_completed(futures):
+                if future.cancelled():
+                    continue
+                position = futures[future]
+                results[position] = future.result()
+                if stop is not None and stop(position, results[position]):
+                    for pending in futures:
+                        pending.cancel()
+        return results
+
+
+class DockerBackend(SandboxBackend):
+    """每次执行启动一个新容器；配置了容器池时改用池中的预热容器。"""
+    name = 'docker'
+    # 运行器以root启动时只保留降权、杀进程、读取评测数据和把数据交给特判用户所需的能力
+    RUNNER_OPTIONS = {
+        'user': '0:0',
+        'cap_drop': ['ALL'],
+        'cap_add': ['SETUID', 'SETGID', 'KILL', 'DAC_READ_SEARCH', 'CHOWN'],
+        'security_opt': ['no-new-privileges']
+    }
+
+    def __init__(self, client, image, container_kwargs, pool=None, data_root=None):
+        self.client = client
+        self.image = image
+        self.container_kwargs = container_kwargs
+        self.pool = pool
+        self.data_root = os.path.abspath(data_root) if data_root else None
+        self._image_digest = None
+
+    def environment_id(self):
+        if self._image_digest is None:
+            try:
+                self._image_digest = self.client.images.get(self.image).id
+            except Exception:
+                return self.image
+        return self._image_digest
+
+    def data_path(self, host_path):
+        return os.path.join(DATA_MOUNT, os.path.relpath(host_path, self.data_root))
+
+    def execute(self, temp_dir, command, workdir, timeout, writeback=False, output_limit=None, runner=False):
+        output_limit = output_limit or DEFAULT_OUTPUT_LIMIT
+        if self.pool:
+            return self.pool.execute(self.image, temp_dir, command, workdir, timeout,
+                                     writeback=writeback, output_limit=output_limit, runner=runner)
+        container = None
+        try:
+            if writeback:
+                # 编译需要把产物写回评测目录，容器内以1000用户运行；
+                # 粘滞位使其不能删除或替换目录中已有的文件（源码、特判程序）
+                os.chmod(temp_dir, 0o1777)
+            volumes = {
+                os.path.abspath(temp_dir): {
+                    'bind': '/usr/src/app',
+                    'mode': 'rw' if writeback else 'ro'
+                }
+            }
+            if self.data_root:
+                volumes[self.data_root] = {'bind': DATA_MOUNT, 'mode': 'ro'}
+            user_options = self.RUNNER_OPTIONS if runner else {'user': '1000:1000'}
+            with timed_operation(self.name, 'create'):
+                container = self.client.containers.run(
+                    image=self.image,
+                    command=['/bin/sh', '-c', command],
+                    working_dir=workdir,
+                    volumes=volumes,
+                    tmpfs={'/tmp': 'rw,size=64m,mode=1777'},
+                    network_disabled=True,
+                    detach=True,
+                    stdout=True,
+                    stderr=True,
+                    remove=False,
+                    read_only=True,
+                    **user_options,
+                    **self.container_kwargs
+                )
+            collector = OutputCollector(output_limit)
+            reader = threading.Thread(target=self._collect_output, args=(container, collector), daemon=True)
+            with timed_operation(self.name, 'wait'):
+                reader.start()
+                try:
+                    exit_status = container.wait(timeout=timeout)
+                    exit_code = exit_status.get('StatusCode', -1)
+                    timeout_flag = False
+                except Exception:
+                    container.kill()
+                    exit_code = -1
+                    timeout_flag = True
+                reader.join(timeout=5)
+            stdout, stderr = collector.decoded()
+            with timed_operation(self.name, 'inspect'):
+                container.reload()
+            oom_killed = container.attrs.get('State', {}).get('OOMKilled', False)
+            return {
+                'exit_code': -1 if collector.exceeded else exit_code,
+                'stdout': stdout,
+                'stderr': stderr,
+                'timeout': timeout_flag,
+                'oom_killed': oom_killed,
+                'output_limit_exceeded': collector.exceeded
+            }
+        except docker.errors.ContainerError as e:
+            SANDBOX_ERRORS.inc(backend=self.name, kind='container_error')
+            return {
+                'exit_code': e.exit_status,
+                'stdout': e.stdout.decode('utf-8', errors='ignore') if e.stdout else '',
+                'stderr': e.stderr.decode('utf-8', errors='ignore') if e.stderr else '',
+                'timeout': False,
+                'oom_killed': False,
+                'output_limit_exceeded': False
+            }
+        except Exception as e:
+            SANDBOX_ERRORS.inc(backend=self.name, kind='docker_error')
+            return {
+                'exit_code': -1,
+                'stdout': '',
+                'stderr': str(e),
+                'timeout': False,
+                'oom_killed': False,
+                'output_limit_exceeded': False
+            }
+        finally:
+            if container:
+                with timed_operation(self.name, 'remove'):
+                    try:
+                        container.remove(force=True)
+                    except Exception:
+                        SANDBOX_ERRORS.inc(backend=self.name, kind='remove_failed')
+
+
+    @staticmethod
+    def _collect_output(container, collector):
+        """通过 attach 流式读取容器输出（含启动前已产生的日志），超限时杀掉容器。"""
+        try:
+            stream = container.attach(stdout=True, stderr=True, stream=True, logs=True, demux=True)
+            for out_chunk, err_chunk in stream:
+                if not collector.feed(out_chunk, err_chunk):
+                    container.kill()
+                    break
+        except Exception:
+            pass
+
+
+class AsyncDockerBackend(SandboxBackend):
+    """
+    与 DockerBackend 语义相同，但容器的创建、attach、启动、等待、检查和删除都通过进程内共用的
+    异步驱动（docker_async）完成：连接复用，stdout/stderr 由一次 attach 的多路复用流读取，
+    删除容器在后台进行、不阻塞返回结果。并发运行的容器都在同一个事件循环线程中处理。
+    """
+    name = 'docker_async'
+    RUNNER_HOST_CONFIG = {
+        'CapDrop': DockerBackend.RUNNER_OPTIONS['cap_drop'],
+        'CapAdd': DockerBackend.RUNNER_OPTIONS['cap_add'],
+        'SecurityOpt': DockerBackend.RUNNER_OPTIONS['security_opt']
+    }
+
+    def __init__(self, image, host_limits, data_root=None, base_url=None, max_connections=64):
+        self.image = image
+        self.host_limits = host_limits  # HostConfig 中的 Memory、PidsLimit、CpuPeriod、CpuQuota
+        self.data_root = os.path.abspath(data_root) if data_root else None
+        self.driver = shared_driver(base_url, max_connections)
+        self._image_digest = None
+        self._background = set()
+
+    def environment_id(self):
+        if self._image_digest is None:
+            try:
+                self._image_digest = self.driver.run(
+                    self.driver.client.request('GET', f'/images/{self.image}/json'))['Id']
+            except Exception:
+                return self.image
+        return self._image_digest
+
+    def data_path(self, host_path):
+        return os.path.join(DATA_MOUNT, os.path.relpath(host_path, self.data_root))
+
+    def execute(self, temp_dir, command, workdir, timeout, writeback=False, output_limit=None, runner=False):
+        return self.driver.run(self._execute(temp_dir, command, workdir, timeout, writeback=writeback,
+                                             output_limit=output_limit, runner=runner))
+
+    def execute_many(self, jobs, limit, stop=None):
+        return self.driver.run(self._execute_many(jobs, limit, stop))
+
+    async def _execute_many(self, jobs, limit, stop):
+        slots = asyncio.Semaphore(limit)
+        started = set()
+
+        async def run(position, job):
+            async with slots:
+                started.add(position)
+                return await self._execute(**job)
+
+        tasks = {asyncio.ensure_future(run(position, job)): position for position, job in enumerate(jobs)}
+        results = [None] * len(jobs)
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.cancelled():
+                    continue
+                position = tasks[task]
+                results[position] = task.result()
+                if stop is not None and stop(position, results[position]):
+                    # 与线程池一致：只取消还没开始的执行，已在运行的照常完成
+                    for other in pending:
+                        if tasks[other] not in started:
+                            other.cancel()
+        return results
+
+    def _container_config(self, temp_dir, command, workdir, writeback, runner):
+        binds = [f"{os.path.abspath(temp_dir)}:/usr/src/app:{'rw' if writeback else 'ro'}"]
+        if self.data_root:
+            binds.append(f'{self.data_root}:{DATA_MOUNT}:ro')
+        host_config = {
+            'Binds': binds,
+            'Tmpfs': {'/tmp': 'rw,size=64m,mode=1777'},
+            'ReadonlyRootfs': True,
+            **self.host_limits
+        }
+        if runner:
+            host_config.update(self.RUNNER_HOST_CONFIG)
+        return {
+            'Image': self.image,
+            'Cmd': ['/bin/sh', '-c', command],
+            'WorkingDir': workdir,
+            'User': '0:0' if runner else '1000:1000',
+            'NetworkDisabled': True,
+            'AttachStdout': True,
+            'AttachStderr': True,
+            'HostConfig': host_config
+        }
+
+    async def _execute(self, temp_dir, command, workdir, timeout, writeback=False, output_limit=None, runner=False):
+        client = self.driver.client
+        collector = OutputCollector(output_limit or DEFAULT_OUTPUT_LIMIT)
+        container_id = None
+        try:
+            if writeback:
+                # 编译需要把产物写回评测目录，容器内以1000用户运行；
+                # 粘滞位使其不能删除或替换目录中已有的文件（源码、特判程序）
+                os.chmod(temp_dir, 0o1777)
+            with timed_operation(self.name, 'create'):
+                created = await client.request('POST', '/containers/create',
+                                               body=self._container_config(temp_dir, command, workdir,
+                                                                           writeback, runner))
+            container_id = created['Id']
+            # 先 attach 再启动，一个连接上同时收到 stdout 和 stderr
+            stream = await client.attach(container_id)
+
+            def on_chunk(out_chunk, err_chunk):
+                if collector.feed(out_chunk, err_chunk):
+                    return True
+                self._in_background(self._kill(container_id))
+                return False
+
+            reader = asyncio.ensure_future(client.read_frames(stream, on_chunk))
+            with timed_operation(self.name, 'wait'):
+                try:
+                    await client.request('POST', f'/containers/{container_id}/start')
+                    exit_status = await asyncio.wait_for(
+                        client.request('POST', f'/containers/{container_id}/wait'), timeout)
+                    exit_code = exit_status.get('StatusCode', -1)
+                    timeout_flag = False
+                except asyncio.TimeoutError:
+                    await self._kill(container_id)
+                    exit_code = -1
+                    timeout_flag = True
+                try:
+                    await asyncio.wait_for(reader, 5)
+                except asyncio.TimeoutError:
+                    pass
+            with timed_operation(self.name, 'inspect'):
+                info = await client.request('GET', f'/containers/{container_id}/json')
+            stdout, stderr = collector.decoded()
+            return {
+                'exit_code': -1 if collector.exceeded else exit_code,
+                'stdout': stdout,
+                'stderr': stderr,
+                'timeout': timeout_flag,
+                'oom_killed': info.get('State', {}).get('OOMKilled', False),
+                'output_limit_exceeded': collector.exceeded
+            }
+        except Exception as e:
+            SANDBOX_ERRORS.inc(backend=self.name, kind='docker_error')
+            return {
+                'exit_code': -1,
+                'stdout': '',
+                'stderr': str(e),
+                'timeout': False,
+                'oom_killed': False,
+                'output_limit_exceeded': False
+            }
+        finally:
+            if container_id:
+                self._in_background(self._remove(container_id))
+
+    def _in_background(self, coro):
+        task = asyncio.ensure_future(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _kill(self, container_id):
+        try:
+            await self.driver.client.request('POST', f'/containers/{container_id}/kill')
+        except Exception:
+            pass  # 容器可能已经退出
+
+    async def _remove(self, container_id):
+        with timed_operation(self.name, 'remove'):
+            try:
+                await self.driver.client.request('DELETE', f'/containers/{container_id}', params={'force': 1})
+            except Exception:
+                SANDBOX_ERRORS.inc(backend=self.name, kind='remove_failed')
+
+
+class ProcessBackend(SandboxBackend):
+    """
+    轻量进程沙箱：不依赖Docker守护进程，直接在本机以子进程运行，
+    通过Linux命名空间（挂载、PID、网络、IPC、UTS）、rlimit（CPU、地址空间、进程数、文件大小）
+    和 seccomp 系统调用过滤隔离，每个作业使用独立的 tmpfs 工作目录。
+    用户程序在新的PID命名空间中运行，只能看到自己的进程，/root、/home 被空目录遮住，
+    但宿主机上其他对所有人可读的文件仍然可见，生产环境应使用Docker后端。
+    隔离由单独启动的 sandbox_isolate.py 完成后再 exec 命令，可以在多个线程中同时调用。
+
+    必须以root运行并安装 libseccomp 的 Python 绑定：运行器靠降权保护评测数据，特判程序也以单独的普通用户运行。
+    非root时用户程序与评测进程同属一个用户，能读到期望输出，
+    只能在评测可信代码时（如本机性能基准）以 trusted=True 使用，此时缺少 seccomp 绑定也不加载过滤。
+    """
+    name = 'process'
+    ISOLATE_HELPER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sandbox_isolate.py')
+    HIDDEN_PATHS = ('/root', '/home')
+    SANDBOX_UID = 1000
+    SANDBOX_GID = 1000
+
+    def __init__(self, mem_limit_bytes, pids_limit=64, file_size_limit=64 * 1024 * 1024,
+                 work_root=None, isolate_namespaces=True, trusted=False, data_root=None):
+        if os.geteuid() != 0 and not trusted:
+            raise PermissionError('The process sandbox must run as root to protect judge data; '
+                                  'pass trusted=True only for trusted code such as local benchmarks')
+        if seccomp is None and not trusted:
+            raise RuntimeError('The process sandbox requires the libseccomp Python bindings; '
+                               'pass trusted=True only for trusted code such as local benchmarks')
+        self.mem_limit_bytes = mem_limit_bytes
+        self.pids_limit = pids_limit
+        self.file_size_limit = file_size_limit
+        self.isolate_namespaces = isolate_namespaces
+        self.trusted = trusted
+        if work_root is None and os.path.isdir('/dev/shm'):
+            work_root = '/dev/shm'
+        self.work_root = work_root
+        self.data_root = os.path.abspath(data_root) if data_root else None  # 测试数据缓存目录，不能被遮住
+        self._environment_id = None
+
+    def has_tool(self, name):
+        return shutil.which(name, path='/usr/local/bin:/usr/bin:/bin') is not None
+
+    def environment_id(self):
+        if self._environment_id is None:
+            h = hashlib.sha256()
+            for tool in ('gcc', 'g++', 'python3'):
+                path = shutil.which(tool)
+                if path:
+                    stat = os.stat(os.path.realpath(path))
+                    h.update(f'{tool}:{os.path.realpath(path)}:{stat.st_size}:{stat.st_mtime_ns};'.encode())
+            self._environment_id = 'process:' + h.hexdigest()
+        return self._environment_id
+
+    def execute(self, temp_dir, command, workdir, timeout, writeback=False, output_limit=None, runner=False):
+        job_dir = tempfile.mkdtemp(prefix='judge_job_', dir=self.work_root)
+        try:
+            # 只有编译需要写工作目录，临时文件统一写到单独的 tmp 子目录
+            os.chmod(job_dir, 0o1777 if writeback else 0o755)
+            tmp_dir = os.path.join(job_dir, 'tmp')
+            os.mkdir(tmp_dir)
+            os.chmod(tmp_dir, 0o1777)
+            with timed_operation(self.name, 'sync_in'):
+                for name in os.listdir(temp_dir):
+                    src = os.path.join(temp_dir, name)
+                    if os.path.isfile(src):
+                        shutil.copy2(src, os.path.join(job_dir, name))
+
+            with timed_operation(self.name, 'spawn'):
+                proc = self._spawn(command, job_dir, tmp_dir, timeout, drop_privileges=not runner)
+            collector = OutputCollector(output_limit or DEFAULT_OUTPUT_LIMIT)
+            with timed_operation(self.name, 'wait'):
+                timeout_flag = not self._pump_output(proc, collector, time.monotonic() + timeout)
+                self._kill_group(proc.pid)
+                proc.wait()
+            stdout, stderr = collector.decoded()
+
+            if writeback:
+                for name in os.listdir(job_dir):
+                    src = os.path.join(job_dir, name)
+                    dst = os.path.join(temp_dir, name)
+                    if os.path.isfile(src) and not os.path.exists(dst):
+                        shutil.copy2(src, dst)
+            return {
+                'exit_code': -1 if timeout_flag or collector.exceeded else self._exit_code(proc.returncode),
+                'stdout': stdout,
+                'stderr': stderr,
+                'timeout': timeout_flag,
+                'oom_killed': False,
+                'output_limit_exceeded': collector.exceeded
+            }
+        except Exception as e:
+            SANDBOX_ERRORS.inc(backend=self.name, kind='process_error')
+            return {
+                'exit_code': -1,
+                'stdout': '',
+                'stderr': str(e),
+                'timeout': False,
+                'oom_killed': False,
+                'output_limit_exceeded': False
+            }
+        finally:
+            shutil.rmtree(job_dir, ignore_errors=True)
+
+    def _pump_output(self, proc, collector, deadline):
+        """读取子进程输出直到结束；超时返回 False，输出超限时立即杀掉进程组。"""
+        streams = {proc.stdout.fileno(): 'out', proc.stderr.fileno(): 'err'}
+        try:
+            while streams:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                ready, _, _ = select.select(list(streams), [], [], remaining)
+                for fd in ready:
+                    data = os.read(fd, 65536)
+                    if not data:
+                        del streams[fd]
+                    elif not collector.feed(*((data, None) if streams[fd] == 'out' else (None, data))):
+                        return True
+            while proc.poll() is None:
+                if time.monotonic() >= deadline:
+                    return False
+                time.sleep(0.001)
+            return True
+        finally:
+            proc.stdout.close()
+            proc.stderr.close()
+
+    def _isolation_options(self, timeout, drop_privileges, error_fd):
+        return {
+            'isolate_namespaces': self.isolate_namespaces,
+            'mem_limit_bytes': self.mem_limit_bytes,
+            'timeout': timeout,
+            'file_size_limit': self.file_size_limit,
+            'pids_limit': self.pids_limit,
+            'drop_privileges': drop_privileges,
+            'uid': self.SANDBOX_UID,
+            'gid': self.SANDBOX_GID,
+            'hidden_paths': list(self.HIDDEN_PATHS),
+            'visible_paths': [self.data_root] if self.data_root else [],
+            'require_seccomp': not self.trusted,
+            'error_fd': error_fd
+        }
+
+    def _spawn(self, command, job_dir, tmp_dir, timeout, drop_privileges=True):
+        """
+        经隔离辅助程序启动命令；drop_privileges=False 时保留root身份，由运行器在执行用户程序前降权。
+        辅助程序准备隔离失败时从 error_fd 读到原因，抛出异常。
+        """
+        error_r, error_w = os.pipe()
+        try:
+            options = self._isolation_options(timeout, drop_privileges, error_w)
+            proc = subprocess.Popen(
+                [sys.executable, '-I', self.ISOLATE_HELPER, json.dumps(options), '--', '/bin/sh', '-c', command],
+                cwd=job_dir,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                env={'PATH': '/usr/local/bin:/usr/bin:/bin', 'HOME': tmp_dir, 'TMPDIR': tmp_dir},
+                start_new_session=True,
+                pass_fds=(error_w,)
+            )
+            os.close(error_w)
+            error_w = None
+            with os.fdopen(error_r, 'rb') as error_pipe:
+                error_r = None
+                message = error_pipe.read()
+        finally:
+            for fd in (error_r, error_w):
+                if fd is not None:
+                    os.close(fd)
+        if message:
+            proc.wait()
+            proc.stdout.close()
+            proc.stderr.close()
+            raise RuntimeError(f"Sandbox setup failed: {message.decode('utf-8', errors='ignore')}")
+        return proc
+
+    @staticmethod
+    def _kill_group(pid):
+        try:
+            os.killpg(pid, 9)
+        except OSError:
+            pass
+
+    @staticmethod
+    def _exit_code(returncode):
+        # 与容器内 /bin/sh 的约定一致：被信号终止时为 128+信号值
+        return 128 - returncode if returncode < 0 else returncode
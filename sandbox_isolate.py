@@ -0,0 +1,134 @@
+"""
+进程沙箱的隔离辅助程序：由 ProcessBackend 以独立的解释器启动，在单线程的新进程中
+进入新命名空间、设置rlimit、降权并加载系统调用过滤，然后 exec 要执行的命令。
+隔离不放在 Popen 的 preexec_fn 中做：评测进程是多线程的，fork 之后在子进程里运行
+Python 代码可能卡在 fork 时被其他线程持有的锁上。
+
+用法：python3 sandbox_isolate.py <选项JSON> -- 命令 [参数...]
+选项见 ProcessBackend._isolation_options。准备失败时把原因写入选项中的 error_fd 并以 127 退出；
+error_fd 带 close-on-exec，exec 成功后父进程读到 EOF。该脚本只能依赖标准库（seccomp 绑定可选）。
+"""
+import os
+import sys
+import json
+import errno
+import ctypes
+import resource
+
+try:
+    import seccomp
+except ImportError:
+    seccomp = None
+
+CLONE_NEWNS = 0x00020000
+CLONE_NEWUTS = 0x04000000
+CLONE_NEWIPC = 0x08000000
+CLONE_NEWUSER = 0x10000000
+CLONE_NEWPID = 0x20000000
+CLONE_NEWNET = 0x40000000
+MS_NOSUID = 0x2
+MS_NODEV = 0x4
+MS_NOEXEC = 0x8
+MS_REC = 0x4000
+MS_PRIVATE = 0x40000
+PR_SET_NO_NEW_PRIVS = 38
+# 评测程序不需要的危险系统调用，一律返回 EPERM
+DENIED_SYSCALLS = (
+    'socket', 'socketpair', 'connect', 'bind', 'listen', 'accept', 'accept4',
+    'ptrace', 'mount', 'umount2', 'pivot_root', 'chroot', 'unshare', 'setns',
+    'reboot', 'kexec_load', 'init_module', 'finit_module', 'delete_module',
+    'swapon', 'swapoff', 'sethostname', 'setdomainname', 'bpf', 'perf_event_open'
+)
+
+_libc = ctypes.CDLL(None, use_errno=True)
+
+
+def _check(result, what):
+    if result != 0:
+        err = ctypes.get_errno()
+        raise OSError(err, f'{what} failed: {os.strerror(err)}')
+
+
+def _mount(source, target, fstype, flags, data=None):
+    encode = lambda value: value.encode() if value is not None else None
+    _check(_libc.mount(encode(source), encode(target), encode(fstype), flags, encode(data)), f'mount {target}')
+
+
+def _enter_pid_namespace(options):
+    """
+    新PID命名空间只对之后创建的子进程生效：再 fork 一次，子进程成为命名空间中的1号进程，
+    继续执行命令；当前进程等待它结束并转交退出码。1号进程退出时命名空间内的残留进程全部被杀掉。
+    """
+    pid = os.fork()
+    if pid:
+        os.close(options['error_fd'])
+        _, status = os.waitpid(pid, 0)
+        os._exit(os.WEXITSTATUS(status) if os.WIFEXITED(status) else 128 + os.WTERMSIG(status))
+    # 挂载只在本命名空间内可见：换上只含本命名空间进程的 /proc，遮住宿主机的用户目录
+    _mount(None, '/', None, MS_REC | MS_PRIVATE)
+    _mount('proc', '/proc', 'proc', MS_NOSUID | MS_NODEV | MS_NOEXEC)
+    needed = [os.getcwd()] + options['visible_paths']
+    for path in options['hidden_paths']:
+        if os.path.isdir(path) and not any(p == path or p.startswith(path + '/') for p in needed):
+            _mount('tmpfs', path, 'tmpfs', MS_NOSUID | MS_NODEV | MS_NOEXEC, 'size=4k,mode=755')
+
+
+def _load_seccomp(required):
+    if seccomp is None:
+        if required:
+            raise RuntimeError('libseccomp Python bindings are not installed')
+        return
+    syscall_filter = seccomp.SyscallFilter(defaction=seccomp.ALLOW)
+    for name in DENIED_SYSCALLS:
+        try:
+            syscall_filter.add_rule(seccomp.ERRNO(errno.EPERM), name)
+        except Exception:
+            pass  # 当前架构不存在该系统调用
+    syscall_filter.load()
+
+
+def isolate(options):
+    """进入新命名空间、设置rlimit、降权并加载系统调用过滤；drop_privileges 为假时保留root身份，由运行器降权。"""
+    if options['isolate_namespaces']:
+        flags = CLONE_NEWNET | CLONE_NEWIPC | CLONE_NEWUTS
+        if os.geteuid() != 0:
+            flags |= CLONE_NEWUSER
+        else:
+            flags |= CLONE_NEWNS | CLONE_NEWPID
+        _check(_libc.unshare(flags), 'unshare')
+        if flags & CLONE_NEWPID:
+            _enter_pid_namespace(options)
+
+    # 地址空间上限留出余量给解释器和运行器本身，精确的内存判定由运行器按峰值RSS完成
+    address_space = options['mem_limit_bytes'] * 4
+    resource.setrlimit(resource.RLIMIT_AS, (address_space, address_space))
+    cpu_limit = int(options['timeout']) + 1
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu_limit, cpu_limit + 1))
+    resource.setrlimit(resource.RLIMIT_FSIZE, (options['file_size_limit'], options['file_size_limit']))
+    resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+    if options['drop_privileges'] and os.geteuid() == 0:
+        os.setgroups([])
+        os.setgid(options['gid'])
+        os.setuid(options['uid'])
+    # RLIMIT_NPROC 按用户计数，降权之后设置才有意义
+    resource.setrlimit(resource.RLIMIT_NPROC, (options['pids_limit'], options['pids_limit']))
+
+    _check(_libc.prctl(PR_SET_NO_NEW_PRIVS, 1, 0, 0, 0), 'prctl')
+    _load_seccomp(options['require_seccomp'])
+
+
+def main(argv):
+    options = json.loads(argv[1])
+    command = argv[argv.index('--') + 1:]
+    error_fd = options['error_fd']
+    os.set_inheritable(error_fd, False)
+    try:
+        isolate(options)
+        os.execve(command[0], command, os.environ)
+    except Exception as e:
+        os.write(error_fd, f'{type(e).__name__}: {e}'.encode('utf-8', errors='ignore'))
+    os._exit(127)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,261 @@
+import os
+import shlex
+import shutil
+import tempfile
+import threading
+import time
+from collections import deque
+from sandbox_backends import DockerBackend, OutputCollector, DEFAULT_OUTPUT_LIMIT, DATA_MOUNT
+from judge_metrics import SANDBOX_ERRORS, SANDBOX_SECONDS, timed_operation
+
+
+class PooledContainer:
+    """池中的一个常驻容器及其宿主机工作目录。"""
+
+    def __init__(self, container, host_dir):
+        self.container = container
+        self.host_dir = host_dir
+        self.uses = 0
+        self.oom_count = 0
+
+
+class ContainerPool:
+    """
+    预热沙箱容器池：按镜像维护若干常驻的断网、只读容器，
+    每次作业结束后重置，达到使用次数上限或出现异常（OOM、超时、文件残留）时回收。
+    容器与一次性容器的运行器使用相同的能力限制；工作目录平时属主可写、沙箱用户只读，
+    只有编译时带粘滞位对沙箱用户开放，用户程序无法删除或替换其中的评测数据和特判程序。
+    """
+    name = 'docker_pool'  # 指标中的后端名
+    WORKDIR = '/usr/src/app'
+    SANDBOX_USER = '1000:1000'
+    # 以root身份执行：杀掉沙箱用户和特判用户的残留进程，清空/tmp，输出OOM计数和残留文件数；
+    # 工作目录由宿主机一侧清空。沙箱用户在/tmp中建立的私有子目录无法清除时容器按残留回收
+    RESET_SCRIPT = (
+        'for p in /proc/[0-9]*; do '
+        'case "$(stat -c %u "$p" 2>/dev/null)" in 1000|1001) kill -9 "${p#/proc/}" 2>/dev/null;; esac; '
+        'done; '
+        'find /tmp -mindepth 1 -delete 2>/dev/null; '
+        'cat /sys/fs/cgroup/memory.events /sys/fs/cgroup/memory/memory.oom_control 2>/dev/null '
+        '| awk \'/^oom_kill /{n=$2} END{print "oom=" n+0}\'; '
+        'echo "files=$(find /tmp -mindepth 1 2>/dev/null | wc -l)"'
+    )
+
+    def __init__(self, client, container_kwargs, size=2, max_uses=50, base_dir=None, data_root=None):
+        self.client = client
+        self.container_kwargs = container_kwargs
+        self.size = size
+        self.max_uses = max_uses
+        self.base_dir = base_dir
+        self.data_root = os.path.abspath(data_root) if data_root else None  # 测试数据缓存目录，只读挂载
+        self._idle = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'resets': 0,
+            'reset_time': 0.0,
+            'recycled': {}
+        }
+
+    def warm(self, image):
+        """预先启动容器，直到该镜像的空闲容器数达到池大小。"""
+        while True:
+            with self._lock:
+                if len(self._idle.setdefault(image, deque())) >= self.size:
+                    return
+            slot = self._start(image)
+            with self._lock:
+                self._idle[image].append(slot)
+
+    def acquire(self, image):
+        with self._lock:
+            idle = self._idle.setdefault(image, deque())
+            if idle:
+                self._stats['hits'] += 1
+                return idle.popleft()
+            self._stats['misses'] += 1
+        return self._start(image)
+
+    def release(self, image, slot, recycle_reason=None):
+        if recycle_reason is None and slot.uses >= self.max_uses:
+            recycle_reason = 'max_uses'
+        with self._lock:
+            idle = self._idle.setdefault(image, deque())
+            if recycle_reason is None and len(idle) < self.size:
+                idle.append(slot)
+                return
+            if recycle_reason is None:
+                recycle_reason = 'overflow'
+            recycled = self._stats['recycled']
+            recycled[recycle_reason] = recycled.get(recycle_reason, 0) + 1
+        self._destroy(slot)
+
+    def execute(self, image, temp_dir, command, workdir, timeout, writeback=False, output_limit=None,
+                runner=False):
+        """
+        在池中容器内执行命令，返回结构与 CodeJudge._run_in_docker 一致。
+        writeback=True 时把执行中新产生的文件（如编译产物）拷回 temp_dir；
+        runner=True 时以root执行，由运行器自行降权。
+        输出流式读取，超过 output_limit 时停止读取，残留进程在重置时被杀掉。
+        """
+        with timed_operation(self.name, 'acquire'):
+            slot = self.acquire(image)
+        recycle_reason = None
+        try:
+            with timed_operation(self.name, 'sync_in'):
+                # 只有编译需要写工作目录
+                os.chmod(slot.host_dir, 0o1777 if writeback else 0o755)
+                self._sync_in(temp_dir, slot.host_dir)
+            wrapped = f'timeout -k 1 {timeout} /bin/sh -c {shlex.quote(command)}'
+            start_time = time.monotonic()
+            api = self.client.api
+            exec_id = api.exec_create(
+                slot.container.id,
+                ['/bin/sh', '-c', wrapped],
+                workdir=workdir,
+                user='0:0' if runner else self.SANDBOX_USER
+            )['Id']
+            collector = OutputCollector(output_limit or DEFAULT_OUTPUT_LIMIT)
+            stream = api.exec_start(exec_id, stream=True, demux=True)
+            try:
+                for out_chunk, err_chunk in stream:
+                    if not collector.feed(out_chunk, err_chunk):
+                        break
+            finally:
+                if hasattr(stream, 'close'):
+                    stream.close()
+            elapsed = time.monotonic() - start_time
+            SANDBOX_SECONDS.observe(elapsed, backend=self.name, operation='exec')
+            slot.uses += 1
+            with timed_operation(self.name, 'inspect'):
+                exit_code = api.exec_inspect(exec_id).get('ExitCode')
+            if exit_code is None or collector.exceeded:
+                exit_code = -1
+            stdout, stderr = collector.decoded()
+            timeout_flag = not collector.exceeded and (exit_code == 124 or elapsed >= timeout)
+            if writeback:
+                with timed_operation(self.name, 'sync_out'):
+                    self._sync_out(slot.host_dir, temp_dir)
+            with timed_operation(self.name, 'reset'):
+                oom_killed, dirty = self._reset(slot)
+            if timeout_flag:
+                recycle_reason = 'timeout'
+            elif oom_killed:
+                recycle_reason = 'oom'
+            elif dirty:
+                recycle_reason = 'dirty'
+            return {
+                'exit_code': -1 if timeout_flag else exit_code,
+                'stdout': stdout,
+                'stderr': stderr,
+                'timeout': timeout_flag,
+                'oom_killed': oom_killed,
+                'output_limit_exceeded': collector.exceeded
+            }
+        except Exception as e:
+            recycle_reason = 'error'
+            SANDBOX_ERRORS.inc(backend=self.name, kind='pool_error')
+            return {
+                'exit_code': -1,
+                'stdout': '',
+                'stderr': str(e),
+                'timeout': False,
+                'oom_killed': False,
+                'output_limit_exceeded': False
+            }
+        finally:
+            self.release(image, slot, recycle_reason)
+
+    def stats(self):
+        with self._lock:
+            resets = self._stats['resets']
+            return {
+                'hits': self._stats['hits'],
+                'misses': self._stats['misses'],
+                'resets': resets,
+                'avg_reset_ms': round(self._stats['reset_time'] * 1000 / resets, 3) if resets else 0.0,
+                'recycled': dict(self._stats['recycled']),
+                'idle': {image: len(idle) for image, idle in self._idle.items()}
+            }
+
+    def close(self):
+        with self._lock:
+            slots = [slot for idle in self._idle.values() for slot in idle]
+            self._idle = {}
+        for slot in slots:
+            self._destroy(slot)
+
+    def _start(self, image):
+        host_dir = tempfile.mkdtemp(prefix='judge_pool_', dir=self.base_dir)
+        os.chmod(host_dir, 0o755)
+        volumes = {host_dir: {'bind': self.WORKDIR, 'mode': 'rw'}}
+        if self.data_root:
+            volumes[self.data_root] = {'bind': DATA_MOUNT, 'mode': 'ro'}
+        try:
+            container = self.client.containers.run(
+                image=image,
+                command=['sleep', 'infinity'],
+                working_dir=self.WORKDIR,
+                volumes=volumes,
+                tmpfs={'/tmp': 'rw,size=64m,mode=1777'},
+                network_disabled=True,
+                read_only=True,
+                init=True,
+                detach=True,
+                **DockerBackend.RUNNER_OPTIONS,
+                **self.container_kwargs
+            )
+        except Exception:
+            shutil.rmtree(host_dir, ignore_errors=True)
+            raise
+        return PooledContainer(container, host_dir)
+
+    def _destroy(self, slot):
+        try:
+            slot.container.remove(force=True)
+        except Exception:
+            pass
+        shutil.rmtree(slot.host_dir, ignore_errors=True)
+
+    def _reset(self, slot):
+        start_time = time.monotonic()
+        _, output = slot.container.exec_run(['/bin/sh', '-c', self.RESET_SCRIPT], user='0:0')
+        values = {}
+        for line in (output or b'').decode('utf-8', errors='ignore').splitlines():
+            key, _, value = line.partition('=')
+            values[key.strip()] = value.strip()
+        oom_count = int(values.get('oom') or 0)
+        oom_killed = oom_count > slot.oom_count
+        slot.oom_count = oom_count
+        dirty = values.get('files') != '0'
+        # 残留进程已被杀掉，再清空工作目录，目录属于宿主机进程
+        os.chmod(slot.host_dir, 0o755)
+        for name in os.listdir(slot.host_dir):
+            path = os.path.join(slot.host_dir, name)
+            try:
+                if os.path.isdir(path) and not os.path.islink(path):
+                    shutil.rmtree(path)
+                else:
+                    os.unlink(path)
+            except OSError:
+                dirty = True
+        with self._lock:
+            self._stats['resets'] += 1
+            self._stats['reset_time'] += time.monotonic() - start_time
+        return oom_killed, dirty
+
+    @staticmethod
+    def _sync_in(src_dir, dst_dir):
+        for name in os.listdir(src_dir):
+            src = os.path.join(src_dir, name)
+            if os.path.isfile(src):
+                shutil.copy2(src, os.path.join(dst_dir, name))
+
+    @staticmethod
+    def _sync_out(src_dir, dst_dir):
+        for name in os.listdir(src_dir):
+            src = os.path.join(src_dir, name)
+            dst = os.path.join(dst_dir, name)
+            if os.path.isfile(src) and not os.path.exists(dst):
+                shutil.copy2(src, dst)
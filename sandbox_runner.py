@@ -0,0 +1,330 @@
+"""
+沙箱内运行器：在容器内对每个用例执行一次用户程序，
+通过 wait4 取得用户进程本身的CPU时间（user+sys）、墙钟时间和峰值内存，
+并据此判定超时和超内存；输出边读边交给 output_comparator 流式比较，
+只保留开头一小段用于展示，超过上限立即终止程序。
+每个用例结束后向标准输出写一行JSON结果。
+
+内存不在运行中按用例限制：峰值内存（ru_maxrss）超过 memory_limit 即判为超内存。
+容器的内存上限是 memory_limit 加上运行器和特判程序的开销，只作兜底；
+用户程序的 oom_score_adj 设为最大，内存耗尽时 OOM killer 先杀用户程序而不是运行器。
+
+运行器以root身份启动时，子进程在打开输入文件之后降为普通用户再执行用户程序，
+输入和期望输出以0600权限存放，用户程序无法读取；特判程序以另一个普通用户运行，
+不以root执行，也不与用户程序同属一个用户。
+
+Python 提交可以使用 fork 模式（清单中给出 python_main）：源码只编译一次，
+每个用例由运行器直接 fork 出子进程执行字节码，省去解释器启动。
+子进程先抛出异常回到模块顶层，运行器的栈帧（其中有清单和用例）随之释放后再执行用户代码；
+sys.modules、__main__、sys.argv 和标准输入输出恢复为解释器启动时的状态。
+这不是全新的解释器：builtins 和启动时已导入的模块与运行器共用（运行器不修改它们）。
+
+用法：python3 sandbox_runner.py cases.json
+该脚本会被拷贝进评测目录，在容器中执行，只能依赖标准库。
+"""
+import sys
+
+# 解释器启动后、运行器导入任何模块之前的模块集合，即全新运行 python3 main.py 时的 sys.modules
+_BASE_MODULES = frozenset(sys.modules)
+
+import atexit
+import builtins
+import gc
+import io
+import json
+import mmap
+import os
+import resource
+import select
+import signal
+import time
+import traceback
+
+from output_comparator import make_comparator
+
+STDERR_LIMIT = 64 * 1024  # 标准错误只保留前64KB，其余丢弃
+
+
+def _kill_group(pid):
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except OSError:
+        pass
+
+
+def _wait_child(pid, deadline):
+    """在截止时间前等待子进程退出，超时返回 None。"""
+    while True:
+        waited, status, usage = os.wait4(pid, os.WNOHANG)
+        if waited:
+            return status, usage
+        if time.monotonic() >= deadline:
+            return None
+        time.sleep(0.001)
+
+
+def _oom_kill_count():
+    """容器所在 cgroup 累计的 OOM kill 次数（v2 的 memory.events 或 v1 的 memory.oom_control），读不到时为 None。"""
+    for path in ('/sys/fs/cgroup/memory.events', '/sys/fs/cgroup/memory/memory.oom_control'):
+        try:
+            with open(path) as f:
+                for line in f:
+                    key, _, value = line.partition(' ')
+                    if key == 'oom_kill':
+                        return int(value)
+        except (OSError, ValueError):
+            continue
+    return None
+
+
+def _open_expected(path):
+    """以只读 mmap 打开期望输出，直接读页缓存，不必整体读入内存。"""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return io.BytesIO(b'')  # 空文件无法映射
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class _PythonChild(BaseException):
+    """fork 模式的子进程准备好后抛出，回到模块顶层再执行用户代码，参数为 _run_python_child 的参数。"""
+
+
+def _child_spec(manifest):
+    """子进程需要的设置，不把整个清单（含全部用例的路径）交给子进程。"""
+    return {
+        'argv': manifest['argv'],
+        'python_main': manifest.get('python_main'),
+        'time_limit': manifest['time_limit'],
+        'nproc_limit': manifest.get('nproc_limit'),
+        'sandbox_uid': manifest.get('sandbox_uid', 1000),
+        'sandbox_gid': manifest.get('sandbox_gid', 1000)
+    }
+
+
+def _exec_child(spec, input_path, out_w, err_w, program=None):
+    """
+    子进程：重定向标准输入输出，设置资源限制并降权后执行用户程序，不会返回。
+    program 为 fork 模式下预先编译的 (字节码, 编译错误)，此时不再 exec，而是抛出 _PythonChild。
+    """
+    try:
+        os.setsid()
+        in_fd = os.open(input_path, os.O_RDONLY)
+        os.dup2(in_fd, 0)
+        os.dup2(out_w, 1)
+        os.dup2(err_w, 2)
+        os.closerange(3, os.sysconf('SC_OPEN_MAX'))
+        cpu_limit = int(spec['time_limit']) + 1
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_limit, cpu_limit + 1))
+        _prefer_oom_kill()
+        if os.getuid() == 0:
+            nproc = spec['nproc_limit']
+            if nproc:
+                resource.setrlimit(resource.RLIMIT_NPROC, (nproc, nproc))
+            os.setgroups([])
+            os.setgid(spec['sandbox_gid'])
+            os.setuid(spec['sandbox_uid'])
+        if program is None:
+            os.execvp(spec['argv'][0], spec['argv'])
+    except Exception as e:
+        os.write(2, str(e).encode('utf-8', errors='ignore'))
+        os._exit(127)
+    raise _PythonChild(spec['python_main'], *program)
+
+
+def _prefer_oom_kill():
+    # 调高自身的 oom_score_adj 不需要特权；在降权之前写，之后 /proc/self 可能不再可写
+    try:
+        with open('/proc/self/oom_score_adj', 'w') as f:
+            f.write('1000')
+    except OSError:
+        pass
+
+
+def _checker_user(manifest):
+    if os.getuid() != 0:
+        return None
+    return manifest.get('checker_uid', 1001), manifest.get('checker_gid', 1001)
+
+
+def _compile_python(path):
+    """编译一次用户代码，返回 (字节码, None)；有语法错误时返回 (None, 异常)，在每个用例中照常报告。"""
+    with open(path, 'rb') as f:
+        source = f.read()
+    try:
+        return compile(source, os.path.abspath(path), 'exec', dont_inherit=True), None
+    except (SyntaxError, ValueError) as e:
+        return None, e
+
+
+def _exit_status(code):
+    # 与解释器处理 SystemExit 的方式一致
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code & 0xff
+    print(code, file=sys.stderr)
+    return 1
+
+
+def _run_python_child(main_path, code, compile_error):
+    """在 fork 出的子进程中执行已编译的用户代码，模块和标准输入输出恢复为启动时的状态，不会返回。"""
+    gc.collect()  # 回收已释放的运行器栈帧中循环引用的对象
+    for name in list(sys.modules):
+        if name not in _BASE_MODULES:
+            del sys.modules[name]
+    main = type(sys)('__main__')
+    main.__file__ = os.path.abspath(main_path)
+    main.__builtins__ = builtins
+    sys.modules['__main__'] = main
+    sys.argv = [main_path]
+    sys.path[0] = os.path.dirname(os.path.abspath(main_path))
+    sys.stdin = sys.__stdin__ = open(0, 'r', closefd=False)
+    sys.stdout = sys.__stdout__ = open(1, 'w', closefd=False)
+    sys.stderr = sys.__stderr__ = open(2, 'w', closefd=False, errors='backslashreplace', buffering=1)
+
+    status = 0
+    try:
+        if compile_error is not None:
+            raise compile_error
+        exec(code, main.__dict__)
+    except SystemExit as e:
+        status = _exit_status(e.code)
+    except BaseException:
+        traceback.print_exc()
+        status = 1
+    # 解释器退出前会等待非守护线程并执行 atexit 注册的函数；用户代码导入的是新的 threading 模块
+    user_threading = sys.modules.get('threading')
+    if user_threading is not None:
+        for thread in user_threading.enumerate():
+            if thread is not user_threading.main_thread() and not thread.daemon:
+                thread.join()
+    atexit._run_exitfuncs()
+    try:
+        sys.stdout.flush()
+    except Exception:
+        status = 120
+    try:
+        sys.stderr.flush()
+    except Exception:
+        pass
+    os._exit(status)
+
+
+def run_case(manifest, case, program=None, spec=None):
+    time_limit = manifest['time_limit']
+    memory_limit = manifest['memory_limit']
+    output_limit = manifest['output_limit']
+    preview_limit = manifest.get('preview_limit', 4096)
+
+    oom_kills = _oom_kill_count()
+    out_r, out_w = os.pipe()
+    err_r, err_w = os.pipe()
+    start_time = time.monotonic()
+    pid = os.fork()
+    if pid == 0:
+        _exec_child(spec or _child_spec(manifest), case['input'], out_w, err_w, program)
+
+    os.close(out_w)
+    os.close(err_w)
+    expected_file = _open_expected(case['expected'])
+    comparator = make_comparator(manifest.get('checker'), expected_file,
+                                 input_path=case['input'], expected_path=case['expected'],
+                                 run_as=_checker_user(manifest))
+    deadline = start_time + manifest['wall_limit']
+    preview = bytearray()
+    stdout_size = 0
+    stderr = bytearray()
+    open_fds = [out_r, err_r]
+    timeout_flag = False
+    output_exceeded = False
+    while open_fds and not output_exceeded:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            timeout_flag = True
+            break
+        ready, _, _ = select.select(open_fds, [], [], remaining)
+        for fd in ready:
+            data = os.read(fd, 65536)
+            if not data:
+                open_fds.remove(fd)
+            elif fd == err_r:
+                stderr += data[:STDERR_LIMIT - len(stderr)]
+            else:
+                stdout_size += len(data)
+                if stdout_size > output_limit:
+                    output_exceeded = True
+                    break
+                comparator.feed(data)
+                preview += data[:preview_limit - len(preview)]
+    if output_exceeded:
+        _kill_group(pid)
+
+    waited = None if timeout_flag or output_exceeded else _wait_child(pid, deadline)
+    if waited is None:
+        timeout_flag = not output_exceeded
+        _kill_group(pid)
+        waited = _wait_child(pid, time.monotonic() + 5)
+    _kill_group(pid)
+    wall_time = time.monotonic() - start_time
+    os.close(out_r)
+    os.close(err_r)
+
+    status, usage = waited if waited else (0, None)
+    signaled = os.WIFSIGNALED(status)
+    term_sig = os.WTERMSIG(status) if signaled else 0
+    exit_code = 128 + term_sig if signaled else os.WEXITSTATUS(status)
+    cpu_time = usage.ru_utime + usage.ru_stime if usage else 0.0
+    # ru_maxrss 取 exec 前后的较大值，极小的程序会显示为运行器 fork 时的内存，不影响超限判定
+    memory_used = usage.ru_maxrss * 1024 if usage else 0
+
+    # 以实测值判定：CPU时间超限或被RLIMIT_CPU终止即为超时
+    timeout_flag = not output_exceeded and (
+        timeout_flag or cpu_time > time_limit or term_sig == signal.SIGXCPU
+    )
+    # SIGKILL 只有在 cgroup 的 OOM kill 计数增加时才算超内存，其他来源（程序自己、重置容器）按运行错误处理
+    cgroup_oom = term_sig == signal.SIGKILL and oom_kills is not None and (_oom_kill_count() or 0) > oom_kills
+    oom_killed = not timeout_flag and not output_exceeded and (memory_used > memory_limit or cgroup_oom)
+    # 只有正常结束的程序才需要比较，特判程序也只在此时运行
+    finished = exit_code == 0 and not (timeout_flag or oom_killed or output_exceeded)
+    compare = comparator.finish() if finished else {'passed': False, 'mismatch': None, 'message': ''}
+    expected_file.close()
+    return {
+        'exit_code': -1 if timeout_flag or output_exceeded else exit_code,
+        'stdout': preview.decode('utf-8', errors='ignore'),
+        'stderr': stderr.decode('utf-8', errors='ignore'),
+        'timeout': timeout_flag,
+        'oom_killed': oom_killed,
+        'output_limit_exceeded': output_exceeded,
+        'passed': finished and compare['passed'],
+        'mismatch': compare['mismatch'],
+        'checker_message': compare['message'],
+        'cpu_time': round(cpu_time, 3),
+        'wall_time': round(wall_time, 3),
+        'memory_used': memory_used
+    }
+
+
+def main(manifest_path):
+    with open(manifest_path, encoding='utf-8') as f:
+        manifest = json.load(f)
+    program = _compile_python(manifest['python_main']) if manifest.get('python_main') else None
+    spec = _child_spec(manifest)
+    for idx, case in enumerate(manifest['cases'], 1):
+        result = run_case(manifest, case, program, spec)
+        result['id'] = idx
+        sys.stdout.write(json.dumps(result) + '\n')
+        sys.stdout.flush()
+        if manifest.get('stop_on_failure') and not result['passed']:
+            break
+
+
+if __name__ == '__main__':
+    try:
+        main(sys.argv[1])
+    except _PythonChild as child:
+        # 只有 fork 模式的子进程会到这里，异常连同运行器的栈帧在离开 except 时释放
+        target = child.args
+    else:
+        target = None
+    if target is not None:
+        _run_python_child(*target)
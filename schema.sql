@@ -5,10 +5,12 @@ CREATE TABLE `users` (
   `password_hash` VARCHAR(255) NOT NULL COMMENT '密码哈希',
   `email` VARCHAR(128) NOT NULL COMMENT '邮箱',
   `role` ENUM('admin', 'teacher', 'student') NOT NULL DEFAULT 'student' COMMENT '用户角色',
+  `token_version` INT UNSIGNED NOT NULL DEFAULT 0 COMMENT '令牌版本，角色或密码变更时加一，旧令牌失效',
   `created_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
   PRIMARY KEY (`id`),
   UNIQUE KEY `uk_username` (`username`),
-  UNIQUE KEY `uk_email` (`email`)
+  UNIQUE KEY `uk_email` (`email`),
+  KEY `idx_role_id` (`role`, `id`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='用户表';
 
 -- 2. 题目表
@@ -22,6 +24,7 @@ CREATE TABLE `problems` (
   `created_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
   `language` ENUM('python', 'c', 'cpp') DEFAULT NULL COMMENT '编程题语言，仅编程题有效',
   `reference_code` TEXT DEFAULT NULL COMMENT '参考代码，仅编程题有效',
+  `checker` JSON DEFAULT NULL COMMENT '输出比较方式（JSON格式），为空时逐字节比较',
   PRIMARY KEY (`id`),
   KEY `idx_created_by` (`created_by`),
   CONSTRAINT `fk_problems_created_by` FOREIGN KEY (`created_by`) REFERENCES `users`(`id`) ON DELETE CASCADE ON UPDATE CASCADE
@@ -34,6 +37,7 @@ CREATE TABLE `test_cases` (
   `input_data` TEXT NOT NULL COMMENT '输入数据',
   `expected_output` TEXT NOT NULL COMMENT '期望输出',
   `is_hidden` TINYINT(1) NOT NULL DEFAULT 0 COMMENT '是否为隐藏用例',
+  `content_hash` CHAR(32) GENERATED ALWAYS AS (MD5(CONCAT(MD5(`input_data`), MD5(`expected_output`)))) STORED COMMENT '输入和期望输出的哈希，由数据库维护',
   PRIMARY KEY (`id`),
   KEY `idx_problem_id` (`problem_id`),
   CONSTRAINT `fk_test_cases_problem_id` FOREIGN KEY (`problem_id`) REFERENCES `problems`(`id`) ON DELETE CASCADE ON UPDATE CASCADE
@@ -47,6 +51,7 @@ CREATE TABLE `assignments` (
   `start_time` DATETIME NOT NULL COMMENT '开始时间',
   `end_time` DATETIME NOT NULL COMMENT '结束时间',
   `created_by` INT UNSIGNED NOT NULL COMMENT '创建者ID（老师，外键）',
+  `version` INT UNSIGNED NOT NULL DEFAULT 0 COMMENT '内容版本，作业或其题目变更时加一，用于详情缓存和ETag',
   PRIMARY KEY (`id`),
   KEY `idx_created_by` (`created_by`),
   CONSTRAINT `fk_assignments_created_by` FOREIGN KEY (`created_by`) REFERENCES `users`(`id`) ON DELETE CASCADE ON UPDATE CASCADE
@@ -59,6 +64,7 @@ CREATE TABLE `assignment_problems` (
   `problem_id` INT UNSIGNED NOT NULL COMMENT '题目ID（外键）',
   `score` DECIMAL(5,2) NOT NULL DEFAULT 0 COMMENT '题目分值',
   PRIMARY KEY (`id`),
+  UNIQUE KEY `uk_assignment_problem` (`assignment_id`, `problem_id`),
   KEY `idx_assignment_id` (`assignment_id`),
   KEY `idx_problem_id` (`problem_id`),
   CONSTRAINT `fk_assignment_problems_assignment_id` FOREIGN KEY (`assignment_id`) REFERENCES `assignments`(`id`) ON DELETE CASCADE ON UPDATE CASCADE,
@@ -76,11 +82,86 @@ CREATE TABLE `submissions` (
   `status` ENUM('judging', 'accepted', 'wrong_answer', 'runtime_error', 'compile_error', 'time_limit_exceeded', 'memory_limit_exceeded', 'output_limit_exceeded', 'system_error') NOT NULL DEFAULT 'judging' COMMENT '评测状态',
   `result` JSON DEFAULT NULL COMMENT '评测结果（JSON格式）',
   `submitted_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '提交时间',
+  `judge_worker` VARCHAR(64) DEFAULT NULL COMMENT '当前持有评测租约的评测进程',
+  `lease_expires_at` DATETIME DEFAULT NULL COMMENT '评测租约到期时间',
+  `verdict_key` VARCHAR(64) DEFAULT NULL COMMENT '评测结果去重键（代码、测试集和评测配置的哈希）',
+  `force_judge` TINYINT(1) NOT NULL DEFAULT 0 COMMENT '重新评测时不使用结果缓存',
+  `queue_class` ENUM('assignment', 'practice', 'rejudge') NOT NULL DEFAULT 'practice' COMMENT '评测队列类别',
+  `queued_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '进入评测队列时间',
+  `started_at` DATETIME DEFAULT NULL COMMENT '开始评测时间',
+  `judged_at` DATETIME DEFAULT NULL COMMENT '评测完成时间',
+  `rejudge_job_id` INT UNSIGNED DEFAULT NULL COMMENT '最近一次批量重测任务ID（外键，可为空）',
   PRIMARY KEY (`id`),
   KEY `idx_user_id` (`user_id`),
   KEY `idx_problem_id` (`problem_id`),
   KEY `idx_assignment_id` (`assignment_id`),
+  KEY `idx_status_lease` (`status`, `lease_expires_at`),
+  KEY `idx_status_class` (`status`, `queue_class`),
+  KEY `idx_verdict_key` (`verdict_key`),
+  KEY `idx_judged_at` (`judged_at`),
+  KEY `idx_rejudge_job_status` (`rejudge_job_id`, `status`),
   CONSTRAINT `fk_submissions_user_id` FOREIGN KEY (`user_id`) REFERENCES `users`(`id`) ON DELETE CASCADE ON UPDATE CASCADE,
   CONSTRAINT `fk_submissions_problem_id` FOREIGN KEY (`problem_id`) REFERENCES `problems`(`id`) ON DELETE CASCADE ON UPDATE CASCADE,
   CONSTRAINT `fk_submissions_assignment_id` FOREIGN KEY (`assignment_id`) REFERENCES `assignments`(`id`) ON DELETE SET NULL ON UPDATE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='提交记录表';
+
+-- 7. 评测进程表
+CREATE TABLE `judge_workers` (
+  `id` VARCHAR(64) NOT NULL COMMENT '评测进程ID（主机名:进程号）',
+  `hostname` VARCHAR(255) NOT NULL COMMENT '所在主机',
+  `capacity` INT UNSIGNED NOT NULL DEFAULT 1 COMMENT '可同时评测的提交数',
+  `languages` JSON NOT NULL COMMENT '支持的语言列表',
+  `in_flight` INT UNSIGNED NOT NULL DEFAULT 0 COMMENT '正在评测的提交数',
+  `status` ENUM('running', 'stopping', 'stopped') NOT NULL DEFAULT 'running' COMMENT '运行状态',
+  `started_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '启动时间',
+  `last_heartbeat` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '最近一次心跳时间',
+  PRIMARY KEY (`id`),
+  KEY `idx_last_heartbeat` (`last_heartbeat`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='评测进程表';
+
+-- 8. 批量重测任务表
+CREATE TABLE `rejudge_jobs` (
+  `id` INT UNSIGNED NOT NULL AUTO_INCREMENT COMMENT '主键ID',
+  `created_by` INT UNSIGNED NOT NULL COMMENT '发起人ID（外键）',
+  `problem_id` INT UNSIGNED DEFAULT NULL COMMENT '限定题目ID，为空不限',
+  `assignment_id` INT UNSIGNED DEFAULT NULL COMMENT '限定作业ID，为空不限',
+  `min_submission_id` INT UNSIGNED NOT NULL DEFAULT 0 COMMENT '提交ID下界（含）',
+  `max_submission_id` INT UNSIGNED NOT NULL COMMENT '提交ID上界（含），创建时确定',
+  `force_judge` TINYINT(1) NOT NULL DEFAULT 0 COMMENT '不复用缓存的评测结果',
+  `batch_size` INT UNSIGNED NOT NULL DEFAULT 200 COMMENT '每批放入评测队列的提交数',
+  `max_pending` INT UNSIGNED NOT NULL DEFAULT 200 COMMENT '同时在队列中的提交数上限',
+  `last_enqueued_id` INT UNSIGNED NOT NULL DEFAULT 0 COMMENT '已放入队列的最大提交ID（分批游标）',
+  `total` INT UNSIGNED NOT NULL DEFAULT 0 COMMENT '范围内的提交数',
+  `enqueued` INT UNSIGNED NOT NULL DEFAULT 0 COMMENT '已放入队列的提交数',
+  `deferred_ids` JSON DEFAULT NULL COMMENT '扫描时正在评测而跳过的提交ID，评测完成后再放入队列',
+  `status` ENUM('running', 'finished', 'cancelled') NOT NULL DEFAULT 'running' COMMENT '任务状态',
+  `created_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+  `finished_at` DATETIME DEFAULT NULL COMMENT '完成时间',
+  PRIMARY KEY (`id`),
+  KEY `idx_created_by` (`created_by`),
+  KEY `idx_status` (`status`),
+  CONSTRAINT `fk_rejudge_jobs_created_by` FOREIGN KEY (`created_by`) REFERENCES `users`(`id`) ON DELETE CASCADE ON UPDATE CASCADE,
+  CONSTRAINT `fk_rejudge_jobs_problem_id` FOREIGN KEY (`problem_id`) REFERENCES `problems`(`id`) ON DELETE CASCADE ON UPDATE CASCADE,
+  CONSTRAINT `fk_rejudge_jobs_assignment_id` FOREIGN KEY (`assignment_id`) REFERENCES `assignments`(`id`) ON DELETE CASCADE ON UPDATE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='批量重测任务表';
+
+-- 9. 学生批量导入任务表
+CREATE TABLE `student_import_jobs` (
+  `id` INT UNSIGNED NOT NULL AUTO_INCREMENT COMMENT '主键ID',
+  `created_by` INT UNSIGNED NOT NULL COMMENT '发起人ID（外键）',
+  `status` ENUM('running', 'finished', 'failed') NOT NULL DEFAULT 'running' COMMENT '任务状态',
+  `total_rows` INT UNSIGNED NOT NULL DEFAULT 0 COMMENT '文件中的非空行数',
+  `processed` INT UNSIGNED NOT NULL DEFAULT 0 COMMENT '已处理行数',
+  `created` INT UNSIGNED NOT NULL DEFAULT 0 COMMENT '已创建的学生数',
+  `failed` INT UNSIGNED NOT NULL DEFAULT 0 COMMENT '失败行数',
+  `errors` JSON DEFAULT NULL COMMENT '逐行错误报告（JSON格式）',
+  `message` VARCHAR(255) DEFAULT NULL COMMENT '任务失败原因',
+  `created_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+  `finished_at` DATETIME DEFAULT NULL COMMENT '完成时间',
+  PRIMARY KEY (`id`),
+  KEY `idx_created_by` (`created_by`),
+  CONSTRAINT `fk_student_import_jobs_created_by` FOREIGN KEY (`created_by`) REFERENCES `users`(`id`) ON DELETE CASCADE ON UPDATE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='学生批量导入任务表';
+
+ALTER TABLE `submissions`
+  ADD CONSTRAINT `fk_submissions_rejudge_job_id` FOREIGN KEY (`rejudge_job_id`) REFERENCES `rejudge_jobs`(`id`) ON DELETE SET NULL ON UPDATE CASCADE;
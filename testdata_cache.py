@@ -0,0 +1,223 @@
+import os
+import json
+import time
+import fcntl
+import shutil
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+class TestData:
+    """一份已落盘的测试数据：目录路径、用例数和隐藏用例编号，文件名为 input_N.txt / expected_N.txt。"""
+
+    def __init__(self, path, count, hidden=()):
+        self.path = path
+        self.count = count
+        self.hidden = frozenset(hidden)
+
+    def is_hidden(self, idx):
+        return idx in self.hidden
+
+    def case_files(self, idx):
+        return {
+            'input': os.path.join(self.path, f'input_{idx}.txt'),
+            'expected': os.path.join(self.path, f'expected_{idx}.txt')
+        }
+
+
+class TestDataCache:
+    """
+    节点本地的测试数据缓存：按 (题目ID, 测试集哈希) 把输入和期望输出落盘一次，
+    之后的提交以只读方式挂载进沙箱直接使用，不再从数据库读取大字段、逐个提交重写文件。
+    测试用例变化后哈希随之改变，同一题目的旧版本随即淘汰；总大小超过上限时按LRU淘汰。
+    使用中的条目持有共享文件锁，淘汰时跳过，多个评测进程可以共用同一目录。
+    """
+    META_FILE = 'meta.json'
+    STALE_TMP_SECONDS = 3600  # 超过该时间的临时目录视为崩溃残留
+
+    def __init__(self, cache_dir, max_bytes=2 * 1024 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._index = OrderedDict()  # 'problem_id/version' -> 占用字节数，按最近使用排序
+        self._total = 0
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+        self._load_index()
+
+    @staticmethod
+    def make_version(case_digests):
+        """由按顺序排列的 (输入摘要, 期望输出摘要, 是否隐藏) 计算测试集哈希。"""
+        h = hashlib.sha256()
+        for parts in case_digests:
+            h.update((':'.join(str(part) for part in parts) + ';').encode('utf-8'))
+        return h.hexdigest()[:32]
+
+    @contextmanager
+    def checkout(self, problem_id, version, loader):
+        """
+        取得题目的测试数据（TestData），使用期间持有共享锁，不会被淘汰。
+        未命中时调用 loader() 读取用例（[{'input', 'expected_output', 'hidden'}]）并落盘。
+        """
+        key = f'{int(problem_id)}/{version}'
+        meta_path = os.path.join(self._entry_dir(key), self.META_FILE)
+        hit = True
+        while True:
+            try:
+                fd = os.open(meta_path, os.O_RDONLY)
+            except FileNotFoundError:
+                hit = False
+                self._materialize(key, loader())
+                continue
+            fcntl.flock(fd, fcntl.LOCK_SH)
+            if os.fstat(fd).st_nlink:
+                break
+            os.close(fd)  # 加锁前条目已被其他进程淘汰，重新获取
+        try:
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+            self._touch(key, hit)
+            yield TestData(self._entry_dir(key), meta['count'], meta.get('hidden', ()))
+        finally:
+            os.close(fd)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'entries': len(self._index),
+                'bytes': self._total
+            }
+
+    def _touch(self, key, hit):
+        entry_dir = self._entry_dir(key)
+        try:
+            os.utime(entry_dir)
+        except OSError:
+            pass
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+            if key in self._index:
+                self._index.move_to_end(key)
+                return
+            size = self._dir_size(entry_dir)
+            self._index[key] = size
+            self._total += size
+
+    def _materialize(self, key, test_cases):
+        entry_dir = self._entry_dir(key)
+        parent = os.path.dirname(entry_dir)
+        os.makedirs(parent, mode=0o700, exist_ok=True)
+        # 先写入临时目录再整体重命名，保证其他进程看不到写了一半的条目
+        tmp_dir = tempfile.mkdtemp(prefix='.tmp_', dir=parent)
+        try:
+            for idx, case in enumerate(test_cases, 1):
+                self._write_private(os.path.join(tmp_dir, f'input_{idx}.txt'), case['input'])
+                self._write_private(os.path.join(tmp_dir, f'expected_{idx}.txt'), case['expected_output'] or '')
+            self._write_private(os.path.join(tmp_dir, self.META_FILE), json.dumps({
+                'count': len(test_cases),
+                'hidden': [idx for idx, case in enumerate(test_cases, 1) if case.get('hidden')]
+            }))
+            os.rename(tmp_dir, entry_dir)
+        except OSError:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            if not os.path.isdir(entry_dir):
+                raise
+            return  # 其他进程已落盘同一版本
+        size = self._dir_size(entry_dir)
+        problem_prefix = key.split('/')[0] + '/'
+        with self._lock:
+            if key not in self._index:
+                self._index[key] = size
+                self._total += size
+            # 同一题目的旧版本不会再被使用
+            for stale in [k for k in self._index if k.startswith(problem_prefix) and k != key]:
+                if self._try_remove(stale):
+                    self._total -= self._index.pop(stale)
+            self._evict_locked(keep=key)
+
+    def _evict_locked(self, keep=None):
+        for key in list(self._index):
+            if self._total <= self.max_bytes or len(self._index) <= 1:
+                return
+            if key != keep and self._try_remove(key):
+                self._total -= self._index.pop(key)
+
+    def _try_remove(self, key):
+        """条目未被使用时删除并返回 True，正在使用时返回 False。"""
+        entry_dir = self._entry_dir(key)
+        meta_path = os.path.join(entry_dir, self.META_FILE)
+        try:
+            fd = os.open(meta_path, os.O_RDONLY)
+        except FileNotFoundError:
+            return True
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        # 先删除元数据再移走目录：等待加锁的进程会发现条目已失效
+        trash = tempfile.mkdtemp(prefix='.tmp_', dir=os.path.dirname(entry_dir))
+        try:
+            os.unlink(meta_path)
+            os.rename(entry_dir, os.path.join(trash, 'entry'))
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+        shutil.rmtree(trash, ignore_errors=True)
+        return True
+
+    def _load_index(self):
+        entries = []
+        now = time.time()
+        for problem_id in os.listdir(self.cache_dir):
+            problem_dir = os.path.join(self.cache_dir, problem_id)
+            if not os.path.isdir(problem_dir):
+                continue
+            for version in os.listdir(problem_dir):
+                entry_dir = os.path.join(problem_dir, version)
+                try:
+                    mtime = os.path.getmtime(entry_dir)
+                except OSError:
+                    continue
+                if version.startswith('.tmp_'):
+                    if now - mtime > self.STALE_TMP_SECONDS:
+                        shutil.rmtree(entry_dir, ignore_errors=True)
+                    continue
+                entries.append((mtime, f'{problem_id}/{version}', self._dir_size(entry_dir)))
+        with self._lock:
+            for _, key, size in sorted(entries):
+                self._index[key] = size
+                self._total += size
+            self._evict_locked()
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, *key.split('/'))
+
+    @staticmethod
+    def _write_private(path, text):
+        # 仅属主可读写，沙箱内降权后的用户程序读不到
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with open(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+    @staticmethod
+    def _dir_size(path):
+        total = 0
+        for name in os.listdir(path):
+            try:
+                total += os.path.getsize(os.path.join(path, name))
+            except OSError:
+                pass
+        return total
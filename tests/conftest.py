@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 评测相关模块（code_judge、output_comparator 等）在仓库根目录，不是安装的包
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
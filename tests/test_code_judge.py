@@ -0,0 +1,100 @@
+import itertools
+import pytest
+
+pytest.importorskip('docker')
+from code_judge import CodeJudge  # noqa: E402
+
+
+def result(idx, passed):
+    return {'id': idx, 'passed': passed, 'status': 'accepted' if passed else 'wrong_answer'}
+
+
+class FakeRunner:
+    """按预设的通过情况"运行"用例，stop_on_failure 时与运行器一样停在第一个失败的用例。"""
+
+    def __init__(self, outcomes):
+        self.outcomes = outcomes
+        self.calls = []
+
+    def __call__(self, group, stop_on_failure):
+        self.calls.append([idx for idx, _ in group])
+        results = []
+        for idx, _ in group:
+            results.append(result(idx, self.outcomes[idx]))
+            if stop_on_failure and not self.outcomes[idx]:
+                break
+        return results
+
+
+def merge(policy, cases, reuse, outcomes):
+    runner = FakeRunner(outcomes)
+    merged = CodeJudge._merge_reused(object.__new__(CodeJudge), policy, cases, reuse, runner)
+    return [(r['id'], r['status']) for r in merged], runner.calls
+
+
+def statuses(outcomes):
+    return {idx: 'accepted' if passed else 'wrong_answer' for idx, passed in outcomes.items()}
+
+
+def test_full_runs_only_missing_cases():
+    cases = [{}] * 4
+    outcomes = {1: True, 2: True, 3: False, 4: True}
+    reuse = {1: result(1, True), 3: result(3, False)}
+    merged, calls = merge('full', cases, reuse, outcomes)
+    assert calls == [[2, 4]]
+    assert merged == sorted(statuses(outcomes).items())
+
+
+def test_fail_fast_stops_before_reused_failure():
+    cases = [{}] * 4
+    outcomes = {1: True, 2: False, 3: True, 4: True}
+    merged, calls = merge('fail_fast', cases, {2: result(2, False)}, outcomes)
+    assert calls == [[1]]
+    assert merged == [(1, 'accepted'), (2, 'wrong_answer'), (3, 'skipped'), (4, 'skipped')]
+
+
+def test_fail_fast_drops_reused_results_after_new_failure():
+    cases = [{}] * 4
+    outcomes = {1: True, 2: False, 3: True, 4: True}
+    merged, calls = merge('fail_fast', cases, {3: result(3, True)}, outcomes)
+    assert calls == [[1, 2, 4]]
+    assert merged == [(1, 'accepted'), (2, 'wrong_answer'), (3, 'skipped'), (4, 'skipped')]
+
+
+def test_public_first_skips_hidden_after_reused_public_failure():
+    cases = [{'hidden': False}, {'hidden': True}, {'hidden': False}, {'hidden': True}]
+    outcomes = {1: False, 2: True, 3: True, 4: True}
+    merged, calls = merge('public_first', cases, {1: result(1, False)}, outcomes)
+    assert calls == [[3]]
+    assert merged == [(1, 'wrong_answer'), (2, 'skipped'), (3, 'accepted'), (4, 'skipped')]
+
+
+def test_public_first_runs_hidden_group_after_public_passes():
+    cases = [{'hidden': False}, {'hidden': True}, {'hidden': False}, {'hidden': True}]
+    outcomes = {1: True, 2: True, 3: True, 4: False}
+    merged, calls = merge('public_first', cases, {2: result(2, True)}, outcomes)
+    assert calls == [[1, 3], [4]]
+    assert merged == [(1, 'accepted'), (2, 'accepted'), (3, 'accepted'), (4, 'wrong_answer')]
+
+
+def test_everything_reused_runs_nothing():
+    cases = [{}] * 3
+    outcomes = {1: True, 2: False, 3: True}
+    reuse = {idx: result(idx, passed) for idx, passed in outcomes.items()}
+    merged, calls = merge('full', cases, reuse, outcomes)
+    assert calls == []
+    assert merged == sorted(statuses(outcomes).items())
+
+
+@pytest.mark.parametrize('policy', CodeJudge.POLICIES)
+@pytest.mark.parametrize('pattern', list(itertools.product((True, False), repeat=4)))
+def test_any_partial_reuse_matches_a_full_rerun(policy, pattern):
+    cases = [{'hidden': idx % 2 == 0} for idx in range(1, 6)]
+    outcomes = dict(enumerate(pattern + (True,), 1))
+    expected, _ = merge(policy, cases, {}, outcomes)
+    for size in range(len(cases) + 1):
+        for reused in itertools.combinations(range(1, len(cases) + 1), size):
+            reuse = {idx: result(idx, outcomes[idx]) for idx in reused}
+            merged, calls = merge(policy, cases, reuse, outcomes)
+            assert merged == expected, reuse
+            assert not set(reused) & {idx for call in calls for idx in call}
@@ -0,0 +1,52 @@
+import pytest
+
+pytest.importorskip('flask_sqlalchemy')
+pytest.importorskip('docker')
+from app.judge_queue import reusable_results  # noqa: E402
+
+
+def previous(hashes, statuses, config_key='k1'):
+    return {
+        'config_key': config_key,
+        'case_hashes': list(hashes),
+        'cases': [{'id': idx, 'status': status} for idx, status in enumerate(statuses, 1)],
+    }
+
+
+def rows(*hashes):
+    return [(content_hash, False) for content_hash in hashes]
+
+
+def test_same_cases_are_all_reused():
+    prev = previous('abc', ['accepted', 'wrong_answer', 'accepted'])
+    reuse = reusable_results(prev, 'k1', rows('a', 'b', 'c'))
+    assert {idx: r['id'] for idx, r in reuse.items()} == {1: 1, 2: 2, 3: 3}
+
+
+def test_config_key_change_reuses_nothing():
+    prev = previous('abc', ['accepted'] * 3)
+    assert reusable_results(prev, 'k2', rows('a', 'b', 'c')) == {}
+
+
+def test_no_previous_result():
+    assert reusable_results(None, 'k1', rows('a')) == {}
+    assert reusable_results({}, 'k1', rows('a')) == {}
+
+
+def test_results_follow_content_hash_when_cases_move():
+    prev = previous('abc', ['accepted', 'wrong_answer', 'accepted'])
+    # 在最前面插入新用例 x，并删除 b、修改 c 为 d
+    reuse = reusable_results(prev, 'k1', rows('x', 'a', 'd'))
+    assert {idx: r['id'] for idx, r in reuse.items()} == {2: 1}
+
+
+def test_skipped_case_is_not_reused():
+    prev = previous('abc', ['accepted', 'wrong_answer', 'skipped'])
+    reuse = reusable_results(prev, 'k1', rows('a', 'b', 'c'))
+    assert sorted(reuse) == [1, 2]
+
+
+def test_duplicate_hash_uses_first_result_that_ran():
+    prev = previous('aab', ['skipped', 'accepted', 'accepted'])
+    reuse = reusable_results(prev, 'k1', rows('a', 'a', 'b'))
+    assert {idx: r['id'] for idx, r in reuse.items()} == {1: 2, 2: 2, 3: 3}
@@ -0,0 +1,78 @@
+import pytest
+from collections import Counter
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+pytest.importorskip('flask_sqlalchemy')
+from app.judge_scheduler import JudgeScheduler  # noqa: E402
+
+NOW = datetime(2026, 1, 1, 12, 0, 0)
+
+
+def candidate(id, user_id, queue_class='practice', waited=0, end_in=None):
+    """end_in 为提交时距截止的秒数，None 表示不属于作业。"""
+    queued_at = NOW - timedelta(seconds=waited)
+    end_time = queued_at + timedelta(seconds=end_in) if end_in is not None else None
+    return SimpleNamespace(id=id, user_id=user_id, queue_class=queue_class,
+                           queued_at=queued_at, submitted_at=queued_at, end_time=end_time)
+
+
+def pick(scheduler, candidates, limit, user_load=None, queue_load=None):
+    return scheduler.pick(candidates, Counter(user_load or {}), Counter(queue_load or {}), NOW, limit)
+
+
+def test_fair_share_across_users():
+    scheduler = JudgeScheduler()
+    candidates = [candidate(1, 'a', waited=50), candidate(2, 'a', waited=40),
+                  candidate(3, 'a', waited=30), candidate(4, 'b', waited=20)]
+    assert pick(scheduler, candidates, 3) == [1, 4, 2]
+
+
+def test_fair_share_counts_submissions_already_running():
+    scheduler = JudgeScheduler()
+    candidates = [candidate(1, 'a', waited=50), candidate(2, 'b', waited=10)]
+    assert pick(scheduler, candidates, 1, user_load={'a': 2}) == [2]
+
+
+def test_priority_classes():
+    scheduler = JudgeScheduler(deadline_window=3600)
+    candidates = [candidate(1, 'a', queue_class='rejudge', waited=30),
+                  candidate(2, 'b', queue_class='assignment', waited=10, end_in=86400),
+                  candidate(3, 'c', queue_class='assignment', waited=5, end_in=600)]
+    assert pick(scheduler, candidates, 3) == [3, 2, 1]
+
+
+def test_submission_after_deadline_is_practice():
+    scheduler = JudgeScheduler(deadline_window=3600)
+    late = candidate(1, 'a', queue_class='assignment', end_in=-60)
+    on_time = candidate(2, 'b', queue_class='assignment', end_in=60)
+    assert scheduler.priority_class(late) == 'practice'
+    assert scheduler.priority_class(on_time) == 'deadline'
+
+
+def test_queue_limit_caps_picks():
+    scheduler = JudgeScheduler(queue_limits={'rejudge': 2})
+    candidates = [candidate(i, f'u{i}', queue_class='rejudge', waited=10 - i) for i in range(1, 5)]
+    candidates.append(candidate(9, 'p', waited=1))
+    assert pick(scheduler, candidates, 5) == [9, 1, 2]
+
+
+def test_queue_limit_counts_running_submissions():
+    scheduler = JudgeScheduler(queue_limits={'rejudge': 2})
+    candidates = [candidate(1, 'a', queue_class='rejudge')]
+    assert pick(scheduler, candidates, 1, queue_load={'rejudge': 2}) == []
+    assert pick(scheduler, candidates, 1, queue_load={'rejudge': 1}) == [1]
+
+
+def test_aging_beats_priority_and_fair_share():
+    scheduler = JudgeScheduler(aging_seconds=900)
+    candidates = [candidate(1, 'a', queue_class='assignment', waited=10, end_in=60),
+                  candidate(2, 'b', queue_class='rejudge', waited=1000)]
+    assert pick(scheduler, candidates, 2, user_load={'b': 5}) == [2, 1]
+
+
+def test_limit():
+    scheduler = JudgeScheduler()
+    candidates = [candidate(i, f'u{i}', waited=10 - i) for i in range(1, 5)]
+    assert pick(scheduler, candidates, 2) == [1, 2]
+    assert pick(scheduler, [], 2) == []
@@ -0,0 +1,99 @@
+import io
+import pytest
+import output_comparator
+from output_comparator import make_comparator
+
+# 期望输出的读取块大小和选手输出的分块大小，覆盖空白、词和数值跨块的情况
+CHUNK_SIZES = (1, 2, 3, 5, 64)
+
+
+@pytest.fixture
+def compare(monkeypatch):
+    def run(checker, expected, output, chunk_size, feed_size):
+        monkeypatch.setattr(output_comparator, 'CHUNK_SIZE', chunk_size)
+        comparator = make_comparator(checker, io.BytesIO(expected))
+        for start in range(0, len(output), feed_size):
+            comparator.feed(output[start:start + feed_size])
+        return comparator.finish()
+    return run
+
+
+EXACT_CASES = [
+    (b'1 2\n3 4\n', b'1 2\n3 4\n'),
+    (b'1 2\n3 4\n', b'\n\n  1 2\n3 4'),
+    (b'  1 2\n3 4\n\n\n', b'1 2\n3 4\n  \t\n'),
+    (b'1 2\n3 4\n', b'1 2\n3 4 \n'),
+    (b'1 2\n3 4\n', b'1  2\n3 4\n'),
+    (b'1 2\n3 4\n', b'1 2\n3 4\n5'),
+    (b'1 2\n3 4\n', b'1 2\n3'),
+    (b'1 2\n3 4\n', b''),
+    (b'', b'\n \n'),
+    (b'', b'x'),
+    (b'a   \n', b'a\n\n\n'),
+    (b'a b', b'a \n b'),
+]
+
+
+@pytest.mark.parametrize('expected,output', EXACT_CASES)
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+@pytest.mark.parametrize('feed_size', CHUNK_SIZES)
+def test_exact_matches_strip(expected, output, chunk_size, feed_size, compare):
+    result = compare(None, expected, output, chunk_size, feed_size)
+    assert result['passed'] == (expected.strip() == output.strip())
+
+
+TOKEN_CASES = [
+    (b'1 2\n3 4\n', b'1 2 3 4'),
+    (b'1 2\n3 4\n', b'\n 1\t2\n\n3    4  \n'),
+    (b'12 34', b'1234'),
+    (b'1234', b'12 34'),
+    (b'abc', b'ab c'),
+    (b'a b c', b'a b'),
+    (b'a b', b'a b c'),
+    (b'', b'   \n'),
+    (b'hello world', b'hello  world\r\n'),
+]
+
+
+@pytest.mark.parametrize('expected,output', TOKEN_CASES)
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+@pytest.mark.parametrize('feed_size', CHUNK_SIZES)
+def test_token_matches_split(expected, output, chunk_size, feed_size, compare):
+    result = compare({'mode': 'token'}, expected, output, chunk_size, feed_size)
+    assert result['passed'] == (expected.split() == output.split())
+
+
+FLOAT_CASES = [
+    (b'1 2.5\n', b'1.0000001 2.5', True),
+    (b'1000000\n', b'1000000.5', True),
+    (b'1\n', b'1.1', False),
+    (b'0.333333\n', b'0.3333333333', True),
+    (b'nan\n', b'nan', True),
+    (b'1\n', b'nan', False),
+    (b'inf\n', b'inf', True),
+    (b'1 abc\n', b'1 abc', True),
+    (b'1 abc\n', b'1 abd', False),
+    (b'1 2\n', b'1', False),
+]
+
+
+@pytest.mark.parametrize('expected,output,passed', FLOAT_CASES)
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+@pytest.mark.parametrize('feed_size', CHUNK_SIZES)
+def test_float_tolerance(expected, output, passed, chunk_size, feed_size, compare):
+    result = compare({'mode': 'float', 'tolerance': 1e-6}, expected, output, chunk_size, feed_size)
+    assert result['passed'] == passed
+
+
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+@pytest.mark.parametrize('feed_size', CHUNK_SIZES)
+def test_mismatch_position(chunk_size, feed_size, compare):
+    exact = compare(None, b'1 2\n3 4\n', b'1 2\n3 5\n', chunk_size, feed_size)
+    assert exact['mismatch'] == {'line': 2, 'column': 3}
+    token = compare({'mode': 'token'}, b'1 2\n3 4\n', b'1 2\n  3 5\n', chunk_size, feed_size)
+    assert token['mismatch'] == {'line': 2, 'column': 5}
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        make_comparator({'mode': 'regex'}, io.BytesIO(b''))